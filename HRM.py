@@ -1,181 +1,501 @@
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Response, Query, Header
+from fastapi.responses import PlainTextResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from database import Base, engine, get_db
-from schemas import (Employee, EmployeeCreate, Department, Position, SalaryHistory, SalaryHistoryBase, EmployeeFull)
-from models import (Employee as EmployeeModel, Department as DepartmentModel, Position as PositionModel, SalaryHistory as SalaryHistoryModel)
+from database import get_db, get_read_db, open_read_session, remember_write, pools, engines, dispose_engines
+from schemas import (Employee, EmployeeCreate, Department, Position, SalaryHistory, SalaryHistoryBase, EmployeeFull,
+                     BulkImportResult, SalaryIndexation, SalaryIndexationResult, PayrollEntry,
+                     SalaryStats, Changes, SalaryHistoryQuery, EmployeeSalaryHistory,
+                     JobCreate, JobStatus, PayrollProjection, projection_model)
 import db_queries
+import streaming
+import cache
+import bulk_import
+import metrics
+import instrumentation
+import analytics
+import search
+import export
+import changes
+import compression
+import jobs
+import projection
+import startup
 from datetime import date
 
-# Создаём приложение FastAPI
-app = FastAPI()
+# Маршруты API; приложение с ними создаёт create_app
+router = APIRouter(route_class = instrumentation.TimedRoute)  # Замеры проверки и сериализации ответа
 
-# Разрешаем доступ к API с любых источников
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],   # Разрешаем запросы с любых доменов
-    allow_methods=["*"],   # Разрешаем все HTTP-методы
-    allow_headers=["*"]    # Разрешаем все заголовки
-)
+READ_ONLY_POSTS = {"/salary", "/jobs"}  # POST-запросы, которые не меняют данные
 
-Base.metadata.create_all(bind = engine)   # Создаём все таблицы в базе, если их ещё нет
+
+"""
+Функция-обработчик промежуточного слоя: после успешной записи клиент какое-то время читает с основной БД
+    Параметры:
+        request: Request — входящий HTTP-запрос
+        call_next: callable — следующий обработчик
+    Возвращаемое значение: Response — ответ обработчика
+"""
+async def read_your_writes(request: Request, call_next):
+    response = await call_next(request)
+    if (request.method not in ("GET", "HEAD", "OPTIONS") and request.url.path not in READ_ONLY_POSTS
+            and response.status_code < 400):
+        remember_write(response)
+    return response
 
 
 """
-Функция получает все отделы из базы данных
+Функция получает все отделы из кэша справочников
+    Отвечает 304 Not Modified, если у клиента актуальная версия (заголовок If-None-Match)
     Параметры: db: Session — объект сессии SQLAlchemy
     Возвращаемое значение: list[Department] — список отделов
 """
-@app.get("/departments", response_model = List[Department])
-def read_departments(db = Depends(get_db)):
-    return db_queries.get_departments(db)
+@router.get("/departments", response_model = List[Department])
+def read_departments(request: Request, response: Response, db = Depends(get_read_db)):
+    return cache.reference_response(cache.departments, request, response, db)
 
 """
-Функция получает все должности из базы данных
+Функция получает все должности из кэша справочников
+    Отвечает 304 Not Modified, если у клиента актуальная версия (заголовок If-None-Match)
     Параметры: db: Session — объект сессии SQLAlchemy
     Возвращаемое значение: list[Position] — список должностей
 """
-@app.get("/positions", response_model = List[Position])
-def read_positions(db = Depends(get_db)):
-    return db_queries.get_positions(db)
+@router.get("/positions", response_model = List[Position])
+def read_positions(request: Request, response: Response, db = Depends(get_read_db)):
+    return cache.reference_response(cache.positions, request, response, db)
 
 """
 Функция получает сотрудников из базы данных с возможной фильтрацией
+    Поддерживает keyset-пагинацию (limit/after, курсор следующей страницы в заголовке X-Next-Cursor)
+    и потоковую выдачу NDJSON при заголовке Accept: application/x-ndjson. Ответ JSON отдаётся с ETag
+    по версиям сотрудников, истории зарплат и справочников: если они не менялись, ответ 304 Not Modified.
+    С fields/include в ответе только выбранные поля, и запрос читает только их столбцы
     Параметры:
         department_id: int | None — id отдела 
         position_id: int | None — id должности 
         hire_date_from: str | None — дата начала найма 
         hire_date_to: str | None — дата конца найма
+        after: int | None — id последнего сотрудника предыдущей страницы
+        limit: int | None — размер страницы
+        fields: str | None — поля сотрудника через запятую, например "id,last_name"
+        include: str | None — связанные данные через запятую: department, position, salary
         db: Session — объект сессии SQLAlchemy
     Возвращаемое значение: list[Employee] — список сотрудников
 """
-@app.get("/employees", response_model = List[Employee])
-def read_employees(department_id: int = None, position_id: int = None, hire_date_from: str = None, 
-                   hire_date_to: str = None, db = Depends(get_db)):
-    return db_queries.get_employees(db, department_id, position_id, hire_date_from, hire_date_to)
+@router.get("/employees", response_model = List[Employee])
+def read_employees(request: Request, response: Response, department_id: int = None, position_id: int = None,
+                   hire_date_from: str = None, hire_date_to: str = None, after: int = None,
+                   limit: int = Query(None, ge = 1, le = streaming.MAX_PAGE_SIZE), fields: str = None,
+                   include: str = None, db = Depends(get_read_db)):
+    try:
+        projection = db_queries.parse_projection(fields, include)  # Выбранные поля — только эти столбцы в запросе
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    if not streaming.wants_ndjson(request):  # Поток NDJSON отдаётся без ETag
+        versions = db_queries.get_versions(db, db_queries.EMPLOYEE_LIST_DATA)  # До выборки: ETag не новее данных
+        cached = cache.versioned_response(request, response, "employees", versions, vary = "Accept")
+        if cached:
+            return cached  # 304: список не изменился, выборка не выполняется
+
+    # Названия отделов и должностей — из кэша, без JOIN, и только если они нужны в ответе
+    departments = cache.departments.get(db).names if db_queries.includes(projection, "department") else {}
+    positions = cache.positions.get(db).names if db_queries.includes(projection, "position") else {}
+    to_dict = db_queries.employee_serializer(projection, departments, positions)
+    model = projection and projection_model(Employee, db_queries.projection_names(projection))  # Урезанная схема ответа
+
+    if streaming.wants_ndjson(request):
+        query = db_queries.employees_query(department_id, position_id, hire_date_from, hire_date_to, after, projection)
+        if limit:
+            query = query.limit(limit)
+        return streaming.ndjson_response(lambda s: db_queries.iter_rows(s, query), to_dict, lambda: open_read_session(request))
+
+    rows = db_queries.get_employees(db, department_id, position_id, hire_date_from, hire_date_to,
+                                    after, limit + 1 if limit else None, projection)
+    return streaming.list_response([to_dict(r) for r in streaming.paginate(rows, limit, response)], response, model)
+
+
+"""
+Функция ищет сотрудников по фамилии, имени и отчеству
+    Поиск идёт по индексу в памяти процесса: по префиксу и нечётко (опечатки),
+    без учёта регистра и различия «ё»/«е»; лучшие совпадения — первыми
+    Параметры:
+        q: str — строка поиска, например «иванов ив»
+        limit: int — максимальное количество результатов
+        department_id: int | None — id отдела
+        position_id: int | None — id должности
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: list[Employee] — найденные сотрудники
+"""
+@router.get("/employees/search", response_model = List[Employee])
+def search_employees(q: str = Query(..., min_length = 1, max_length = 200), limit: int = Query(20, ge = 1, le = 100),
+                     department_id: int = None, position_id: int = None, db = Depends(get_read_db)):
+    ids = search.names.refresh(db).search(q, limit, department_id, position_id)
+    departments = cache.departments.get(db).names
+    positions = cache.positions.get(db).names
+    return [db_queries.employee_to_dict(r, departments, positions) for r in db_queries.get_employees_by_ids(db, ids)]
 
 
 """
 Функция получает историю зарплат сотрудника по его id
+    Список отдаётся быстрым путём streaming.list_response, как и списки сотрудников, с ETag
+    по версии истории зарплат (304 Not Modified, если история не менялась)
     Параметры:
         employee_id: int — id сотрудника
+        request: Request — входящий HTTP-запрос (заголовок If-None-Match)
+        response: Response — ответ, заголовки которого переносятся в итоговый ответ
         db: Session — объект сессии SQLAlchemy
     Возвращаемое значение: list[SalaryHistory] — список записей о зарплате сотрудника
 """
-@app.get("/salary/{employee_id}", response_model = List[SalaryHistory])
-def read_salary(employee_id: int, db = Depends(get_db)):
-    return db_queries.get_salary_history(db, employee_id)
+@router.get("/salary/{employee_id}", response_model = List[SalaryHistory])
+def read_salary(employee_id: int, request: Request, response: Response, db = Depends(get_read_db)):
+    versions = db_queries.get_versions(db, db_queries.SALARY_HISTORY_DATA)
+    cached = cache.versioned_response(request, response, "salary", versions)
+    if cached:
+        return cached
+
+    return streaming.list_response([dict(r._mapping) for r in db_queries.get_salary_history(db, employee_id)], response)
+
+
+"""
+Функция получает истории зарплат нескольких сотрудников одним запросом
+    Записи сгруппированы по сотрудникам в порядке запроса, внутри — по возрастанию даты.
+    Ответ с ETag по версии истории зарплат, как и /salary/{employee_id}
+    Параметры:
+        employee_ids: list[str] — id сотрудников: через запятую и/или повтором параметра
+        date_from: date | None — дата изменения (начало)
+        date_to: date | None — дата изменения (конец)
+        last: int | None — сколько последних записей каждого сотрудника вернуть
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: list[EmployeeSalaryHistory] — истории зарплат по сотрудникам
+"""
+@router.get("/salary", response_model = List[EmployeeSalaryHistory])
+def read_salaries(request: Request, response: Response, employee_ids: List[str] = Query(...), date_from: date = None,
+                  date_to: date = None, last: int = Query(None, ge = 1), db = Depends(get_read_db)):
+    try:
+        ids = db_queries.batch_employee_ids(employee_ids)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    versions = db_queries.get_versions(db, db_queries.SALARY_HISTORY_DATA)
+    cached = cache.versioned_response(request, response, "salary", versions)
+    if cached:
+        return cached
+
+    rows = db_queries.get_salary_histories(db, ids, date_from, date_to, last)
+    return streaming.list_response(db_queries.group_salary_histories(rows, ids), response)
+
+
+"""
+Функция получает истории зарплат нескольких сотрудников по списку в теле запроса
+    Для длинных списков id, которые не помещаются в URL. Запрос только читает данные
+    Параметры:
+        query: SalaryHistoryQuery — id сотрудников, границы дат и количество последних записей
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: list[EmployeeSalaryHistory] — истории зарплат по сотрудникам
+"""
+@router.post("/salary", response_model = List[EmployeeSalaryHistory])
+def read_salaries_batch(query: SalaryHistoryQuery, response: Response, db = Depends(get_read_db)):
+    try:
+        ids = db_queries.batch_employee_ids(query.employee_ids)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+    if query.last is not None and query.last < 1:
+        raise HTTPException(status_code = 422, detail = "Параметр last должен быть не меньше 1")
+
+    rows = db_queries.get_salary_histories(db, ids, query.date_from, query.date_to, query.last)
+    return streaming.list_response(db_queries.group_salary_histories(rows, ids), response)
+
+
+"""
+Функция получает зарплату каждого сотрудника, действовавшую на указанную дату
+    Результат кэшируется до следующего изменения сотрудников или истории зарплат. Ответ
+    с ETag; ведомость за прошедшую дату браузер может не перепроверять PAYROLL_MAX_AGE секунд
+    Параметры:
+        as_of: date — дата ведомости
+        department_id: int | None — id отдела
+        position_id: int | None — id должности
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: list[PayrollEntry] — сотрудники с действующей зарплатой
+"""
+@router.get("/payroll", response_model = List[PayrollEntry])
+def read_payroll(request: Request, response: Response, as_of: date, department_id: int = None,
+                 position_id: int = None, db = Depends(get_read_db)):
+    versions = db_queries.get_versions(db, db_queries.PAYROLL_DATA)
+    etag = f'"payroll-{"-".join(map(str, versions))}"'  # ETag относится к URL, параметры в него не входят
+    max_age = cache.PAYROLL_MAX_AGE if as_of < date.today() else 0  # Закрытый период меняется только задним числом
+
+    cached = cache.not_modified(request, etag, max_age)
+    if cached:
+        return cached
+
+    response.headers.update(cache.cache_headers(etag, max_age))
+    return cache.payroll.get(
+        (as_of, department_id, position_id), versions,
+        lambda: [dict(r._mapping) for r in db_queries.get_payroll(db, as_of, department_id, position_id)]
+    )
+
+
+"""
+Функция считает фонд оплаты труда по отделам или должностям за каждый месяц, квартал или год окна
+    История зарплат хранится в памяти процесса в столбцах NumPy и дочитывается по мере изменений;
+    для месяцев после сегодняшнего дня применяется плановая индексация. Ответ отдаётся с ETag
+    Параметры:
+        date_from: date — начало окна (параметр from)
+        date_to: date — конец окна (параметр to), включительно
+        granularity: str — период: month, quarter или year
+        group_by: str — группировка: department или position
+        indexation: float — плановая индексация зарплат с 1 января каждого следующего года, %
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: list[PayrollProjection] — фонд оплаты по периодам и группам
+"""
+@router.get("/payroll/projection", response_model = List[PayrollProjection])
+def read_payroll_projection(request: Request, response: Response, date_from: date = Query(..., alias = "from"),
+                            date_to: date = Query(..., alias = "to"),
+                            granularity: Literal["month", "quarter", "year"] = "month",
+                            group_by: Literal["department", "position"] = "department",
+                            indexation: float = Query(0, ge = 0, le = 100), db = Depends(get_read_db)):
+    versions = db_queries.get_versions(db, db_queries.PAYROLL_DATA)
+    cached = cache.versioned_response(request, response, f"projection-{date.today()}", versions)  # Прогноз зависит и от даты
+    if cached:
+        return cached
+
+    arrays = projection.salaries.refresh(db)
+    try:
+        rows = projection.project(arrays, date_from, date_to, granularity, group_by, indexation)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    names = {"department": cache.departments, "position": cache.positions}[group_by].get(db).names
+    return streaming.list_response([{**row, "name": names.get(row["group"])} for row in rows], response)
+
+
+"""
+Функция считает сводную статистику зарплат по отделам, должностям или годам найма
+    Численность, фонд оплаты, средняя, медиана и процентили считаются на сервере,
+    результат кэшируется до следующего изменения данных и отдаётся с ETag
+    Параметры:
+        group_by: str — группировка: department, position или hire_year
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: list[SalaryStats] — статистика по группам
+"""
+@router.get("/analytics/salaries", response_model = List[SalaryStats])
+def read_salary_stats(request: Request, response: Response,
+                      group_by: Literal["department", "position", "hire_year"] = "department",
+                      db = Depends(get_read_db)):
+    versions = db_queries.get_versions(db, analytics.ANALYTICS_DATA)
+    etag = f'"analytics-{"-".join(map(str, versions))}"'
+
+    cached = cache.not_modified(request, etag)
+    if cached:
+        return cached
+
+    response.headers.update(cache.cache_headers(etag))
+    stats = cache.analytics.get((group_by,), versions, lambda: analytics.salary_stats(db, group_by))
+    names = {"department": cache.departments, "position": cache.positions}.get(group_by)
+    names = names.get(db).names if names else {}
+    return [{**s, "name": names.get(s["group"])} for s in stats]
+
+
+"""
+Функция отдаёт строки, созданные или изменённые после курсора (лента изменений)
+    Клиент начинает с since=0 и каждый раз передаёт курсор из предыдущего ответа;
+    пока has_more, следующую страницу можно запросить сразу
+    Параметры:
+        since: str — курсор из предыдущего ответа
+        limit: int — максимальное количество строк в ответе
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: Changes — строки по таблицам и курсор следующего запроса
+"""
+@router.get("/changes", response_model = Changes)
+def read_changes(since: str = "0", limit: int = Query(streaming.MAX_PAGE_SIZE, ge = 1, le = streaming.MAX_PAGE_SIZE),
+                 db = Depends(get_read_db)):
+    try:
+        return changes.get_changes(db, since, limit)
+    except ValueError as error:
+        raise HTTPException(status_code = 400, detail = str(error))
 
 
 """
 Функция создаёт нового сотрудника и добавляет начальную запись о зарплате
+    Одна транзакция без повторных чтений: ответ собирается из данных запроса, id из INSERT
+    и названий из кэша справочников. С заголовком Idempotency-Key повтор запроса получает
+    сохранённый ответ и не создаёт второго сотрудника
     Параметры:
         emp: EmployeeCreate — данные нового сотрудника
+        idempotency_key: str | None — ключ идемпотентности (заголовок Idempotency-Key)
         db: Session — объект сессии SQLAlchemy
     Возвращаемое значение: dict — информация о созданном сотруднике с текущей зарплатой
 """
-@app.post("/employees", response_model = Employee)
-def create_employee(emp: EmployeeCreate, db: Session = Depends(get_db)):
-    new_emp = EmployeeModel(    # Создаём объект сотрудника SQLAlchemy
-        last_name = emp.last_name,  # Фамилия сотрудника
-        first_name = emp.first_name,  # Имя сотрудника
-        middle_name = emp.middle_name,  # Отчество сотрудника 
-        hire_date = emp.hire_date,  # Дата найма
-        department_id = emp.department_id,  # id отдела
-        position_id = emp.position_id  # id должности
-    )
-    db.add(new_emp)  # Добавляем сотрудника в сессию
-    db.commit()  # Сохраняем изменения в базе
-    db.refresh(new_emp)  # Обновляем объект после сохранения
-
-     # Создание начальной записи зарплаты
-    if emp.amount is not None:
-        salary_record = SalaryHistoryModel(  # Объект истории зарплаты
-            employee_id = new_emp.id,  # id сотрудника
-            change_date = emp.hire_date,  # Дата начала зарплаты
-            amount = emp.amount  # Сумма зарплаты
-        )
-        db.add(salary_record)  # Добавляем запись истории зарплаты
-        db.commit()  # Сохраняем изменения
-        db.refresh(salary_record)   # Обновляем объект
-
-    # Вычисляем текущую зарплату
-    salary_records = db.query(SalaryHistoryModel).filter(SalaryHistoryModel.employee_id == new_emp.id).order_by(SalaryHistoryModel.change_date.desc()).all()
-    
-    if salary_records:
-        latest_date = salary_records[0].change_date # Берём дату последнего изменения зарплаты
-
-        # Собираем все суммы зарплаты, которые относятся к самой последней дате
-        latest_records = [r.amount for r in salary_records if r.change_date == latest_date]
-
-         # Берём максимальную зарплату среди записей с одинаковой датой
-        current_salary = max(latest_records)
-    else:    
-        current_salary = None # Если записей изменения зарплаты нет — текущей зарплаты тоже нет
-
-
-    # Преобразуем объект в словарь
-    result = {
-        "id": new_emp.id,
-        "last_name": new_emp.last_name,
-        "first_name": new_emp.first_name,
-        "middle_name": new_emp.middle_name,
-        "hire_date": new_emp.hire_date,
-        "department": {"id": new_emp.department.id, "name": new_emp.department.name},
-        "position": {"id": new_emp.position.id, "name": new_emp.position.name},
-        "current_salary": current_salary
-    }
+@router.post("/employees", response_model = Employee)
+def create_employee(emp: EmployeeCreate, idempotency_key: str = Header(None, max_length = 255),
+                    db: Session = Depends(get_db)):
+    request_data = emp.dict()
+    try:
+        saved = db_queries.get_idempotent_response(db, "POST /employees", idempotency_key, request_data)
+        if saved is not None:
+            return saved  # Повтор уже выполненного запроса
+
+        departments = cache.departments.get_with(db, emp.department_id).names
+        positions = cache.positions.get_with(db, emp.position_id).names
+        result = db_queries.create_employee(db, emp, departments, positions)
+        if result is None:
+            raise HTTPException(422, "Отдел или должность не найдены")
+
+        # Сотрудник, история, текущая зарплата и сохранённый ответ фиксируются одной транзакцией
+        return db_queries.commit_idempotent(db, "POST /employees", idempotency_key, request_data, result)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+    except db_queries.IdempotencyConflict as error:
+        raise HTTPException(status_code = 409, detail = str(error))
+
+
+"""
+Функция массово добавляет сотрудников из CSV или NDJSON
+    Тело читается потоком; каждая строка проверяется схемой EmployeeCreate, сотрудники
+    и их начальные зарплаты вставляются пачками, по одной транзакции на пачку
+    Параметры:
+        request: Request — запрос с телом text/csv (первая строка — заголовок) или application/x-ndjson
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: BulkImportResult — количество добавленных и ошибки по строкам
+"""
+@router.post("/employees/bulk", response_model = BulkImportResult)
+async def create_employees_bulk(request: Request, db: Session = Depends(get_db)):
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if media_type not in (bulk_import.CSV_MEDIA_TYPE, streaming.NDJSON_MEDIA_TYPE):
+        raise HTTPException(415, "Ожидается тело text/csv или application/x-ndjson")
 
-    return result
+    job = bulk_import.BulkImport()
+    async for number, record in bulk_import.iter_records(request, media_type):
+        if job.add(number, record):
+            await run_in_threadpool(job.flush, db)  # Запись в БД выполняется вне цикла событий
+    await run_in_threadpool(job.flush, db)
 
+    return job.result()
 
 
 """
 Функция получает всех сотрудников с полной информацией
-    Параметры: db: Session
+    Поддерживает keyset-пагинацию (limit/after), потоковую выдачу NDJSON, ETag и fields/include, как и /employees
+    Параметры:
+        after: int | None — id последнего сотрудника предыдущей страницы
+        limit: int | None — размер страницы
+        fields: str | None — поля сотрудника через запятую, например "id,last_name"
+        include: str | None — связанные данные через запятую: department, position, salary
+        db: Session
     Возвращаемое значение: list[EmployeeFull] — список сотрудников с полной информацией
 """
-@app.get("/employees/full", response_model = List[EmployeeFull])  
-def get_employees_full(db=Depends(get_db)):
-    employees = db.query(EmployeeModel).all()  # Получаем всех сотрудников из базы данных
-    result = []  # Список для хранения результатов
-
-    for emp in employees:  # Проходим по каждому сотруднику
-        current_salary = None  # Инициализируем текущую зарплату
-        if emp.salary_history:  # Если есть записи истории зарплаты
-            # Находим максимальную дату изменения зарплаты
-            latest_date = max(s.change_date for s in emp.salary_history)
-
-            # Получаем ВСЕ суммы, у которых дата совпадает с самой последней
-            salaries_on_latest_date = [s.amount for s in emp.salary_history if s.change_date == latest_date]
-
-            # Выбираем максимальную сумму среди этих записей
-            current_salary = max(salaries_on_latest_date)
-        elif hasattr(emp, "amount") and emp.amount is not None:  # Если истории нет, но при создании была задана зарплата
-            current_salary = emp.amount 
-            
-            # Создаём первую запись в истории зарплат (на дату найма)
-            new_record = SalaryHistoryModel(employee_id = emp.id, change_date = emp.hire_date, amount = emp.amount)
-            db.add(new_record)   # Добавляем запись в сессию
-            db.commit() # Сохраняем изменения в базе данных
-            db.refresh(new_record)   # Обновляем объект
-
-        emp_data = EmployeeFull(  # Создаём объект EmployeeFull
-            id = emp.id,  # id сотрудника
-            last_name = emp.last_name,  # Фамилия
-            first_name = emp.first_name,  # Имя
-            middle_name = emp.middle_name,  # Отчество
-            hire_date = emp.hire_date,  # Дата найма
-            department = emp.department.name if emp.department else None,  # Название отдела (если есть)
-            position = emp.position.name if emp.position else None,  # Название должности (если есть)
-            current_salary = current_salary  # Текущая зарплата
-        )
-        result.append(emp_data)  # Добавляем объект в список результатов
-
-    return result   
+@router.get("/employees/full", response_model = List[EmployeeFull])  
+def get_employees_full(request: Request, response: Response, after: int = None,
+                       limit: int = Query(None, ge = 1, le = streaming.MAX_PAGE_SIZE), fields: str = None,
+                       include: str = None, db=Depends(get_read_db)):
+    try:
+        projection = db_queries.parse_projection(fields, include)  # Выбранные поля — только эти столбцы в запросе
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    if not streaming.wants_ndjson(request):  # Поток NDJSON отдаётся без ETag
+        versions = db_queries.get_versions(db, db_queries.EMPLOYEE_LIST_DATA)  # До выборки: ETag не новее данных
+        cached = cache.versioned_response(request, response, "employees-full", versions, vary = "Accept")
+        if cached:
+            return cached  # 304: список не изменился, выборка не выполняется
+
+    # Названия отделов и должностей — из кэша, без JOIN, и только если они нужны в ответе
+    departments = cache.departments.get(db).names if db_queries.includes(projection, "department") else {}
+    positions = cache.positions.get(db).names if db_queries.includes(projection, "position") else {}
+    to_dict = db_queries.employee_serializer(projection, departments, positions, full = True)
+    model = projection and projection_model(EmployeeFull, db_queries.projection_names(projection))  # Урезанная схема ответа
+
+    if streaming.wants_ndjson(request):
+        query = db_queries.employees_full_query(after, projection)
+        if limit:
+            query = query.limit(limit)
+        return streaming.ndjson_response(lambda s: db_queries.iter_rows(s, query), to_dict, lambda: open_read_session(request))
+
+    rows = db_queries.get_employees_full(db, after, limit + 1 if limit else None, projection)  # Один запрос вместо загрузки связей каждого сотрудника
+    return streaming.list_response([to_dict(r) for r in streaming.paginate(rows, limit, response)], response, model)
+
+
+"""
+Функция выгружает реестр сотрудников в файл CSV или XLSX
+    Строки читаются серверным курсором и пишутся в ответ по частям: память не зависит
+    от числа сотрудников, первые байты файла уходят клиенту сразу
+    Параметры:
+        format: str — формат файла: "csv" или "xlsx"
+        department_id, position_id, hire_date_from, hire_date_to — фильтры, как у /employees
+        db: Session — объект сессии SQLAlchemy (для названий отделов и должностей)
+    Возвращаемое значение: StreamingResponse — файл employees.csv или employees.xlsx
+"""
+@router.get("/employees/export")
+def export_employees(request: Request, format: Literal["csv", "xlsx"] = "csv", department_id: int = None,
+                     position_id: int = None, hire_date_from: str = None, hire_date_to: str = None,
+                     db = Depends(get_read_db)):
+    departments = cache.departments.get(db).names
+    positions = cache.positions.get(db).names
+    query = db_queries.employees_query(department_id, position_id, hire_date_from, hire_date_to)
+    return export.export_response(format, lambda: open_read_session(request), lambda s: db_queries.iter_rows(s, query),
+                                  lambda row: export.export_values(row, departments, positions))
+
+
+"""
+Функция ставит тяжёлый отчёт в очередь фоновых заданий
+    Одинаковые запросы при неизменных данных получают одно задание; если результат уже
+    посчитан, задание сразу имеет статус done. При заполненной очереди — 503 Service Unavailable.
+    Версии данных читаются с основной БД: отчёт строится на реплике, и задание само ждёт,
+    пока она догонит эти версии
+    Параметры:
+        params: JobCreate — отчёт, формат и фильтры
+        db: Session — объект сессии основной БД (для версий данных)
+    Возвращаемое значение: JobStatus — задание (202 Accepted, адрес задания в заголовке Location)
+"""
+@router.post("/jobs", response_model = JobStatus, status_code = 202)
+def create_job(request: Request, response: Response, params: JobCreate, db: Session = Depends(get_db)):
+    try:
+        report_params = jobs.report_params(params.report, params.format, params.dict())
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    versions = db_queries.get_versions(db, jobs.REPORT_DATA[params.report])
+    try:
+        job = jobs.manager.submit(params.report, params.format, report_params, versions,
+                                  lambda: open_read_session(request))
+    except jobs.QueueFull:
+        raise HTTPException(503, "Очередь заданий заполнена, повторите позже", headers = {"Retry-After": "30"})
+
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job.to_dict()
+
+
+"""
+Функция возвращает состояние фонового задания
+    Параметры: job_id: str — номер задания
+    Возвращаемое значение: JobStatus — задание
+"""
+@router.get("/jobs/{job_id}", response_model = JobStatus)
+def read_job(job_id: str):
+    job = jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Задание не найдено")
+    return job.to_dict()
+
+
+"""
+Функция отдаёт файл результата фонового задания
+    Параметры: job_id: str — номер задания
+    Возвращаемое значение: FileResponse — файл отчёта (409 Conflict, если задание ещё не выполнено)
+"""
+@router.get("/jobs/{job_id}/result")
+def read_job_result(job_id: str):
+    job = jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Задание не найдено")
+    if job.status != "done":
+        raise HTTPException(409, job.error or "Задание ещё не выполнено")
+    return FileResponse(job.path(jobs.manager.directory), media_type = jobs.MEDIA_TYPES[job.format],
+                        filename = f"{job.report or 'report'}.{job.format}")
 
 
 """
@@ -185,18 +505,16 @@ def get_employees_full(db=Depends(get_db)):
         db: Session — объект сессии SQLAlchemy
     Возвращаемое значение: Department — созданный отдел
 """
-@app.post("/departments", response_model = Department)
+@router.post("/departments", response_model = Department)
 def create_department(dep: Department, db: Session = Depends(get_db)):
-    existing = db.query(DepartmentModel).filter(DepartmentModel.name == dep.name).first()      # Ищем отдел с таким же именем
-    if existing:
+    new_dep = db_queries.create_department(db, dep.name)
+    if new_dep is None:
         raise HTTPException(status_code = 400, detail = "Отдел с таким именем уже существует")
-    new_dep = DepartmentModel(name = dep.name)     # Создаём объект модели SQLAlchemy
-   
-    db.add(new_dep)  # Добавляем объект в сессию БД
-   
+
     db.commit()  # Сохраняем изменения
-   
-    db.refresh(new_dep)  # Обновляем объект, чтобы получить id, созданный БД
+    cache.departments.invalidate()  # Сбрасываем кэш этого процесса сразу, не дожидаясь сверки версии
+
+    db.refresh(new_dep)  # Перечитываем объект после фиксации
     return new_dep
 
 
@@ -207,55 +525,141 @@ def create_department(dep: Department, db: Session = Depends(get_db)):
         db: Session — объект сессии SQLAlchemy
     Возвращаемое значение: Position — созданная должность
 """
-@app.post("/positions", response_model = Position)
+@router.post("/positions", response_model = Position)
 def create_position(pos: Position, db: Session = Depends(get_db)):
-    existing = db.query(PositionModel).filter(PositionModel.name == pos.name).first()    # Ищем должность с таким же именем
-    if existing:
+    new_pos = db_queries.create_position(db, pos.name)
+    if new_pos is None:
         raise HTTPException(status_code = 400, detail = "Должность с таким именем уже существует")
-    new_pos = PositionModel(name = pos.name)
-   
-    db.add(new_pos)  # Добавляем запись в сессию
-   
+
     db.commit()  # Фиксируем изменения
-   
-    db.refresh(new_pos)  # Обновляем объект, чтобы получить id, созданный БД
+    cache.positions.invalidate()  # Сбрасываем кэш этого процесса сразу, не дожидаясь сверки версии
+
+    db.refresh(new_pos)  # Перечитываем объект после фиксации
     return new_pos
 
 
+"""
+Функция массово индексирует зарплаты сотрудников (на процент или фиксированную сумму)
+    Отбор — те же фильтры, что и у списка сотрудников. Все записи пишутся одним запросом;
+    при dry_run возвращается только оценка стоимости без записи.
+    Маршрут объявлен раньше /salary/{employee_id}, чтобы путь не принимался за id сотрудника
+    Параметры:
+        params: SalaryIndexation — фильтры, размер индексации и дата вступления в силу
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: SalaryIndexationResult — количество сотрудников и изменение фонда оплаты
+"""
+@router.post("/salary/indexation", response_model = SalaryIndexationResult)
+def index_salaries(params: SalaryIndexation, db: Session = Depends(get_db)):
+    if (params.percent is None) == (params.delta is None):
+        raise HTTPException(400, "Укажите либо процент (percent), либо фиксированную прибавку (delta)")
+
+    summary = db_queries.index_salaries(
+        db, params.department_id, params.position_id, params.hire_date_from, params.hire_date_to,
+        params.effective_date, params.percent, params.delta, params.dry_run
+    )
+    if not params.dry_run:
+        db.commit()  # Все новые записи и текущие зарплаты сохраняются одной транзакцией
+
+    return {
+        "employees": summary.employees,
+        "current_total": round(summary.current_total, 2),
+        "new_total": round(summary.new_total, 2),
+        "difference": round(summary.new_total - summary.current_total, 2),
+        "dry_run": params.dry_run
+    }
+
+
 """
 Функция добавляет запись в историю зарплат сотрудника
-    Параметры: employee_id: int, sal: SalaryHistoryBase, db: Session
+    Одна транзакция без предварительной проверки сотрудника и без повторного чтения записи;
+    с заголовком Idempotency-Key повтор запроса не добавляет вторую запись
+    Параметры: employee_id: int, sal: SalaryHistoryBase, idempotency_key: str | None, db: Session
     Возвращаемое значение: SalaryHistory — созданная запись истории зарплаты
 """
-@app.post("/salary/{employee_id}", response_model=SalaryHistory)
-def add_salary_record(employee_id: int, sal: SalaryHistoryBase, db: Session = Depends(get_db)):
-    employee = db.query(EmployeeModel).filter(EmployeeModel.id == employee_id).first()  # Проверяем, что сотрудник существует
-    if not employee:
-        raise HTTPException(404, "Сотрудник не найден")
+@router.post("/salary/{employee_id}", response_model=SalaryHistory)
+def add_salary_record(employee_id: int, sal: SalaryHistoryBase, idempotency_key: str = Header(None, max_length = 255),
+                      db: Session = Depends(get_db)):
+    request_data = {"employee_id": employee_id, **sal.dict()}
+    try:
+        saved = db_queries.get_idempotent_response(db, "POST /salary", idempotency_key, request_data)
+        if saved is not None:
+            return saved  # Повтор уже выполненного запроса
+
+        new_record = db_queries.add_salary_record(db, employee_id, sal)
+        if new_record is None:
+            raise HTTPException(404, "Сотрудник не найден")
+
+        # Запись истории, текущая зарплата и сохранённый ответ фиксируются одной транзакцией
+        return db_queries.commit_idempotent(db, "POST /salary", idempotency_key, request_data, new_record)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+    except db_queries.IdempotencyConflict as error:
+        raise HTTPException(status_code = 409, detail = str(error))
 
-    new_record = SalaryHistoryModel(  # Создаём новый объект истории зарплаты
-        employee_id = employee_id,  # Привязываем запись к конкретному сотруднику
-        change_date = sal.change_date,  # Дата изменения зарплаты
-        amount = sal.amount  # Сумма зарплаты
-    )
 
-    db.add(new_record)  # Добавляем запись в БД
-    db.commit()  # Сохраняем изменения
-    db.refresh(new_record)  # Обновляем объект, чтобы получить id, созданный БД
+"""
+Функция отдаёт метрики пула подключений к БД в формате Prometheus
+    Параметры: отсутствуют
+    Возвращаемое значение: PlainTextResponse — текст метрик
+"""
+@router.get("/metrics", response_class = PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.render_pool_metrics(pools()), media_type = metrics.METRICS_MEDIA_TYPE)
 
-    return new_record
+
+"""
+Функция сообщает, готов ли процесс принимать запросы: 200 после прогрева, до этого 503
+    В ответе время этапов прогрева и ошибка последнего неудавшегося этапа
+    Параметры: request: Request — входящий HTTP-запрос
+    Возвращаемое значение: JSONResponse — состояние прогрева
+"""
+@router.get("/ready")
+def read_ready(request: Request):
+    return request.app.state.warmup.response()
 
 
 """
-Функция получает историю зарплат для указанного сотрудника
-    Параметры: employee_id: int, db: Session
-    Возвращаемое значение: list[SalaryHistory] — список записей истории зарплаты
+Функция прогревает кэши из WARMUP_CACHES через сессию чтения (на реплике, если они есть)
+    Параметры: отсутствуют
+    Возвращаемое значение: отсутствует
 """
-@app.get("/salary/{employee_id}", response_model = List[SalaryHistory])
-def get_salary_history(employee_id: int, db: Session = Depends(get_db)):
-    employee = db.query(EmployeeModel).filter(EmployeeModel.id == employee_id).first()  # Проверяем, что сотрудник существует
-    if not employee:
-        raise HTTPException(404, "Сотрудник не найден")
+def warm_caches():
+    db = open_read_session()
+    try:
+        startup.prime_caches(db)
+    finally:
+        db.close()
+
+
+"""
+Функция создаёт приложение FastAPI с маршрутами API и прогревом при запуске
+    Запуск нескольких процессов: uvicorn HRM:create_app --factory --workers 4
+    Параметры: отсутствуют
+    Возвращаемое значение: FastAPI — приложение
+"""
+def create_app():
+    app = FastAPI(lifespan = startup.lifespan(dispose_engines))
+    instrumentation.instrument(app)  # Количество и время SQL-запросов, сериализация — в Server-Timing и журнал
+
+    # Разрешаем доступ к API с любых источников
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],   # Разрешаем запросы с любых доменов
+        allow_methods=["*"],   # Разрешаем все HTTP-методы
+        allow_headers=["*"],    # Разрешаем все заголовки
+        expose_headers=["X-Next-Cursor", "Server-Timing"]   # Разрешаем браузеру читать курсор следующей страницы и замеры
+    )
+    app.add_middleware(compression.CompressionMiddleware)  # Сжатие gzip/brotli больших ответов
+    app.middleware("http")(read_your_writes)
+    app.include_router(router)
+
+    app.state.warmup = startup.Warmup([
+        ("configure", lambda: startup.configure(app)),
+        *((f"connections-{name}", lambda engine = engine: startup.open_connections(engine))
+          for name, engine in engines().items()),
+        ("caches", warm_caches)
+    ])
+    return app
+
 
-    salary_records = db.query(SalaryHistoryModel).filter(SalaryHistoryModel.employee_id == employee_id).all()  # Получаем все записи истории зарплаты
-    return salary_records
\ No newline at end of file
+app = create_app()  # Приложение для uvicorn HRM:app
@@ -0,0 +1,604 @@
+# Асинхронная версия API HRM
+#
+# Те же маршруты, что и в HRM.py, но обработчики — корутины, а запросы к БД идут
+# через асинхронный драйвер (aiomysql, для локального запуска — aiosqlite).
+# Один процесс обслуживает сотни одновременных запросов, не упираясь в пул потоков.
+# Запуск: uvicorn HRM_async:app (несколько процессов: uvicorn HRM_async:create_app --factory --workers 4)
+#
+# Отличия от HRM.py:
+#   - реплики (DATABASE_REPLICA_URLS) не используются: все запросы идут в основную БД,
+#     поэтому нет ни промежуточного слоя read-your-writes с cookie hrm_primary_until,
+#     ни заголовка X-Read-Consistency — клиент и так сразу видит свои изменения;
+#   - GET /metrics выводит асинхронный пул основной БД (pool="primary") и синхронный пул
+#     той же БД (pool="primary-sync"), через который фоновые задания /jobs строят отчёты.
+
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Response, Query, Header
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, FileResponse
+from typing import List, Literal
+from datetime import date
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engine
+from database_async import get_async_db, AsyncSessionLocal, async_engine
+from schemas import (Employee, EmployeeCreate, Department, Position, SalaryHistory, SalaryHistoryBase, EmployeeFull,
+                     BulkImportResult, SalaryIndexation, SalaryIndexationResult, PayrollEntry,
+                     SalaryStats, Changes, SalaryHistoryQuery, EmployeeSalaryHistory,
+                     JobCreate, JobStatus, PayrollProjection, projection_model)
+import db_queries
+import db_queries_async
+import streaming
+import cache
+import bulk_import
+import metrics
+import instrumentation
+import analytics
+import search
+import export
+import changes
+import compression
+import jobs
+import projection
+import startup
+
+# Маршруты API; приложение с ними создаёт create_app
+router = APIRouter(route_class = instrumentation.TimedRoute)  # Замеры проверки и сериализации ответа
+
+
+"""
+Функция получает все отделы из кэша справочников
+    Параметры: db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[Department] — список отделов
+"""
+@router.get("/departments", response_model = List[Department])
+async def read_departments(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda s: cache.reference_response(cache.departments, request, response, s))
+
+
+"""
+Функция получает все должности из кэша справочников
+    Параметры: db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[Position] — список должностей
+"""
+@router.get("/positions", response_model = List[Position])
+async def read_positions(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda s: cache.reference_response(cache.positions, request, response, s))
+
+
+"""
+Функция получает сотрудников с возможной фильтрацией, постранично или потоком NDJSON
+    Параметры: как у HRM.read_employees, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[Employee] — список сотрудников
+"""
+@router.get("/employees", response_model = List[Employee])
+async def read_employees(request: Request, response: Response, department_id: int = None, position_id: int = None,
+                         hire_date_from: str = None, hire_date_to: str = None, after: int = None,
+                         limit: int = Query(None, ge = 1, le = streaming.MAX_PAGE_SIZE),
+                         fields: str = None, include: str = None,
+                         db: AsyncSession = Depends(get_async_db)):
+    try:
+        projection = db_queries.parse_projection(fields, include)  # Выбранные поля — только эти столбцы в запросе
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    if not streaming.wants_ndjson(request):  # Поток NDJSON отдаётся без ETag
+        versions = await db_queries_async.get_versions(db, db_queries.EMPLOYEE_LIST_DATA)  # До выборки: ETag не новее данных
+        cached = cache.versioned_response(request, response, "employees", versions, vary = "Accept")
+        if cached:
+            return cached  # 304: список не изменился, выборка не выполняется
+
+    # Названия отделов и должностей — из кэша, если они нужны в ответе
+    departments = (await db.run_sync(cache.departments.get)).names if db_queries.includes(projection, "department") else {}
+    positions = (await db.run_sync(cache.positions.get)).names if db_queries.includes(projection, "position") else {}
+    to_dict = db_queries.employee_serializer(projection, departments, positions)
+    model = projection and projection_model(Employee, db_queries.projection_names(projection))  # Урезанная схема ответа
+
+    if streaming.wants_ndjson(request):
+        query = db_queries.employees_query(department_id, position_id, hire_date_from, hire_date_to, after, projection)
+        if limit:
+            query = query.limit(limit)
+        return streaming.ndjson_response_async(AsyncSessionLocal, lambda s: db_queries_async.iter_rows(s, query), to_dict)
+
+    rows = await db_queries_async.get_employees(db, department_id, position_id, hire_date_from, hire_date_to,
+                                                after, limit + 1 if limit else None, projection)
+    return streaming.list_response([to_dict(r) for r in streaming.paginate(rows, limit, response)], response, model)
+
+
+"""
+Функция ищет сотрудников по фамилии, имени и отчеству
+    Параметры: как у HRM.search_employees, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[Employee] — найденные сотрудники
+"""
+@router.get("/employees/search", response_model = List[Employee])
+async def search_employees(q: str = Query(..., min_length = 1, max_length = 200), limit: int = Query(20, ge = 1, le = 100),
+                           department_id: int = None, position_id: int = None,
+                           db: AsyncSession = Depends(get_async_db)):
+    index = await db.run_sync(search.names.refresh)
+    ids = index.search(q, limit, department_id, position_id)
+    departments = (await db.run_sync(cache.departments.get)).names
+    positions = (await db.run_sync(cache.positions.get)).names
+    rows = await db_queries_async.get_employees_by_ids(db, ids)
+    return [db_queries.employee_to_dict(r, departments, positions) for r in rows]
+
+
+"""
+Функция получает историю зарплат сотрудника по его id
+    Параметры:
+        employee_id: int — id сотрудника
+        db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[SalaryHistory] — список записей о зарплате сотрудника
+"""
+@router.get("/salary/{employee_id}", response_model = List[SalaryHistory])
+async def read_salary(employee_id: int, request: Request, response: Response,
+                      db: AsyncSession = Depends(get_async_db)):
+    versions = await db_queries_async.get_versions(db, db_queries.SALARY_HISTORY_DATA)
+    cached = cache.versioned_response(request, response, "salary", versions)
+    if cached:
+        return cached
+
+    rows = await db_queries_async.get_salary_history(db, employee_id)
+    return streaming.list_response([dict(r._mapping) for r in rows], response)
+
+
+"""
+Функция получает истории зарплат нескольких сотрудников одним запросом
+    Параметры: как у HRM.read_salaries, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[EmployeeSalaryHistory] — истории зарплат по сотрудникам
+"""
+@router.get("/salary", response_model = List[EmployeeSalaryHistory])
+async def read_salaries(request: Request, response: Response, employee_ids: List[str] = Query(...),
+                        date_from: date = None, date_to: date = None, last: int = Query(None, ge = 1),
+                        db: AsyncSession = Depends(get_async_db)):
+    try:
+        ids = db_queries.batch_employee_ids(employee_ids)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    versions = await db_queries_async.get_versions(db, db_queries.SALARY_HISTORY_DATA)
+    cached = cache.versioned_response(request, response, "salary", versions)
+    if cached:
+        return cached
+
+    rows = await db_queries_async.get_salary_histories(db, ids, date_from, date_to, last)
+    return streaming.list_response(db_queries.group_salary_histories(rows, ids), response)
+
+
+"""
+Функция получает истории зарплат нескольких сотрудников по списку в теле запроса
+    Параметры: как у HRM.read_salaries_batch, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[EmployeeSalaryHistory] — истории зарплат по сотрудникам
+"""
+@router.post("/salary", response_model = List[EmployeeSalaryHistory])
+async def read_salaries_batch(query: SalaryHistoryQuery, response: Response, db: AsyncSession = Depends(get_async_db)):
+    try:
+        ids = db_queries.batch_employee_ids(query.employee_ids)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+    if query.last is not None and query.last < 1:
+        raise HTTPException(status_code = 422, detail = "Параметр last должен быть не меньше 1")
+
+    rows = await db_queries_async.get_salary_histories(db, ids, query.date_from, query.date_to, query.last)
+    return streaming.list_response(db_queries.group_salary_histories(rows, ids), response)
+
+
+"""
+Функция получает зарплату каждого сотрудника, действовавшую на указанную дату
+    Параметры: как у HRM.read_payroll, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[PayrollEntry] — сотрудники с действующей зарплатой
+"""
+@router.get("/payroll", response_model = List[PayrollEntry])
+async def read_payroll(request: Request, response: Response, as_of: date, department_id: int = None,
+                       position_id: int = None, db: AsyncSession = Depends(get_async_db)):
+    versions = await db_queries_async.get_versions(db, db_queries.PAYROLL_DATA)
+    etag = f'"payroll-{"-".join(map(str, versions))}"'
+    max_age = cache.PAYROLL_MAX_AGE if as_of < date.today() else 0
+
+    cached = cache.not_modified(request, etag, max_age)
+    if cached:
+        return cached
+
+    response.headers.update(cache.cache_headers(etag, max_age))
+    return await db.run_sync(lambda s: cache.payroll.get(
+        (as_of, department_id, position_id), versions,
+        lambda: [dict(r._mapping) for r in db_queries.get_payroll(s, as_of, department_id, position_id)]
+    ))
+
+
+"""
+Функция считает фонд оплаты труда по отделам или должностям за каждый месяц, квартал или год окна
+    Параметры: как у HRM.read_payroll_projection, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[PayrollProjection] — фонд оплаты по периодам и группам
+"""
+@router.get("/payroll/projection", response_model = List[PayrollProjection])
+async def read_payroll_projection(request: Request, response: Response, date_from: date = Query(..., alias = "from"),
+                                  date_to: date = Query(..., alias = "to"),
+                                  granularity: Literal["month", "quarter", "year"] = "month",
+                                  group_by: Literal["department", "position"] = "department",
+                                  indexation: float = Query(0, ge = 0, le = 100),
+                                  db: AsyncSession = Depends(get_async_db)):
+    versions = await db_queries_async.get_versions(db, db_queries.PAYROLL_DATA)
+    cached = cache.versioned_response(request, response, f"projection-{date.today()}", versions)  # Прогноз зависит и от даты
+    if cached:
+        return cached
+
+    arrays = await db.run_sync(projection.salaries.refresh)
+    try:
+        rows = projection.project(arrays, date_from, date_to, granularity, group_by, indexation)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    names = (await db.run_sync({"department": cache.departments, "position": cache.positions}[group_by].get)).names
+    return streaming.list_response([{**row, "name": names.get(row["group"])} for row in rows], response)
+
+
+"""
+Функция считает сводную статистику зарплат по отделам, должностям или годам найма
+    Параметры: как у HRM.read_salary_stats, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[SalaryStats] — статистика по группам
+"""
+@router.get("/analytics/salaries", response_model = List[SalaryStats])
+async def read_salary_stats(request: Request, response: Response,
+                            group_by: Literal["department", "position", "hire_year"] = "department",
+                            db: AsyncSession = Depends(get_async_db)):
+    versions = await db_queries_async.get_versions(db, analytics.ANALYTICS_DATA)
+    etag = f'"analytics-{"-".join(map(str, versions))}"'
+
+    cached = cache.not_modified(request, etag)
+    if cached:
+        return cached
+
+    response.headers.update(cache.cache_headers(etag))
+    stats = await db.run_sync(
+        lambda s: cache.analytics.get((group_by,), versions, lambda: analytics.salary_stats(s, group_by))
+    )
+    names = {"department": cache.departments, "position": cache.positions}.get(group_by)
+    names = (await db.run_sync(names.get)).names if names else {}
+    return [{**s, "name": names.get(s["group"])} for s in stats]
+
+
+"""
+Функция отдаёт строки, созданные или изменённые после курсора (лента изменений)
+    Параметры: как у HRM.read_changes, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: Changes — строки по таблицам и курсор следующего запроса
+"""
+@router.get("/changes", response_model = Changes)
+async def read_changes(since: str = "0",
+                       limit: int = Query(streaming.MAX_PAGE_SIZE, ge = 1, le = streaming.MAX_PAGE_SIZE),
+                       db: AsyncSession = Depends(get_async_db)):
+    try:
+        return await db.run_sync(changes.get_changes, since, limit)
+    except ValueError as error:
+        raise HTTPException(status_code = 400, detail = str(error))
+
+
+"""
+Функция создаёт нового сотрудника и добавляет начальную запись о зарплате
+    Параметры: как у HRM.create_employee, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: dict — информация о созданном сотруднике с текущей зарплатой
+"""
+@router.post("/employees", response_model = Employee)
+async def create_employee(emp: EmployeeCreate, idempotency_key: str = Header(None, max_length = 255),
+                          db: AsyncSession = Depends(get_async_db)):
+    request_data = emp.dict()
+    try:
+        saved = await db_queries_async.get_idempotent_response(db, "POST /employees", idempotency_key, request_data)
+        if saved is not None:
+            return saved  # Повтор уже выполненного запроса
+
+        departments = (await db.run_sync(cache.departments.get_with, emp.department_id)).names
+        positions = (await db.run_sync(cache.positions.get_with, emp.position_id)).names
+        result = await db_queries_async.create_employee(db, emp, departments, positions)
+        if result is None:
+            raise HTTPException(422, "Отдел или должность не найдены")
+
+        # Сотрудник, история, текущая зарплата и сохранённый ответ фиксируются одной транзакцией
+        return await db_queries_async.commit_idempotent(db, "POST /employees", idempotency_key, request_data, result)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+    except db_queries.IdempotencyConflict as error:
+        raise HTTPException(status_code = 409, detail = str(error))
+
+
+"""
+Функция массово добавляет сотрудников из CSV или NDJSON
+    Параметры:
+        request: Request — запрос с телом text/csv или application/x-ndjson
+        db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: BulkImportResult — количество добавленных и ошибки по строкам
+"""
+@router.post("/employees/bulk", response_model = BulkImportResult)
+async def create_employees_bulk(request: Request, db: AsyncSession = Depends(get_async_db)):
+    media_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if media_type not in (bulk_import.CSV_MEDIA_TYPE, streaming.NDJSON_MEDIA_TYPE):
+        raise HTTPException(415, "Ожидается тело text/csv или application/x-ndjson")
+
+    job = bulk_import.BulkImport()
+    async for number, record in bulk_import.iter_records(request, media_type):
+        if job.add(number, record):
+            await db.run_sync(job.flush)
+    await db.run_sync(job.flush)
+
+    return job.result()
+
+
+"""
+Функция получает всех сотрудников с полной информацией, постранично или потоком NDJSON
+    Параметры: как у HRM.get_employees_full, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: list[EmployeeFull] — список сотрудников с полной информацией
+"""
+@router.get("/employees/full", response_model = List[EmployeeFull])
+async def get_employees_full(request: Request, response: Response, after: int = None,
+                             limit: int = Query(None, ge = 1, le = streaming.MAX_PAGE_SIZE),
+                             fields: str = None, include: str = None,
+                             db: AsyncSession = Depends(get_async_db)):
+    try:
+        projection = db_queries.parse_projection(fields, include)  # Выбранные поля — только эти столбцы в запросе
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    if not streaming.wants_ndjson(request):  # Поток NDJSON отдаётся без ETag
+        versions = await db_queries_async.get_versions(db, db_queries.EMPLOYEE_LIST_DATA)  # До выборки: ETag не новее данных
+        cached = cache.versioned_response(request, response, "employees-full", versions, vary = "Accept")
+        if cached:
+            return cached  # 304: список не изменился, выборка не выполняется
+
+    # Названия отделов и должностей — из кэша, если они нужны в ответе
+    departments = (await db.run_sync(cache.departments.get)).names if db_queries.includes(projection, "department") else {}
+    positions = (await db.run_sync(cache.positions.get)).names if db_queries.includes(projection, "position") else {}
+    to_dict = db_queries.employee_serializer(projection, departments, positions, full = True)
+    model = projection and projection_model(EmployeeFull, db_queries.projection_names(projection))  # Урезанная схема ответа
+
+    if streaming.wants_ndjson(request):
+        query = db_queries.employees_full_query(after, projection)
+        if limit:
+            query = query.limit(limit)
+        return streaming.ndjson_response_async(AsyncSessionLocal, lambda s: db_queries_async.iter_rows(s, query), to_dict)
+
+    rows = await db_queries_async.get_employees_full(db, after, limit + 1 if limit else None, projection)
+    return streaming.list_response([to_dict(r) for r in streaming.paginate(rows, limit, response)], response, model)
+
+
+"""
+Функция выгружает реестр сотрудников в файл CSV или XLSX потоком
+    Параметры: как у HRM.export_employees, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: StreamingResponse — файл employees.csv или employees.xlsx
+"""
+@router.get("/employees/export")
+async def export_employees(format: Literal["csv", "xlsx"] = "csv", department_id: int = None,
+                           position_id: int = None, hire_date_from: str = None, hire_date_to: str = None,
+                           db: AsyncSession = Depends(get_async_db)):
+    departments = (await db.run_sync(cache.departments.get)).names
+    positions = (await db.run_sync(cache.positions.get)).names
+    query = db_queries.employees_query(department_id, position_id, hire_date_from, hire_date_to)
+    return export.export_response_async(format, AsyncSessionLocal, lambda s: db_queries_async.iter_rows(s, query),
+                                        lambda row: export.export_values(row, departments, positions))
+
+
+"""
+Функция ставит тяжёлый отчёт в очередь фоновых заданий
+    Параметры: как у HRM.create_job, db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: JobStatus — задание (202 Accepted, адрес задания в заголовке Location)
+"""
+@router.post("/jobs", response_model = JobStatus, status_code = 202)
+async def create_job(response: Response, params: JobCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        report_params = jobs.report_params(params.report, params.format, params.dict())
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+
+    versions = await db_queries_async.get_versions(db, jobs.REPORT_DATA[params.report])
+    try:
+        job = jobs.manager.submit(params.report, params.format, report_params, versions)  # Задание — в пуле потоков
+    except jobs.QueueFull:
+        raise HTTPException(503, "Очередь заданий заполнена, повторите позже", headers = {"Retry-After": "30"})
+
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job.to_dict()
+
+
+"""
+Функция возвращает состояние фонового задания
+    Параметры: job_id: str — номер задания
+    Возвращаемое значение: JobStatus — задание
+"""
+@router.get("/jobs/{job_id}", response_model = JobStatus)
+async def read_job(job_id: str):
+    job = jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Задание не найдено")
+    return job.to_dict()
+
+
+"""
+Функция отдаёт файл результата фонового задания
+    Параметры: job_id: str — номер задания
+    Возвращаемое значение: FileResponse — файл отчёта (409 Conflict, если задание ещё не выполнено)
+"""
+@router.get("/jobs/{job_id}/result")
+async def read_job_result(job_id: str):
+    job = jobs.manager.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Задание не найдено")
+    if job.status != "done":
+        raise HTTPException(409, job.error or "Задание ещё не выполнено")
+    return FileResponse(job.path(jobs.manager.directory), media_type = jobs.MEDIA_TYPES[job.format],
+                        filename = f"{job.report or 'report'}.{job.format}")
+
+
+"""
+Функция создаёт новый отдел
+    Параметры:
+        dep: Department — данные нового отдела
+        db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: Department — созданный отдел
+"""
+@router.post("/departments", response_model = Department)
+async def create_department(dep: Department, db: AsyncSession = Depends(get_async_db)):
+    new_dep = await db_queries_async.create_department(db, dep.name)
+    if new_dep is None:
+        raise HTTPException(status_code = 400, detail = "Отдел с таким именем уже существует")
+
+    await db.commit()  # Сохраняем изменения
+    cache.departments.invalidate()  # Сбрасываем кэш этого процесса сразу, не дожидаясь сверки версии
+    return new_dep
+
+
+"""
+Функция создаёт новую должность
+    Параметры:
+        pos: Position — данные создаваемой должности
+        db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: Position — созданная должность
+"""
+@router.post("/positions", response_model = Position)
+async def create_position(pos: Position, db: AsyncSession = Depends(get_async_db)):
+    new_pos = await db_queries_async.create_position(db, pos.name)
+    if new_pos is None:
+        raise HTTPException(status_code = 400, detail = "Должность с таким именем уже существует")
+
+    await db.commit()  # Фиксируем изменения
+    cache.positions.invalidate()  # Сбрасываем кэш этого процесса сразу, не дожидаясь сверки версии
+    return new_pos
+
+
+"""
+Функция массово индексирует зарплаты сотрудников (на процент или фиксированную сумму)
+    Маршрут объявлен раньше /salary/{employee_id}, чтобы путь не принимался за id сотрудника
+    Параметры:
+        params: SalaryIndexation — фильтры, размер индексации и дата вступления в силу
+        db: AsyncSession — асинхронная сессия SQLAlchemy
+    Возвращаемое значение: SalaryIndexationResult — количество сотрудников и изменение фонда оплаты
+"""
+@router.post("/salary/indexation", response_model = SalaryIndexationResult)
+async def index_salaries(params: SalaryIndexation, db: AsyncSession = Depends(get_async_db)):
+    if (params.percent is None) == (params.delta is None):
+        raise HTTPException(400, "Укажите либо процент (percent), либо фиксированную прибавку (delta)")
+
+    summary = await db_queries_async.index_salaries(
+        db, params.department_id, params.position_id, params.hire_date_from, params.hire_date_to,
+        params.effective_date, params.percent, params.delta, params.dry_run
+    )
+    if not params.dry_run:
+        await db.commit()  # Все новые записи и текущие зарплаты сохраняются одной транзакцией
+
+    return {
+        "employees": summary.employees,
+        "current_total": round(summary.current_total, 2),
+        "new_total": round(summary.new_total, 2),
+        "difference": round(summary.new_total - summary.current_total, 2),
+        "dry_run": params.dry_run
+    }
+
+
+"""
+Функция добавляет запись в историю зарплат сотрудника
+    Параметры: как у HRM.add_salary_record, db: AsyncSession
+    Возвращаемое значение: SalaryHistory — созданная запись истории зарплаты
+"""
+@router.post("/salary/{employee_id}", response_model = SalaryHistory)
+async def add_salary_record(employee_id: int, sal: SalaryHistoryBase, idempotency_key: str = Header(None, max_length = 255),
+                            db: AsyncSession = Depends(get_async_db)):
+    request_data = {"employee_id": employee_id, **sal.dict()}
+    try:
+        saved = await db_queries_async.get_idempotent_response(db, "POST /salary", idempotency_key, request_data)
+        if saved is not None:
+            return saved  # Повтор уже выполненного запроса
+
+        new_record = await db_queries_async.add_salary_record(db, employee_id, sal)
+        if new_record is None:
+            raise HTTPException(404, "Сотрудник не найден")
+
+        # Запись истории, текущая зарплата и сохранённый ответ фиксируются одной транзакцией
+        return await db_queries_async.commit_idempotent(db, "POST /salary", idempotency_key, request_data, new_record)
+    except ValueError as error:
+        raise HTTPException(status_code = 422, detail = str(error))
+    except db_queries.IdempotencyConflict as error:
+        raise HTTPException(status_code = 409, detail = str(error))
+
+
+"""
+Функция возвращает пулы подключений процесса
+    Параметры: отсутствуют
+    Возвращаемое значение: dict[str, Pool] — асинхронный пул обработчиков и синхронный пул фоновых заданий
+"""
+def pools():
+    return {"primary": async_engine.sync_engine.pool, "primary-sync": engine.pool}
+
+
+"""
+Функция закрывает подключения обоих пулов процесса (при остановке приложения)
+    Параметры: отсутствуют
+    Возвращаемое значение: отсутствует
+"""
+async def dispose_engines():
+    await async_engine.dispose()
+    engine.dispose()
+
+
+"""
+Функция отдаёт метрики пулов подключений к БД в формате Prometheus
+    Параметры: отсутствуют
+    Возвращаемое значение: PlainTextResponse — текст метрик
+"""
+@router.get("/metrics", response_class = PlainTextResponse)
+async def read_metrics():
+    return PlainTextResponse(metrics.render_pool_metrics(pools()), media_type = metrics.METRICS_MEDIA_TYPE)
+
+
+"""
+Функция сообщает, готов ли процесс принимать запросы: 200 после прогрева, до этого 503
+    Параметры: request: Request — входящий HTTP-запрос
+    Возвращаемое значение: JSONResponse — состояние прогрева
+"""
+@router.get("/ready")
+async def read_ready(request: Request):
+    return request.app.state.warmup.response()
+
+
+"""
+Функция прогревает кэши из WARMUP_CACHES
+    Параметры: отсутствуют
+    Возвращаемое значение: отсутствует
+"""
+async def warm_caches():
+    async with AsyncSessionLocal() as db:
+        await db.run_sync(startup.prime_caches)
+
+
+"""
+Функция прогревает асинхронный пул подключений
+    Параметры: отсутствуют
+    Возвращаемое значение: отсутствует
+"""
+async def warm_connections():
+    await startup.open_connections_async(async_engine)
+
+
+"""
+Функция создаёт приложение FastAPI с маршрутами API и прогревом при запуске
+    Параметры: отсутствуют
+    Возвращаемое значение: FastAPI — приложение
+"""
+def create_app():
+    app = FastAPI(lifespan = startup.lifespan(dispose_engines))
+    instrumentation.instrument(app)  # Количество и время SQL-запросов, сериализация — в Server-Timing и журнал
+
+    # Разрешаем доступ к API с любых источников
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],   # Разрешаем запросы с любых доменов
+        allow_methods=["*"],   # Разрешаем все HTTP-методы
+        allow_headers=["*"],    # Разрешаем все заголовки
+        expose_headers=["X-Next-Cursor", "Server-Timing"]   # Разрешаем браузеру читать курсор следующей страницы и замеры
+    )
+    app.add_middleware(compression.CompressionMiddleware)  # Сжатие gzip/brotli больших ответов
+    app.include_router(router)
+
+    app.state.warmup = startup.Warmup([
+        ("configure", lambda: startup.configure(app)),
+        ("connections-primary", warm_connections),
+        ("caches", warm_caches)
+    ])
+    return app
+
+
+app = create_app()  # Приложение для uvicorn HRM_async:app
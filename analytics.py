@@ -0,0 +1,95 @@
+# Сводная аналитика по зарплатам: численность, фонд оплаты, средняя, медиана и процентили
+#
+# Количество, суммы, средние, минимум и максимум считаются в БД (GROUP BY). Для
+# процентилей из БД одним запросом читаются два столбца (группа, зарплата), и все
+# группы обрабатываются за один векторный проход NumPy без циклов по сотрудникам.
+
+import numpy as np
+from sqlalchemy import select, func, extract
+from sqlalchemy.orm import Session
+from models import Employee
+
+PERCENTILES = (10, 25, 50, 75, 90)  # Процентили зарплаты в каждой группе
+ANALYTICS_DATA = ("employees", "salary_history", "departments", "positions")  # От чего зависит результат (с названиями групп)
+
+# Выражения группировки: отдел, должность, год найма
+GROUPINGS = {
+    "department": Employee.department_id,
+    "position": Employee.position_id,
+    "hire_year": extract("year", Employee.hire_date),
+}
+
+
+"""
+Функция вычисляет процентили зарплаты для всех групп за один проход
+    Значения сортируются по (группа, зарплата), после чего процентиль каждой группы —
+    линейная интерполяция между соседними элементами её отрезка (как numpy.percentile)
+    Параметры:
+        keys: np.ndarray — ключ группы каждого сотрудника
+        salaries: np.ndarray — зарплата каждого сотрудника
+    Возвращаемое значение: dict[int, list[float]] — значения PERCENTILES по ключу группы
+"""
+def group_percentiles(keys, salaries):
+    if len(keys) == 0:
+        return {}
+
+    order = np.lexsort((salaries, keys))  # Сортировка по группе, внутри группы — по зарплате
+    keys, salaries = keys[order], salaries[order]
+    groups, starts, counts = np.unique(keys, return_index = True, return_counts = True)
+
+    q = np.array(PERCENTILES, dtype = float) / 100
+    positions = starts[:, None] + q[None, :] * (counts[:, None] - 1)  # Дробные позиции: группа x процентиль
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    values = salaries[lower] + (salaries[upper] - salaries[lower]) * (positions - lower)
+
+    return {int(key): [round(float(v), 2) for v in row] for key, row in zip(groups, values)}
+
+
+"""
+Функция считает сводную статистику зарплат по группам
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        group_by: str — группировка: "department", "position" или "hire_year"
+    Возвращаемое значение: list[dict] — статистика по группам, по возрастанию ключа группы
+"""
+def salary_stats(db: Session, group_by):
+    key = GROUPINGS[group_by].label("key")
+
+    totals = db.execute(
+        select(
+            key,
+            func.count().label("headcount"),
+            func.count(Employee.current_salary).label("salaried"),
+            func.coalesce(func.sum(Employee.current_salary), 0).label("total"),
+            func.avg(Employee.current_salary).label("average"),
+            func.min(Employee.current_salary).label("min"),
+            func.max(Employee.current_salary).label("max")
+        )
+        .where(key.isnot(None))
+        .group_by(key)
+        .order_by(key)
+    ).all()
+
+    # Один запрос за двумя столбцами для процентилей
+    pairs = db.execute(
+        select(key, Employee.current_salary).where(key.isnot(None), Employee.current_salary.isnot(None))
+    ).all()
+    keys = np.fromiter((p[0] for p in pairs), dtype = np.int64, count = len(pairs))
+    salaries = np.fromiter((p[1] for p in pairs), dtype = np.float64, count = len(pairs))
+    percentiles = group_percentiles(keys, salaries)
+
+    result = []
+    for row in totals:
+        values = percentiles.get(int(row.key), [None] * len(PERCENTILES))
+        result.append({
+            "group": int(row.key),
+            "headcount": row.headcount,
+            "salaried": row.salaried,
+            "total": round(row.total, 2),
+            "average": round(row.average, 2) if row.average is not None else None,
+            "min": row.min,
+            "max": row.max,
+            **{f"p{p}": v for p, v in zip(PERCENTILES, values)}
+        })
+    return result
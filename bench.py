@@ -0,0 +1,483 @@
+# Нагрузочное тестирование API HRM
+#
+# Прогоняет все маршруты HRM.py и для каждого считает задержку (p50/p95/p99),
+# пропускную способность, количество SQL-запросов на HTTP-запрос и пиковое
+# потребление памяти процессом. Результаты сохраняются в JSON и сравниваются
+# с сохранённым ранее прогоном (например, с прогоном предыдущего коммита).
+#
+#   python manage.py seed --employees 100000 --salary-rows 2000000
+#   python bench.py --save bench/baseline.json
+#   python bench.py --compare bench/baseline.json
+#   python bench.py --serialization   # выигрыш быстрой сериализации списков
+#   python bench.py --startup         # время импорта и прогрева приложений против бюджета
+#
+# По умолчанию приложение запускается в этом же процессе (TestClient) на базе
+# из DATABASE_URL, с --url запросы идут на уже запущенный сервер (без подсчёта SQL).
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+try:
+    import resource  # Нет в Windows — тогда пиковая память не измеряется
+except ImportError:
+    resource = None
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REGRESSION_THRESHOLD = 10.0  # На сколько процентов p95 может вырасти без отметки о регрессии
+IMPORT_BUDGET = 2.0  # Сколько секунд может длиться импорт приложения в новом процессе
+READY_TIMEOUT = 120.0  # Сколько секунд ждать, пока /ready ответит 200
+
+
+"""
+Класс SqlCounter считает SQL-запросы всех подключений процесса
+"""
+class SqlCounter:
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+        event.listen(Engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self.lock:
+            self.count += 1
+
+
+"""
+Функция возвращает пиковое потребление памяти процессом
+    Параметры: отсутствуют
+    Возвращаемое значение: float | None — мегабайты или None, если измерить нельзя
+"""
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # В macOS байты, в Linux килобайты
+
+
+"""
+Функция вычисляет процентиль по отсортированному списку
+    Параметры:
+        values: list[float] — отсортированные значения
+        percent: float — процентиль (0–100)
+    Возвращаемое значение: float — значение процентиля
+"""
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values) + 0.5) - 1))  # Метод ближайшего ранга
+    return values[index]
+
+
+"""
+Функция собирает данные, нужные сценариям: id сотрудников, отделов и должностей
+    Параметры: client: httpx.Client — клиент API
+    Возвращаемое значение: dict — данные для построения запросов
+"""
+def discover(client):
+    employees = client.get("/employees", params = {"limit": 1000}).json()
+    departments = client.get("/departments").json()
+    positions = client.get("/positions").json()
+    if not employees or not departments or not positions:
+        sys.exit("База пуста. Заполните её: python manage.py seed")
+    return {
+        "employee_ids": [e["id"] for e in employees],
+        "department_ids": [d["id"] for d in departments],
+        "position_ids": [p["id"] for p in positions],
+        "last_id": employees[len(employees) // 2]["id"],
+        "full_etag": client.get("/employees/full", params = {"limit": 1}).headers.get("etag", ""),  # Для условных запросов
+        "run": uuid.uuid4().hex[:8]  # Метка прогона для уникальных названий отделов и должностей
+    }
+
+
+"""
+Функция формирует CSV для массовой загрузки сотрудников
+    Параметры:
+        ctx: dict — данные из discover
+        rows: int — количество строк
+    Возвращаемое значение: str — тело запроса
+"""
+def bulk_csv(ctx, rows):
+    lines = ["last_name,first_name,middle_name,hire_date,department_id,position_id,amount"]
+    for i in range(rows):
+        dep = ctx["department_ids"][i % len(ctx["department_ids"])]
+        pos = ctx["position_ids"][i % len(ctx["position_ids"])]
+        lines.append(f"Нагрузка{i},Тест,,2024-01-01,{dep},{pos},50000")
+    return "\n".join(lines)
+
+
+"""
+Функция возвращает сценарии нагрузки: имя, признак записи и функцию выполнения запроса
+    Функция сценария принимает клиент, данные discover и номер запроса и возвращает ответ
+    Параметры: отсутствуют
+    Возвращаемое значение: list[tuple[str, bool, callable]] — сценарии
+"""
+def scenarios():
+    def pick(ctx, key, i):
+        return ctx[key][i % len(ctx[key])]
+
+    def employee_body(ctx, i):
+        return {"last_name": "Нагрузкин", "first_name": "Тест", "middle_name": None, "hire_date": str(date.today()),
+                "department_id": pick(ctx, "department_ids", i), "position_id": pick(ctx, "position_ids", i),
+                "amount": 50000}
+
+    return [
+        ("GET /departments", False, lambda c, ctx, i: c.get("/departments")),
+        ("GET /positions", False, lambda c, ctx, i: c.get("/positions")),
+        ("GET /employees?limit=100", False, lambda c, ctx, i: c.get("/employees", params = {"limit": 100})),
+        ("GET /employees?after=&limit=100", False,
+         lambda c, ctx, i: c.get("/employees", params = {"after": ctx["last_id"], "limit": 100})),
+        ("GET /employees?department_id=&position_id=", False,
+         lambda c, ctx, i: c.get("/employees", params = {"department_id": pick(ctx, "department_ids", i),
+                                                         "position_id": pick(ctx, "position_ids", i), "limit": 1000})),
+        ("GET /employees?hire_date_from=&hire_date_to=", False,
+         lambda c, ctx, i: c.get("/employees", params = {"hire_date_from": "2015-01-01", "hire_date_to": "2015-12-31",
+                                                         "limit": 1000})),
+        ("GET /employees (NDJSON)", False,
+         lambda c, ctx, i: c.get("/employees", headers = {"accept": "application/x-ndjson"})),
+        ("GET /employees/search?q=", False,
+         lambda c, ctx, i: c.get("/employees/search", params = {"q": ("иванов", "петр ал", "кузнецв", "ё")[i % 4]})),
+        ("GET /employees/full?limit=100", False, lambda c, ctx, i: c.get("/employees/full", params = {"limit": 100})),
+        ("GET /employees/full?limit=1000", False, lambda c, ctx, i: c.get("/employees/full", params = {"limit": 1000})),
+        ("GET /employees/full?fields=&include=&limit=1000", False,  # Только ФИО и зарплата
+         lambda c, ctx, i: c.get("/employees/full", params = {"fields": "last_name,first_name", "include": "salary", "limit": 1000})),
+        ("GET /employees/full (304)", False,  # Повторный запрос панели: данные не менялись
+         lambda c, ctx, i: c.get("/employees/full", headers = {"if-none-match": ctx["full_etag"]})),
+        ("GET /employees/full (NDJSON)", False,
+         lambda c, ctx, i: c.get("/employees/full", headers = {"accept": "application/x-ndjson"})),
+        ("GET /employees/export?format=csv", False, lambda c, ctx, i: c.get("/employees/export", params = {"format": "csv"})),
+        ("GET /employees/export?format=xlsx", False, lambda c, ctx, i: c.get("/employees/export", params = {"format": "xlsx"})),
+        ("POST /jobs (повторный отчёт)", False,  # Тот же отчёт при неизменных данных: задание уже есть
+         lambda c, ctx, i: c.post("/jobs", json = {"report": "employees", "format": "csv"})),
+        ("GET /salary/{employee_id}", False, lambda c, ctx, i: c.get(f"/salary/{pick(ctx, 'employee_ids', i)}")),
+        ("GET /salary?employee_ids= (100)", False,
+         lambda c, ctx, i: c.get("/salary", params = {"employee_ids": ",".join(map(str, ctx["employee_ids"][:100]))})),
+        ("POST /salary (1000, last=3)", False,
+         lambda c, ctx, i: c.post("/salary", json = {"employee_ids": ctx["employee_ids"], "last": 3})),
+        ("GET /payroll?as_of=", False, lambda c, ctx, i: c.get("/payroll", params = {"as_of": "2020-12-31"})),
+        ("GET /payroll?as_of=&department_id=", False,
+         lambda c, ctx, i: c.get("/payroll", params = {"as_of": "2020-12-31", "department_id": pick(ctx, "department_ids", i)})),
+        ("GET /payroll/projection (5 лет по месяцам)", False,
+         lambda c, ctx, i: c.get("/payroll/projection", params = {"from": f"{date.today().year - 3}-01-01",
+                                                                  "to": f"{date.today().year + 1}-12-31", "indexation": 5})),
+        ("GET /analytics/salaries?group_by=department", False,
+         lambda c, ctx, i: c.get("/analytics/salaries", params = {"group_by": "department"})),
+        ("GET /analytics/salaries?group_by=hire_year", False,
+         lambda c, ctx, i: c.get("/analytics/salaries", params = {"group_by": "hire_year"})),
+        ("GET /changes?since=0", False, lambda c, ctx, i: c.get("/changes", params = {"since": "0"})),
+        ("GET /changes (нет изменений)", False,  # Опрос клиента, уже получившего все изменения
+         lambda c, ctx, i: c.get("/changes", params = {"since": str(2 ** 62)})),
+        ("GET /metrics", False, lambda c, ctx, i: c.get("/metrics")),
+        ("POST /salary/indexation (dry_run)", False,
+         lambda c, ctx, i: c.post("/salary/indexation", json = {"department_id": pick(ctx, "department_ids", i),
+                                                               "percent": 5, "effective_date": str(date.today()),
+                                                               "dry_run": True})),
+        ("POST /employees", True, lambda c, ctx, i: c.post("/employees", json = employee_body(ctx, i))),
+        ("POST /employees (Idempotency-Key)", True,  # Каждый второй запрос — повтор предыдущего
+         lambda c, ctx, i: c.post("/employees", json = employee_body(ctx, i // 2),
+                                  headers = {"idempotency-key": f"{ctx['run']}-{i // 2}"})),
+        ("POST /salary/{employee_id}", True,
+         lambda c, ctx, i: c.post(f"/salary/{pick(ctx, 'employee_ids', i)}",
+                                  json = {"change_date": str(date.today()), "amount": 60000 + i})),
+        ("POST /employees/bulk (100 rows)", True,
+         lambda c, ctx, i: c.post("/employees/bulk", content = bulk_csv(ctx, 100).encode("utf-8"),
+                                  headers = {"content-type": "text/csv"})),
+        ("POST /departments", True,
+         lambda c, ctx, i: c.post("/departments", json = {"id": 0, "name": f"Нагрузка {ctx['run']} {i}"})),
+        ("POST /positions", True,
+         lambda c, ctx, i: c.post("/positions", json = {"id": 0, "name": f"Нагрузка {ctx['run']} {i}"})),
+    ]
+
+
+"""
+Функция прогоняет один сценарий и собирает его показатели
+    Параметры:
+        client: httpx.Client — клиент API
+        run: callable — функция сценария
+        ctx: dict — данные из discover
+        requests: int — количество измеряемых запросов
+        warmup: int — количество запросов прогрева (не учитываются)
+        concurrency: int — количество параллельных потоков
+        sql: SqlCounter | None — счётчик SQL-запросов (только при запуске в этом же процессе)
+    Возвращаемое значение: dict — показатели сценария
+"""
+def measure(client, run, ctx, requests, warmup, concurrency, sql):
+    for i in range(warmup):
+        run(client, ctx, i)
+
+    def timed(i):
+        start = time.perf_counter()
+        response = run(client, ctx, warmup + i)
+        return time.perf_counter() - start, response.status_code, len(response.content)
+
+    sql_before = sql.count if sql else 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = concurrency) as pool:
+        results = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds * 1000 for seconds, _, _ in results)
+    return {
+        "requests": requests,
+        "errors": sum(1 for _, status, _ in results if status >= 400),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2),
+        "throughput_rps": round(requests / elapsed, 1),
+        "sql_per_request": round((sql.count - sql_before) / requests, 1) if sql else None,
+        "response_bytes": round(statistics.fmean(size for _, _, size in results)),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+"""
+Функция возвращает сведения о прогоне для файла результатов
+    Параметры: args: argparse.Namespace — аргументы командной строки
+    Возвращаемое значение: dict — коммит, база данных, параметры прогона
+"""
+def run_info(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = None
+    database_url = os.getenv("DATABASE_URL", "")
+    return {
+        "commit": commit or None,
+        "date": datetime.now().isoformat(timespec = "seconds"),
+        "database": args.url or database_url.split("://")[0] or "default",
+        "python": platform.python_version(),
+        "requests": args.requests,
+        "concurrency": args.concurrency
+    }
+
+
+"""
+Функция печатает таблицу показателей
+    Параметры: results: dict[str, dict] — показатели по сценариям
+    Возвращаемое значение: отсутствует
+"""
+def print_results(results):
+    print(f"{'Сценарий':48} {'p50':>8} {'p95':>8} {'p99':>8} {'RPS':>8} {'SQL':>6} {'RSS МБ':>8} {'Ошибки':>7}")
+    for name, r in results.items():
+        sql = "-" if r["sql_per_request"] is None else r["sql_per_request"]
+        rss = "-" if r["peak_rss_mb"] is None else r["peak_rss_mb"]
+        print(f"{name:48} {r['p50_ms']:8} {r['p95_ms']:8} {r['p99_ms']:8} {r['throughput_rps']:8} {sql:>6} {rss:>8} {r['errors']:7}")
+
+
+"""
+Функция сравнивает прогон с сохранённым и печатает изменения
+    Регрессией считается рост p95 больше чем на threshold процентов или появление лишних SQL-запросов
+    (дробная часть среднего — периодическая сверка версий кэша, её не учитываем)
+    Параметры:
+        results: dict[str, dict] — показатели текущего прогона
+        baseline: dict — содержимое сохранённого файла результатов
+        threshold: float — допустимый рост p95, в процентах
+    Возвращаемое значение: list[str] — сценарии с регрессией
+"""
+def compare(results, baseline, threshold):
+    print(f"\nСравнение с {baseline['info'].get('commit')} ({baseline['info'].get('date')}):")
+    print(f"{'Сценарий':48} {'p95 было':>10} {'p95 стало':>10} {'изм.':>8} {'SQL было':>9} {'SQL стало':>10}")
+
+    regressions = []
+    for name, r in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:48} {'нет в базовом прогоне':>50}")
+            continue
+
+        change = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        more_sql = r["sql_per_request"] is not None and old["sql_per_request"] is not None \
+            and r["sql_per_request"] >= old["sql_per_request"] + 0.5
+        mark = ""
+        if change > threshold or more_sql:
+            regressions.append(name)
+            mark = "  <- регрессия"
+        print(f"{name:48} {old['p95_ms']:10} {r['p95_ms']:10} {change:+7.1f}% "
+              f"{str(old['sql_per_request']):>9} {str(r['sql_per_request']):>10}{mark}")
+
+    return regressions
+
+
+# Сценарии, на которых сравниваются обычная и быстрая сериализация списков
+SERIALIZATION_SCENARIOS = ("GET /employees?department_id=&position_id=", "GET /employees?hire_date_from=&hire_date_to=",
+                           "GET /employees/full?limit=100", "GET /employees/full?limit=1000", "GET /salary/{employee_id}")
+
+
+"""
+Функция сравнивает обычную сериализацию списков (проверка response_model) с быстрой
+    Каждый сценарий прогоняется дважды в этом же процессе: с выключенным и включённым
+    streaming.FAST_SERIALIZATION
+    Параметры:
+        client: httpx.Client — клиент API (приложение в этом же процессе)
+        ctx: dict — данные из discover
+        args: argparse.Namespace — аргументы командной строки
+    Возвращаемое значение: отсутствует
+"""
+def compare_serialization(client, ctx, args):
+    import streaming
+
+    print(f"{'Сценарий':48} {'p50 обычн.':>11} {'p50 быстр.':>11} {'RPS обычн.':>11} {'RPS быстр.':>11} {'ускорение':>10}")
+    for name, _, run in scenarios():
+        if name not in SERIALIZATION_SCENARIOS:
+            continue
+        measured = {}
+        for fast in (False, True):
+            streaming.FAST_SERIALIZATION = fast
+            measured[fast] = measure(client, run, ctx, args.requests, args.warmup, args.concurrency, None)
+        slow, fast = measured[False], measured[True]
+        print(f"{name:48} {slow['p50_ms']:11} {fast['p50_ms']:11} {slow['throughput_rps']:11} {fast['throughput_rps']:11} "
+              f"{slow['p50_ms'] / fast['p50_ms']:9.2f}x")
+
+
+"""
+Функция измеряет запуск приложения: импорт модуля в новом процессе (медиана по нескольким
+запускам), время до ответа 200 от /ready после старта и первый запрос после прогрева
+    Параметры:
+        module: str — модуль приложения: "HRM" или "HRM_async"
+        runs: int — сколько раз измерить импорт
+    Возвращаемое значение: dict — время импорта, прогрева по этапам и первого запроса в секундах
+"""
+def measure_startup(module, runs):
+    code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    imports = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", code], capture_output = True, text = True, check = True).stdout
+        imports.append(float(output.split()[-1]))
+
+    from fastapi.testclient import TestClient
+    import importlib
+    app = importlib.import_module(module).app
+    started = time.perf_counter()
+    with TestClient(app) as client:  # Обработчик lifespan запускает прогрев
+        while (ready := client.get("/ready")).status_code != 200:
+            if time.perf_counter() - started > READY_TIMEOUT:
+                raise RuntimeError(f"{module}: /ready не ответил 200 за {READY_TIMEOUT} с: {ready.json()}")
+            time.sleep(0.05)
+        warmup = time.perf_counter() - started
+        request_started = time.perf_counter()
+        client.get("/employees", params = {"limit": 50})
+        first_request = time.perf_counter() - request_started
+
+    return {"import_seconds": round(statistics.median(imports), 3), "warmup_seconds": round(warmup, 3),
+            "stages": ready.json()["stages"], "first_request_seconds": round(first_request, 3)}
+
+
+"""
+Функция сравнивает время запуска приложений с бюджетом; при превышении завершает работу с кодом 1
+    Параметры: args: argparse.Namespace — аргументы командной строки
+    Возвращаемое значение: отсутствует
+"""
+def compare_startup(args):
+    import startup
+
+    over_budget = []
+    print(f"{'Приложение':12} {'импорт, с':>10} {'прогрев, с':>11} {'1-й запрос, мс':>15}  этапы прогрева")
+    for module in ("HRM", "HRM_async"):
+        result = measure_startup(module, args.startup_runs)
+        stages = ", ".join(f"{name} {seconds}" for name, seconds in result["stages"].items())
+        print(f"{module:12} {result['import_seconds']:10} {result['warmup_seconds']:11} "
+              f"{result['first_request_seconds'] * 1000:15.1f}  {stages}")
+        if result["import_seconds"] > args.import_budget:
+            over_budget.append(f"{module}: импорт {result['import_seconds']} с > {args.import_budget} с")
+        if result["warmup_seconds"] > startup.STARTUP_BUDGET:
+            over_budget.append(f"{module}: прогрев {result['warmup_seconds']} с > {startup.STARTUP_BUDGET} с")
+
+    if over_budget:
+        print("\nПревышен бюджет запуска:\n  " + "\n  ".join(over_budget))
+        sys.exit(1)
+
+
+"""
+Функция создаёт клиент API: приложение в этом же процессе или запущенный сервер
+    Параметры: url: str | None — адрес сервера
+    Возвращаемое значение: tuple[httpx.Client, SqlCounter | None] — клиент и счётчик SQL-запросов
+"""
+def make_client(url):
+    if url:
+        return httpx.Client(base_url = url, timeout = 300), None
+
+    from fastapi.testclient import TestClient
+    import HRM
+    return TestClient(HRM.app), SqlCounter()
+
+
+"""
+Функция разбирает аргументы командной строки и запускает прогон
+    Параметры: argv: list[str] | None — аргументы (по умолчанию из sys.argv)
+    Возвращаемое значение: отсутствует
+"""
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Нагрузочное тестирование API HRM")
+    parser.add_argument("--url", help = "адрес запущенного сервера (по умолчанию приложение запускается в этом процессе)")
+    parser.add_argument("--requests", type = int, default = 50, help = "количество измеряемых запросов на сценарий")
+    parser.add_argument("--warmup", type = int, default = 3, help = "количество запросов прогрева на сценарий")
+    parser.add_argument("--concurrency", type = int, default = 1, help = "количество параллельных запросов")
+    parser.add_argument("--only", help = "прогнать только сценарии, в имени которых есть эта строка")
+    parser.add_argument("--read-only", action = "store_true", help = "не прогонять сценарии, изменяющие данные")
+    parser.add_argument("--save", help = "сохранить результаты в JSON-файл")
+    parser.add_argument("--compare", help = "сравнить с сохранённым JSON-файлом результатов")
+    parser.add_argument("--threshold", type = float, default = REGRESSION_THRESHOLD,
+                        help = "допустимый рост p95 в процентах при сравнении")
+    parser.add_argument("--serialization", action = "store_true",
+                        help = "сравнить обычную и быструю сериализацию списков (только в этом процессе)")
+    parser.add_argument("--startup", action = "store_true",
+                        help = "измерить импорт и прогрев HRM и HRM_async и сравнить с бюджетом (только в этом процессе)")
+    parser.add_argument("--startup-runs", type = int, default = 5, help = "сколько раз измерить импорт для --startup")
+    parser.add_argument("--import-budget", type = float, default = IMPORT_BUDGET,
+                        help = "допустимое время импорта приложения в секундах для --startup")
+    args = parser.parse_args(argv)
+
+    if args.serialization and args.url:
+        parser.error("--serialization переключает режим внутри приложения и несовместим с --url")
+    if args.startup and args.url:
+        parser.error("--startup запускает приложения в этом процессе и несовместим с --url")
+
+    if args.startup:
+        compare_startup(args)
+        return
+
+    client, sql = make_client(args.url)
+    ctx = discover(client)
+
+    if args.serialization:
+        compare_serialization(client, ctx, args)
+        return
+
+    results = {}
+    for name, writes, run in scenarios():
+        if (args.only and args.only not in name) or (args.read_only and writes):
+            continue
+        results[name] = measure(client, run, ctx, args.requests, args.warmup, args.concurrency, sql)
+        print(f"{name}: p95 {results[name]['p95_ms']} мс", file = sys.stderr)
+
+    print_results(results)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok = True)
+        with open(args.save, "w", encoding = "utf-8") as f:
+            json.dump({"info": run_info(args), "results": results}, f, ensure_ascii = False, indent = 2)
+        print(f"\nРезультаты сохранены: {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding = "utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nРегрессии: {len(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# Массовая загрузка сотрудников из CSV или NDJSON
+#
+# Тело запроса читается потоком, строки проверяются схемой EmployeeCreate
+# и вставляются пачками: одна транзакция и один многострочный INSERT на пачку.
+
+import csv
+import json
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from schemas import EmployeeCreate
+from streaming import NDJSON_MEDIA_TYPE
+import db_queries
+import cache
+
+BULK_CHUNK_SIZE = 1000  # Количество сотрудников в одной транзакции
+MAX_REPORTED_ERRORS = 1000  # Сколько ошибок по строкам возвращать в ответе
+
+CSV_MEDIA_TYPE = "text/csv"
+
+
+"""
+Функция-генератор разбивает поток тела запроса на текстовые строки
+    Неполная строка в конце куска остаётся в буфере, и перевод строки в ней повторно
+    не ищется: поиск продолжается с места, где закончился, поэтому длинная строка,
+    пришедшая многими кусками, разбирается за линейное время
+    Параметры: request: Request — входящий HTTP-запрос
+    Возвращаемое значение: AsyncIterator[str] — строки тела без символов перевода строки
+"""
+async def iter_lines(request):
+    buffer = bytearray()
+    async for chunk in request.stream():
+        searched = len(buffer)  # В буфере до этого куска перевода строки нет
+        buffer += chunk
+        start = 0
+        while (end := buffer.find(b"\n", searched)) != -1:
+            yield buffer[start:end].decode("utf-8-sig").rstrip("\r")
+            start = searched = end + 1
+        del buffer[:start]  # Остаётся неполная строка
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+
+"""
+Функция-генератор разбирает тело запроса на записи
+    CSV должен начинаться со строки заголовка с именами полей EmployeeCreate. Поле в кавычках
+    может содержать перевод строки: запись продолжается, пока число кавычек в ней нечётное
+    (экранированная кавычка "" не меняет чётности). Номер записи — номер её первой строки
+    Параметры:
+        request: Request — входящий HTTP-запрос
+        media_type: str — формат тела (text/csv или application/x-ndjson)
+    Возвращаемое значение: AsyncIterator[tuple[int, dict | Exception]] — номер строки и запись или ошибка разбора
+"""
+async def iter_records(request, media_type):
+    header = None
+    number = 0
+    pending = None  # Начало записи CSV, поле в кавычках которой продолжается на следующей строке
+    async for line in iter_lines(request):
+        number += 1
+        if pending is not None:
+            line = f"{pending}\n{line}"
+        elif not line.strip():
+            continue  # Пустые строки пропускаем
+        else:
+            start = number  # Номер первой строки записи
+
+        if media_type != NDJSON_MEDIA_TYPE and line.count('"') % 2:
+            pending = line  # Нечётное число кавычек: поле в кавычках не закрыто
+            continue
+        pending = None
+
+        try:
+            if media_type == NDJSON_MEDIA_TYPE:
+                yield start, json.loads(line)
+            elif header is None:
+                header = [name.strip() for name in next(csv.reader([line]))]  # Первая строка CSV — заголовок
+            else:
+                values = next(csv.reader([line]))
+                yield start, {name: (value if value != "" else None) for name, value in zip(header, values)}
+        except (ValueError, csv.Error) as e:
+            yield start, e
+
+    if pending is not None:
+        yield start, ValueError("Не закрыты кавычки поля в конце CSV")
+
+
+"""
+Функция формирует текст ошибки проверки строки
+    Параметры: error: Exception — ошибка разбора или проверки схемой
+    Возвращаемое значение: str — описание ошибки
+"""
+def describe_error(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+"""
+Класс BulkImport накапливает проверенные строки и итог загрузки
+"""
+class BulkImport:
+    def __init__(self):
+        self.chunk = []  # Проверенные строки текущей пачки: (номер строки, EmployeeCreate)
+        self.inserted = 0  # Сколько сотрудников вставлено
+        self.failed = 0  # Сколько строк отклонено
+        self.errors = []  # Ошибки по строкам (не больше MAX_REPORTED_ERRORS)
+
+    """
+    Метод проверяет запись схемой EmployeeCreate и добавляет её в пачку
+        Параметры:
+            number: int — номер строки в теле запроса
+            record: dict | Exception — запись или ошибка разбора строки
+        Возвращаемое значение: bool — True, если пачка заполнена и её пора вставлять
+    """
+    def add(self, number, record):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            self.chunk.append((number, EmployeeCreate(**record)))
+        except (ValidationError, ValueError, TypeError) as e:
+            self.reject(number, describe_error(e))
+        return len(self.chunk) >= BULK_CHUNK_SIZE
+
+    """
+    Метод отмечает строку как отклонённую
+        Параметры:
+            number: int — номер строки
+            error: str — описание ошибки
+        Возвращаемое значение: отсутствует
+    """
+    def reject(self, number, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": number, "error": error})
+
+    """
+    Метод вставляет накопленную пачку одной транзакцией
+        Строки с несуществующим отделом или должностью отклоняются заранее по кэшу справочников
+        (если отдела или должности нет в кэше, он сверяется с БД: их могли создать в другом процессе)
+        Параметры: db: Session — объект сессии SQLAlchemy
+        Возвращаемое значение: отсутствует
+    """
+    def flush(self, db):
+        chunk, self.chunk = self.chunk, []
+        departments = cache.departments.get_with(db, *{emp.department_id for _, emp in chunk}).names
+        positions = cache.positions.get_with(db, *{emp.position_id for _, emp in chunk}).names
+
+        valid = []
+        for number, emp in chunk:
+            if emp.department_id not in departments:
+                self.reject(number, f"Отдел {emp.department_id} не найден")
+            elif emp.position_id not in positions:
+                self.reject(number, f"Должность {emp.position_id} не найдена")
+            else:
+                valid.append((number, emp))
+
+        if not valid:
+            return
+
+        try:
+            db_queries.bulk_insert_employees(db, [emp for _, emp in valid])
+            db.commit()  # Одна транзакция на пачку
+            self.inserted += len(valid)
+        except SQLAlchemyError as e:
+            db.rollback()
+            for number, _ in valid:
+                self.reject(number, f"Пачка не сохранена: {e.__class__.__name__}")
+
+    """
+    Метод возвращает итог загрузки
+        Параметры: отсутствуют
+        Возвращаемое значение: dict — данные схемы BulkImportResult
+    """
+    def result(self):
+        return {"inserted": self.inserted, "failed": self.failed, "errors": self.errors}
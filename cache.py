@@ -0,0 +1,213 @@
+# Кэш справочников (отделы, должности) в памяти процесса и HTTP-кэширование
+#
+# Справочники меняются редко, поэтому каждый процесс uvicorn держит их копию в памяти.
+# Актуальность проверяется по счётчику версии в таблице data_versions: запись
+# в справочник увеличивает счётчик в своей транзакции, и все процессы при следующей
+# проверке перечитывают данные. Тот же номер версии служит ETag для ответа.
+#
+# Результаты тяжёлых выборок (ведомость зарплат на дату, аналитика) хранятся в ResultCache
+# вместе с версиями данных, по которым они посчитаны, и пересчитываются после записи.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import Response
+import db_queries
+
+REFERENCE_CHECK_INTERVAL = float(os.getenv("REFERENCE_CHECK_INTERVAL", "1"))  # Как часто (сек) сверять версию с БД
+REFERENCE_MAX_AGE = int(os.getenv("REFERENCE_MAX_AGE", "0"))  # Сколько секунд браузер может не перепроверять справочник
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "8"))  # Сколько результатов выборок держать в памяти процесса
+PAYROLL_MAX_AGE = int(os.getenv("PAYROLL_MAX_AGE", "3600"))  # Сколько секунд можно не перепроверять ведомость за прошлую дату
+
+
+"""
+Класс ReferenceCache хранит справочник в памяти процесса
+    name — имя набора данных в таблице data_versions
+    load — функция load(db), читающая записи справочника из БД
+"""
+class ReferenceCache:
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+        self.version = None  # Версия загруженных данных, None — данных нет
+        self.checked_at = 0.0  # Время последней сверки версии с БД
+        self.items = []  # Записи справочника: список словарей {"id", "name"}
+        self.names = {}  # Названия по id
+        self.lock = threading.Lock()
+
+    """
+    Метод возвращает актуальный справочник, при необходимости перечитывая его из БД
+        Справочник читается без блокировки, под ней только заменяются items и names:
+        в HRM_async чтение идёт через run_sync, и пока оно ждёт БД, цикл событий выполняет
+        другие корутины в том же потоке — ожидание threading.Lock остановило бы его
+        Параметры: db: Session — объект сессии SQLAlchemy
+        Возвращаемое значение: ReferenceCache — сам кэш с актуальными items и names
+    """
+    def get(self, db):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < REFERENCE_CHECK_INTERVAL:
+            return self  # Версию недавно сверяли, в БД не ходим
+
+        version = db_queries.get_version(db, self.name)  # Один запрос по первичному ключу
+        items = None
+        if version != self.version:
+            items = [{"id": r.id, "name": r.name} for r in self.load(db)]
+
+        with self.lock:
+            if items is not None and (self.version is None or version > self.version):  # Не заменяем более новые данные
+                self.items = items
+                self.names = {item["id"]: item["name"] for item in items}
+                self.version = version
+            self.checked_at = now
+        return self
+
+    """
+    Метод возвращает актуальный справочник, в котором есть записи с указанными id
+        Если какой-то записи нет, версия сверяется с БД сразу (один раз), не дожидаясь
+        REFERENCE_CHECK_INTERVAL: запись могла только что появиться в другом процессе
+        Параметры:
+            db: Session — объект сессии SQLAlchemy
+            ids: int — id записей
+        Возвращаемое значение: ReferenceCache — сам кэш
+    """
+    def get_with(self, db, *ids):
+        names = self.get(db).names
+        if any(id not in names for id in ids):
+            self.checked_at = 0.0
+            self.get(db)
+        return self
+
+    """
+    Метод сбрасывает кэш после записи в справочник в этом процессе
+        Параметры: отсутствуют
+        Возвращаемое значение: отсутствует
+    """
+    def invalidate(self):
+        with self.lock:
+            self.version = None
+
+    """
+    Метод возвращает ETag текущей версии справочника
+        Параметры: отсутствуют
+        Возвращаемое значение: str — значение заголовка ETag
+    """
+    def etag(self):
+        return f'"{self.name}-{self.version}"'
+
+
+departments = ReferenceCache("departments", db_queries.get_departments)  # Кэш отделов
+positions = ReferenceCache("positions", db_queries.get_positions)  # Кэш должностей
+
+
+"""
+Класс ResultCache хранит последние результаты выборок в памяти процесса (LRU)
+    Результат действителен, пока не изменились версии данных, по которым он посчитан
+"""
+class ResultCache:
+    def __init__(self, size):
+        self.size = size  # Максимальное количество результатов
+        self.entries = OrderedDict()  # Ключ выборки -> (версии данных, результат)
+        self.lock = threading.Lock()
+
+    """
+    Метод возвращает результат выборки из кэша или вычисляет его
+        Параметры:
+            key: tuple — параметры выборки
+            versions: tuple[int] — текущие версии данных, по которым строится выборка
+            load: callable — функция без параметров, вычисляющая результат
+        Возвращаемое значение: результат выборки
+    """
+    def get(self, key, versions, load):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self.entries.move_to_end(key)
+                return entry[1]
+
+        value = load()  # Считаем без блокировки: другие выборки не ждут
+        with self.lock:
+            self.entries[key] = (versions, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last = False)  # Вытесняем давно не использованный результат
+        return value
+
+
+payroll = ResultCache(RESULT_CACHE_SIZE)  # Ведомости зарплат на дату
+analytics = ResultCache(RESULT_CACHE_SIZE)  # Сводная аналитика зарплат по группировкам
+
+
+"""
+Функция формирует заголовки HTTP-кэширования
+    Параметры:
+        etag: str — значение ETag
+        max_age: int — сколько секунд ответ можно не перепроверять (0 — проверять каждый раз)
+    Возвращаемое значение: dict — заголовки ETag и Cache-Control
+"""
+def cache_headers(etag, max_age = 0):
+    cache_control = f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+"""
+Функция проверяет условный запрос и при совпадении ETag возвращает ответ 304
+    Параметры:
+        request: Request — входящий HTTP-запрос
+        etag: str — текущее значение ETag
+        max_age: int — срок, на который ответ можно не перепроверять
+    Возвращаемое значение: Response | None — ответ 304 или None, если данные нужно отдать
+"""
+def not_modified(request, etag, max_age = 0):
+    candidates = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code = 304, headers = cache_headers(etag, max_age))
+    return None
+
+
+"""
+Функция проверяет условный запрос по версиям данных, из которых строится ответ
+    Версии читаются одним запросом до выборки, поэтому ответ 304 не выполняет саму выборку.
+    ETag относится к URL, параметры запроса в него не входят
+    Параметры:
+        request: Request — входящий HTTP-запрос
+        response: Response — ответ обработчика, в который пишутся заголовки
+        name: str — префикс ETag, например "employees"
+        versions: tuple[int] — версии данных (db_queries.get_versions)
+        max_age: int — сколько секунд ответ можно не перепроверять
+        vary: str | None — заголовки запроса, от которых зависит представление (заголовок Vary),
+            например "Accept", если по тому же URL отдаётся JSON или NDJSON
+    Возвращаемое значение: Response | None — ответ 304 или None, если данные нужно отдать
+"""
+def versioned_response(request, response, name, versions, max_age = 0, vary = None):
+    etag = f'"{name}-{"-".join(map(str, versions))}"'
+    cached = not_modified(request, etag, max_age)
+    if cached:
+        if vary:
+            cached.headers["Vary"] = vary
+        return cached
+    response.headers.update(cache_headers(etag, max_age))
+    if vary:
+        response.headers["Vary"] = vary
+    return None
+
+
+"""
+Функция отдаёт справочник из кэша с поддержкой ETag и 304 Not Modified
+    Параметры:
+        reference: ReferenceCache — кэш справочника
+        request: Request — входящий HTTP-запрос
+        response: Response — ответ обработчика, в который пишутся заголовки
+        db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: list[dict] | Response — записи справочника или ответ 304
+"""
+def reference_response(reference, request, response, db):
+    reference.get(db)
+    etag = reference.etag()
+
+    cached = not_modified(request, etag, REFERENCE_MAX_AGE)
+    if cached:
+        return cached
+
+    response.headers.update(cache_headers(etag, REFERENCE_MAX_AGE))
+    return reference.items
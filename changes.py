@@ -0,0 +1,174 @@
+# Отслеживание изменений строк и лента изменений GET /changes
+#
+# Каждая транзакция, которая создаёт или меняет отделы, должности, сотрудников или
+# историю зарплат, получает следующий номер из счётчика "rows" в таблице data_versions
+# и записывает его в столбец row_version изменённых строк (вместе с updated_at).
+# Пока транзакция идёт, её строки помечены временным отрицательным номером, уникальным
+# для транзакции. Настоящий номер берётся непосредственно перед commit: счётчик
+# увеличивается UPDATE-ом, временный номер заменяется им во всех таблицах, и транзакция
+# сразу фиксируется. Строка счётчика заблокирована только на эти последние запросы, а не
+# на всю транзакцию, поэтому пишущие транзакции не ждут друг друга, пока работают.
+# Следующая транзакция получит больший номер только после фиксации предыдущей, и номера
+# видны читателям строго по возрастанию. Клиент запоминает курсор из ответа и при
+# следующем опросе получает только строки с большим номером — объём синхронизации
+# зависит от числа изменений, а не от размера компании.
+#
+# Строки помечаются автоматически перед flush сессии (объекты ORM); запросы Core
+# (UPDATE/INSERT ... SELECT, executemany) добавляют значения stamp(db) сами.
+
+import heapq
+import random
+from datetime import datetime, timezone
+from itertools import islice
+from sqlalchemy import select, insert, update, or_, and_, event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from models import Department, Position, Employee, SalaryHistory, DataVersion
+
+ROW_VERSION = "rows"  # Имя счётчика номеров изменений в data_versions
+STAMP_KEY = "row_stamp"  # Ключ временного номера изменения текущей транзакции в Session.info
+
+# Таблицы ленты по порядку: внутри одного изменения справочники идут раньше сотрудников,
+# а сотрудники — раньше истории зарплат, которая на них ссылается
+TABLES = [
+    ("departments", Department),
+    ("positions", Position),
+    ("employees", Employee),
+    ("salary_history", SalaryHistory),
+]
+TRACKED = tuple(model for _, model in TABLES)
+
+
+"""
+Функция возвращает временный номер изменения и время для строк, меняемых текущей транзакцией
+    Номер отрицательный и один на транзакцию; перед commit его заменяет настоящий номер
+    из счётчика (assign_row_version). Счётчик здесь не блокируется
+    Параметры: db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: dict — значения столбцов row_version и updated_at
+"""
+def stamp(db: Session):
+    if STAMP_KEY not in db.info:
+        db.info[STAMP_KEY] = {
+            "row_version": -random.getrandbits(62) - 1,  # Разные транзакции не трогают строки друг друга
+            "updated_at": datetime.now(timezone.utc).replace(tzinfo = None)
+        }
+    return db.info[STAMP_KEY]
+
+
+"""
+Функция увеличивает счётчик номеров изменений и возвращает новый номер
+    Строка счётчика остаётся заблокированной до commit или rollback
+    Параметры: db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: int — номер изменения транзакции
+"""
+def next_row_version(db: Session):
+    result = db.execute(
+        update(DataVersion)
+        .where(DataVersion.name == ROW_VERSION)
+        .values(version = DataVersion.version + 1)
+        .execution_options(synchronize_session = False)
+    )
+    if result.rowcount == 0:  # Счётчика ещё нет (база до миграции 6)
+        db.execute(insert(DataVersion).values(name = ROW_VERSION, version = 1))
+    return db.execute(select(DataVersion.version).where(DataVersion.name == ROW_VERSION)).scalar()
+
+
+@event.listens_for(Session, "before_flush")
+def stamp_changed_rows(session, flush_context, instances):
+    changed = [obj for obj in session.new if isinstance(obj, TRACKED)]
+    changed += [obj for obj in session.dirty if isinstance(obj, TRACKED) and session.is_modified(obj)]
+    if not changed:
+        return
+
+    values = stamp(session)
+    for obj in changed:
+        obj.row_version = values["row_version"]
+        obj.updated_at = values["updated_at"]
+
+
+@event.listens_for(Session, "before_commit")
+def assign_row_version(session):
+    if session.in_nested_transaction():  # Фиксация точки сохранения, транзакция продолжается
+        return
+    session.flush()  # Объекты сессии получают временный номер в before_flush
+    pending = session.info.get(STAMP_KEY)
+    if pending is None:
+        return
+
+    temporary = pending["row_version"]
+    version = next_row_version(session)
+    for _, model in TABLES:
+        session.execute(
+            update(model).where(model.row_version == temporary).values(row_version = version)
+            .execution_options(synchronize_session = False)
+        )
+    for obj in session.identity_map.values():  # Объекты в памяти — с тем же номером, что в БД
+        if isinstance(obj, TRACKED) and obj.__dict__.get("row_version") == temporary:
+            set_committed_value(obj, "row_version", version)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def forget_stamp(session, transaction):
+    if transaction.parent is None:  # Следующая транзакция получит новый номер
+        session.info.pop(STAMP_KEY, None)
+
+
+"""
+Функция разбирает курсор ленты изменений
+    Курсор — номер изменения ("125") или, если изменение не уместилось в страницу,
+    позиция внутри него: номер изменения, номер таблицы в TABLES и id строки ("125.2.40017")
+    Параметры: since: str — курсор из предыдущего ответа, "0" — с начала
+    Возвращаемое значение: tuple[int, int, int] — номер изменения, номер таблицы, id
+"""
+def parse_cursor(since):
+    parts = since.split(".")
+    if len(parts) == 1:
+        return int(parts[0]), len(TABLES), 0  # Изменение since прочитано целиком
+    if len(parts) == 3:
+        version, table, last_id = map(int, parts)
+        if 0 <= table < len(TABLES):
+            return version, table, last_id
+    raise ValueError(f"Некорректный курсор: {since}")
+
+
+"""
+Функция получает строки, созданные или изменённые после курсора
+    Из каждой таблицы по индексу (row_version, id) читается не больше limit + 1 строк,
+    затем они сливаются в порядке (номер изменения, таблица, id) и обрезаются до limit
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        since: str — курсор из предыдущего ответа, "0" — с начала
+        limit: int — максимальное количество строк в ответе
+    Возвращаемое значение: dict — строки по таблицам, курсор следующего запроса и признак has_more
+"""
+def get_changes(db: Session, since, limit):
+    version, table, last_id = parse_cursor(since)
+
+    streams = []
+    for index, (name, model) in enumerate(TABLES):
+        if index < table:
+            after = model.row_version > version
+        elif index == table:
+            after = or_(model.row_version > version, and_(model.row_version == version, model.id > last_id))
+        else:
+            after = model.row_version >= version
+        rows = db.execute(
+            select(*model.__table__.c).where(after).order_by(model.row_version, model.id).limit(limit + 1)
+        ).all()
+        streams.append([((row.row_version, index, row.id), name, row) for row in rows])
+
+    merged = list(islice(heapq.merge(*streams, key = lambda item: item[0]), limit + 1))
+    has_more = len(merged) > limit
+    page = merged[:limit]
+
+    if has_more:
+        cursor = ".".join(map(str, page[-1][0]))  # Продолжение внутри изменения
+    elif page:
+        cursor = str(page[-1][0][0])  # Все строки последнего изменения уже отданы
+    else:
+        cursor = since
+
+    result = {name: [] for name, _ in TABLES}
+    for _, name, row in page:
+        result[name].append(dict(row._mapping))
+    return {"cursor": cursor, "has_more": has_more, **result}
@@ -0,0 +1,190 @@
+# Сжатие ответов gzip/brotli
+#
+# Промежуточный слой ASGI сжимает ответы JSON, NDJSON, CSV и HTML, если клиент указал
+# поддерживаемую кодировку в Accept-Encoding (brotli предпочтительнее, если установлена
+# библиотека brotli) и ответ не меньше COMPRESSION_MIN_SIZE. Потоковые ответы сжимаются
+# по кускам: после каждого куска сжатые данные сбрасываются клиенту, и поток не ждёт конца.
+#
+# Сжатое представление — другой набор байтов, поэтому к его ETag добавляется суффикс
+# кодировки ("employees-5-gzip"). В пришедшем If-None-Match суффикс снимается до
+# обработчика, и проверка версии в обработчике не зависит от сжатия.
+
+import os
+import re
+import zlib
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli  # Сжатие brotli; без библиотеки используется только gzip
+except ImportError:
+    brotli = None
+
+COMPRESSION = os.getenv("COMPRESSION", "1") == "1"  # Сжимать ли ответы
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # Ответы меньше этого размера (байт) не сжимаются
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))  # Уровень gzip: выше — меньше трафик, больше CPU
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))  # Качество brotli для ответов, которые сжимаются на лету
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")  # Типы содержимого, которые имеет смысл сжимать
+ETAG_SUFFIX = re.compile(r'-(gzip|br)"$')
+
+
+"""
+Функция выбирает кодировку сжатия по заголовку Accept-Encoding
+    Параметры: accept_encoding: str — значение заголовка
+    Возвращаемое значение: str | None — "br", "gzip" или None, если сжимать не нужно
+"""
+def choose_encoding(accept_encoding):
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+    candidates = [(weights.get(name, weights.get("*", 0.0)), -rank, name) for rank, name in enumerate(supported)]
+    weight, _, name = max(candidates)
+    return name if weight > 0 else None
+
+
+"""
+Класс Encoder сжимает тело ответа по кускам
+"""
+class Encoder:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality = BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # Формат gzip
+
+    """
+    Метод сжимает кусок тела и сбрасывает сжатые данные, чтобы клиент получил их сразу
+        Параметры: data: bytes — кусок тела
+        Возвращаемое значение: bytes — сжатые данные
+    """
+    def flush(self, data):
+        if self.encoding == "br":
+            return self.compressor.process(data) + self.compressor.flush()
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    """
+    Метод сжимает последний кусок тела и завершает поток
+        Параметры: data: bytes — последний кусок тела
+        Возвращаемое значение: bytes — сжатые данные
+    """
+    def finish(self, data):
+        if self.encoding == "br":
+            return self.compressor.process(data) + self.compressor.finish()
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+"""
+Функция снимает суффиксы кодировки с ETag в заголовке If-None-Match
+    Параметры: scope: dict — описание запроса ASGI
+    Возвращаемое значение: tuple[dict, dict] — описание запроса с исправленным заголовком
+        и ETag клиента по ETag без суффикса (чтобы вернуть их в ответе 304)
+"""
+def strip_etag_suffixes(scope):
+    original = {}
+    headers = []
+    for name, value in scope["headers"]:
+        if name == b"if-none-match":
+            tags = [tag.strip() for tag in value.decode("latin-1").split(",")]
+            for tag in tags:
+                original[ETAG_SUFFIX.sub('"', tag)] = tag
+            value = ", ".join(ETAG_SUFFIX.sub('"', tag) for tag in tags).encode("latin-1")
+        headers.append((name, value))
+    return {**scope, "headers": headers}, original
+
+
+"""
+Класс CompressionMiddleware — промежуточный слой ASGI, сжимающий ответы
+"""
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION:
+            return await self.app(scope, receive, send)
+
+        request_headers = Headers(scope = scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        client_etags = {}
+        if "if-none-match" in request_headers:
+            scope, client_etags = strip_etag_suffixes(scope)
+
+        start = None  # Начало ответа откладывается до первого куска тела: по нему решаем, сжимать ли
+        encoder = None
+
+        async def send_compressed(message):
+            nonlocal start, encoder
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start is not None:
+                headers = MutableHeaders(raw = start.setdefault("headers", []))
+                if compressible_type(headers) or start["status"] == 304:
+                    # Представление зависит от Accept-Encoding. У ответа 304 нет Content-Type, но он
+                    # подтверждает сохранённый клиентом ответ и должен нести тот же Vary, что и 200
+                    headers.add_vary_header("Accept-Encoding")
+                if start["status"] == 304 and headers.get("etag") in client_etags:
+                    headers["ETag"] = client_etags[headers["etag"]]  # Тот же ETag, что у сохранённого клиентом ответа
+                if encoding and compressible(start["status"], headers, len(body), more_body):
+                    encoder = Encoder(encoding)
+                    headers["Content-Encoding"] = encoding
+                    if "etag" in headers:
+                        headers["ETag"] = headers["etag"][:-1] + f'-{encoding}"'
+                    del headers["content-length"]
+
+            if encoder is not None:
+                body = encoder.flush(body) if more_body else encoder.finish(body)
+
+            if start is not None:
+                if encoder is not None and not more_body:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                start = None
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+"""
+Функция решает, сжимать ли ответ
+    Потоковый ответ сжимается независимо от размера первого куска: его полный размер неизвестен
+    Параметры:
+        status: int — код ответа
+        headers: MutableHeaders — заголовки ответа
+        size: int — размер первого куска тела
+        more_body: bool — будут ли ещё куски
+    Возвращаемое значение: bool — True, если ответ нужно сжать
+"""
+def compressible(status, headers, size, more_body):
+    if status < 200 or status in (204, 304) or "content-encoding" in headers:
+        return False
+    if not compressible_type(headers):
+        return False
+    return more_body or size >= COMPRESSION_MIN_SIZE
+
+
+"""
+Функция проверяет, что тип содержимого ответа имеет смысл сжимать
+    Параметры: headers: MutableHeaders — заголовки ответа
+    Возвращаемое значение: bool — True для JSON, NDJSON и текста (XLSX и другие архивы уже сжаты)
+"""
+def compressible_type(headers):
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
@@ -1,6 +1,26 @@
+import random
+from sqlalchemy import select, insert, func
 from sqlalchemy.orm import Session
 from models import Department, Position, Employee, SalaryHistory
-from datetime import date
+from datetime import date, timedelta
+import db_queries
+import changes
+
+# Справочники для генератора синтетических данных
+DEPARTMENT_NAMES = ["Отдел разработки", "Отдел кадров", "Бухгалтерия", "Отдел продаж", "Маркетинг", "Юридический отдел",
+                    "Служба поддержки", "Отдел закупок", "Логистика", "Администрация", "Отдел качества", "Аналитика"]
+POSITION_NAMES = ["Разработчик", "Тестировщик", "HR-специалист", "Бухгалтер", "Системный администратор", "Менеджер",
+                  "Аналитик", "Юрист", "Оператор", "Руководитель группы", "Начальник отдела", "Специалист", "Стажёр"]
+MALE_NAMES = [("Иван", "Иванович"), ("Пётр", "Петрович"), ("Алексей", "Алексеевич"), ("Сергей", "Сергеевич"),
+              ("Дмитрий", "Дмитриевич"), ("Андрей", "Андреевич"), ("Михаил", "Михайлович"), ("Николай", "Николаевич")]
+FEMALE_NAMES = [("Елена", "Ивановна"), ("Мария", "Петровна"), ("Анна", "Сергеевна"), ("Ольга", "Дмитриевна"),
+                ("Татьяна", "Андреевна"), ("Наталья", "Михайловна"), ("Юлия", "Алексеевна"), ("Алёна", "Николаевна")]
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Кузнецов", "Фёдоров", "Смирнов", "Попов", "Соколов", "Лебедев",
+              "Козлов", "Новиков", "Морозов", "Волков", "Алексеев", "Семёнов", "Егоров", "Павлов", "Степанов"]
+
+GENERATOR_CHUNK_SIZE = 10000  # Сколько сотрудников вставляется одной транзакцией
+FIRST_HIRE_DATE = date(2005, 1, 1)  # Самая ранняя дата найма в синтетических данных
+LAST_DATA_DATE = date(2025, 12, 31)  # Самая поздняя дата найма и изменения зарплаты: данные не зависят от дня запуска
 
 
 def init_data(db: Session):
@@ -83,6 +103,139 @@ def init_data(db: Session):
         SalaryHistory(employee_id = 5, change_date = date(2021, 9, 1), amount = 105000),
     ]
     db.add_all(salary_history)
+    db.flush()  # Отправляем записи истории в БД до пересчёта
+    db_queries.rebuild_current_salaries(db)  # Заполняем текущие зарплаты сотрудников по истории
     db.commit()
 
     print("Начальные данные успешно загружены!")
+
+
+"""
+Функция создаёт недостающие записи справочника с названиями из списка (с номером, если названий не хватает)
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        model: Department | Position — модель справочника
+        names: list[str] — базовые названия
+        count: int — сколько записей должно быть в справочнике
+    Возвращаемое значение: list[int] — id записей справочника
+"""
+def ensure_reference(db: Session, model, names, count):
+    existing = set(db.execute(select(model.name)).scalars())
+    wanted = [names[i % len(names)] + (f" {i // len(names) + 1}" if i >= len(names) else "") for i in range(count)]
+    missing = [name for name in wanted if name not in existing]
+    if missing:
+        row_stamp = changes.stamp(db)  # Номер изменения для ленты /changes
+        db.execute(insert(model), [{"name": name, **row_stamp} for name in missing])
+        db_queries.bump_version(db, model.__tablename__)  # Кэши справочников в процессах приложения устаревают
+    return list(db.execute(select(model.id).order_by(model.id).limit(count)).scalars())
+
+
+"""
+Функция генерирует историю зарплат одного сотрудника
+    За всё время зарплата вырастает в 1.2–3 раза, рост распределён по изменениям
+    с разбросом. Часть изменений приходится на тот же день, что и предыдущее,
+    и уточняет его сумму (исправление ошибочной записи)
+    Параметры:
+        rnd: random.Random — генератор случайных чисел
+        hire_date: date — дата найма
+        base: float — начальная зарплата
+        raises: int — количество изменений после найма
+        same_day_share: float — доля изменений, записанных в тот же день, что и предыдущее
+        end_date: date — самая поздняя дата изменения
+    Возвращаемое значение: list[tuple[date, float]] — записи (дата, сумма) по возрастанию даты
+"""
+def salary_changes(rnd, hire_date, base, raises, same_day_share, end_date = LAST_DATA_DATE):
+    span = max((end_date - hire_date).days, 1)
+    days = sorted(rnd.randrange(span) for _ in range(raises))
+    step = rnd.uniform(1.2, 3.0) ** (1 / raises) if raises else 1.0  # Средний рост за одно изменение
+    records = [(hire_date, base)]
+    amount = base
+    for offset in days:
+        if rnd.random() < same_day_share:
+            change_date = records[-1][0]  # Исправление суммы в тот же день
+            amount = round(amount * rnd.uniform(0.98, 1.02), -2)
+        else:
+            change_date = max(hire_date + timedelta(days = offset), records[-1][0])
+            amount = round(amount * step * rnd.uniform(0.98, 1.02), -2)
+        records.append((change_date, amount))
+    return records
+
+
+"""
+Функция заполняет базу синтетическими данными заданного объёма
+    Сотрудники распределяются по отделам неравномерно (закон Ципфа: несколько больших
+    отделов и много маленьких), у каждого есть история зарплат, в том числе несколько
+    изменений в один день. Данные вставляются пачками через executemany, текущая зарплата
+    сотрудника вычисляется при генерации. Результат воспроизводим при одинаковом seed
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        employees: int — количество сотрудников
+        salary_rows: int — примерное общее количество записей истории зарплат
+        departments: int — количество отделов
+        positions: int — количество должностей
+        same_day_share: float — доля изменений зарплаты в тот же день, что и предыдущее
+        seed: int — начальное значение генератора случайных чисел
+        end_date: date — самая поздняя дата найма и изменения зарплаты
+        progress: callable | None — функция progress(вставлено_сотрудников, вставлено_записей_истории)
+    Возвращаемое значение: tuple[int, int] — количество вставленных сотрудников и записей истории
+"""
+def generate_data(db: Session, employees = 100000, salary_rows = 2000000, departments = 30, positions = 40,
+                  same_day_share = 0.05, seed = 42, end_date = LAST_DATA_DATE, progress = None):
+    rnd = random.Random(seed)
+    department_ids = ensure_reference(db, Department, DEPARTMENT_NAMES, departments)
+    position_ids = ensure_reference(db, Position, POSITION_NAMES, positions)
+    db.commit()
+
+    department_weights = [1 / (rank + 1) ** 1.1 for rank in range(len(department_ids))]  # Закон Ципфа
+    position_base = {pos: rnd.randrange(40, 200) * 1000 for pos in position_ids}  # Начальная зарплата по должности
+    extra_per_employee = max(salary_rows - employees, 0) / max(employees, 1)  # Среднее число изменений после найма
+    hire_span = (end_date - FIRST_HIRE_DATE).days
+
+    next_id = (db.execute(select(func.max(Employee.id))).scalar() or 0) + 1
+    inserted_employees = inserted_salaries = 0
+
+    while inserted_employees < employees:
+        size = min(GENERATOR_CHUNK_SIZE, employees - inserted_employees)
+        employee_rows, salary_history_rows = [], []
+        row_stamp = changes.stamp(db)  # Один номер изменения (лента /changes) на пачку
+
+        for emp_id in range(next_id, next_id + size):
+            first_name, middle_name = rnd.choice(MALE_NAMES if rnd.random() < 0.5 else FEMALE_NAMES)
+            last_name = rnd.choice(LAST_NAMES)
+            if middle_name.endswith("на"):
+                last_name += "а"  # Женская форма фамилии
+            position_id = rnd.choice(position_ids)
+            hire_date = FIRST_HIRE_DATE + timedelta(days = rnd.randrange(hire_span))
+
+            raises = int(rnd.expovariate(1 / extra_per_employee)) if extra_per_employee else 0
+            base = position_base[position_id] * rnd.uniform(0.8, 1.2) // 100 * 100
+            history = salary_changes(rnd, hire_date, base, raises, same_day_share, end_date)
+            current_date, current_amount = max(history)  # Последняя дата, при равенстве — большая сумма
+
+            employee_rows.append({
+                "id": emp_id,
+                "last_name": last_name,
+                "first_name": first_name,
+                "middle_name": middle_name,
+                "hire_date": hire_date,
+                "department_id": rnd.choices(department_ids, department_weights)[0],
+                "position_id": position_id,
+                "current_salary": current_amount,
+                "current_salary_date": current_date,
+                **row_stamp
+            })
+            salary_history_rows += [{"employee_id": emp_id, "change_date": d, "amount": a, **row_stamp} for d, a in history]
+
+        db.execute(insert(Employee), employee_rows)
+        db.execute(insert(SalaryHistory), salary_history_rows)
+        db_queries.bump_version(db, "employees")  # Кэши выборок по сотрудникам и зарплатам устаревают
+        db_queries.bump_version(db, "salary_history")
+        db.commit()  # Одна транзакция на пачку
+
+        next_id += size
+        inserted_employees += size
+        inserted_salaries += len(salary_history_rows)
+        if progress:
+            progress(inserted_employees, inserted_salaries)
+
+    return inserted_employees, inserted_salaries
@@ -0,0 +1,36 @@
+# Асинхронное подключение к БД для приложения HRM_async
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import DATABASE_URL, POOL_OPTIONS, enable_sqlite_foreign_keys
+from metrics import TimedAsyncQueuePool
+
+# Тот же сервер через асинхронный драйвер: aiomysql для MySQL, aiosqlite для локального SQLite
+ASYNC_DATABASE_URL = (
+    DATABASE_URL
+    .replace("mysql+pymysql://", "mysql+aiomysql://")
+    .replace("sqlite://", "sqlite+aiosqlite://")
+)
+
+# Создаём асинхронный объект подключения к базе данных
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass = TimedAsyncQueuePool,  # Пул с замерами для /metrics
+    **POOL_OPTIONS  # Те же настройки пула, что и у синхронного движка
+)
+enable_sqlite_foreign_keys(async_engine.sync_engine)
+
+# Шаблон асинхронной сессии
+AsyncSessionLocal = async_sessionmaker(
+    autoflush = False,  # Данные не отправляются в базу сразу, пока не сделан коммит
+    expire_on_commit = False,  # После коммита объекты остаются читаемыми без повторного запроса
+    bind = async_engine
+)
+
+"""
+Функция создаёт асинхронную сессию для работы с базой данных
+    Параметры: отсутствуют
+    Возвращаемое значение: объект AsyncSession, через который можно читать и изменять данные
+"""
+async def get_async_db():
+    async with AsyncSessionLocal() as db:   # Сессия закрывается, когда обработчик завершил работу
+        yield db
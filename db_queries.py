@@ -1,7 +1,20 @@
 
+import hashlib
+import json
+from datetime import datetime, timezone
+from sqlalchemy import select, insert, update, func, or_, and_, exists, literal, Date, BigInteger, DateTime
 from sqlalchemy.orm import Session
-from models import Employee, Department, Position, SalaryHistory
+from sqlalchemy.exc import IntegrityError
+from models import Employee, Department, Position, SalaryHistory, DataVersion, IdempotencyKey
 from schemas import EmployeeBase, DepartmentBase, PositionBase, SalaryHistoryBase
+import changes
+
+PAYROLL_DATA = ("employees", "salary_history")  # Наборы данных, от которых зависит ведомость зарплат
+EMPLOYEE_LIST_DATA = ("employees", "salary_history", "departments", "positions")  # Списки сотрудников: текущая зарплата и названия
+SALARY_HISTORY_DATA = ("salary_history",)  # История зарплат сотрудника
+EMPLOYEE_FIELDS = ("id", "last_name", "first_name", "middle_name", "hire_date")  # Поля сотрудника для параметра fields
+EMPLOYEE_INCLUDES = {"department": "department_id", "position": "position_id", "salary": "current_salary"}  # include -> столбец
+MAX_BATCH_EMPLOYEES = 5000  # Сколько сотрудников можно запросить в пакетной выборке истории зарплат
 
 
 """
@@ -23,48 +36,860 @@ def get_positions(db: Session):
 
 
 """
-Функция получает список сотрудников с возможной фильтрацией
-    Параметры: 
+Функция получает номер версии набора данных
+    Параметры:
+        db: Session — объект SQLAlchemy
+        name: str — имя набора данных
+    Возвращаемое значение: int — номер версии, 0 если данные ещё не менялись
+"""
+def get_version(db: Session, name: str):
+    return db.execute(select(DataVersion.version).where(DataVersion.name == name)).scalar() or 0
+
+
+"""
+Функция получает номера версий нескольких наборов данных одним запросом
+    Параметры:
+        db: Session — объект SQLAlchemy
+        names: tuple[str] — имена наборов данных
+    Возвращаемое значение: tuple[int] — номера версий в порядке names, 0 для ещё не менявшихся
+"""
+def get_versions(db: Session, names):
+    versions = dict(db.execute(select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(names))).all())
+    return tuple(versions.get(name, 0) for name in names)
+
+
+"""
+Функция увеличивает номера версий наборов данных одним запросом
+    Вызывается в транзакции, которая меняет данные, изменения не фиксируются
+    Параметры:
         db: Session — объект SQLAlchemy
+        names: str — имена наборов данных
+    Возвращаемое значение: отсутствует
+"""
+def bump_version(db: Session, *names):
+    result = db.execute(
+        update(DataVersion)
+        .where(DataVersion.name.in_(names))
+        .values(version = DataVersion.version + 1)
+        .execution_options(synchronize_session = False)
+    )
+    if result.rowcount < len(names):  # Какой-то набор данных меняется впервые
+        existing = set(db.execute(select(DataVersion.name).where(DataVersion.name.in_(names))).scalars())
+        db.add_all(DataVersion(name = name, version = 1) for name in names if name not in existing)
+        db.flush()
+
+
+"""
+Функция собирает условия фильтрации сотрудников
+    Параметры:
         dept: int | None — id отдела для фильтрации
         pos: int | None — id должности для фильтрации
         date_from: date | None — дата найма (начало)
         date_to: date | None — дата найма (конец)
-    Возвращаемое значение: list[Employee] — список сотрудников с текущей зарплатой
+    Возвращаемое значение: list — список условий для WHERE
 """
-def get_employees(db: Session, dept = None, pos = None, date_from = None, date_to = None):
-    query = db.query(Employee) # Создаём запрос к таблице сотрудников
+def employee_filters(dept = None, pos = None, date_from = None, date_to = None):
+    conditions = []
 
     if dept:
-        query = query.filter(Employee.department_id == dept) # Фильтруем по отделу
+        conditions.append(Employee.department_id == dept) # Фильтруем по отделу
     if pos:
-        query = query.filter(Employee.position_id == pos) # Фильтруем по должности
+        conditions.append(Employee.position_id == pos) # Фильтруем по должности
     if date_from:
-        query = query.filter(Employee.hire_date >= date_from) # Фильтруем по дате найма с начала
+        conditions.append(Employee.hire_date >= date_from) # Фильтруем по дате найма с начала
     if date_to:
-        query = query.filter(Employee.hire_date <= date_to) # Фильтруем по дате найма до конца
+        conditions.append(Employee.hire_date <= date_to) # Фильтруем по дате найма до конца
+
+    return conditions
+
+
+"""
+Функция разбирает параметры fields и include списков сотрудников
+    fields — поля сотрудника (id выбирается всегда: по нему строится курсор следующей страницы),
+    include — связанные данные: отдел, должность и текущая зарплата. Без fields выбираются все
+    поля сотрудника, без include (если задан fields) — никаких связанных данных
+    Параметры:
+        fields: str | None — поля через запятую, например "id,last_name"
+        include: str | None — связанные данные через запятую, например "department,salary"
+    Возвращаемое значение: tuple[tuple, tuple] | None — (поля, связанные данные) или None, если нужны все
+"""
+def parse_projection(fields = None, include = None):
+    if fields is None and include is None:
+        return None
+
+    def split(value, allowed, name):
+        items = [item.strip() for item in value.split(",") if item.strip()]
+        unknown = [item for item in items if item not in allowed]
+        if unknown:
+            raise ValueError(f"Неизвестные значения {name}: {', '.join(unknown)}")
+        return items
+
+    selected = split(fields, EMPLOYEE_FIELDS, "fields") if fields is not None else list(EMPLOYEE_FIELDS)
+    included = split(include, EMPLOYEE_INCLUDES, "include") if include is not None else []
+    return tuple(dict.fromkeys(["id"] + selected)), tuple(dict.fromkeys(included))
+
+
+"""
+Функция возвращает столбцы таблицы сотрудников, нужные для выбранных полей
+    Параметры: projection: tuple | None — результат parse_projection
+    Возвращаемое значение: list[Column] | None — столбцы или None, если нужны все
+"""
+def projection_columns(projection):
+    if projection is None:
+        return None
+    fields, include = projection
+    return [getattr(Employee, field) for field in fields] + [getattr(Employee, EMPLOYEE_INCLUDES[name]) for name in include]
+
+
+"""
+Функция возвращает имена полей ответа для выбранных полей (для схемы ответа)
+    Параметры: projection: tuple — результат parse_projection
+    Возвращаемое значение: tuple[str] — имена полей ответа
+"""
+def projection_names(projection):
+    fields, include = projection
+    return fields + tuple("current_salary" if name == "salary" else name for name in include)
+
+
+"""
+Функция проверяет, нужны ли в ответе связанные данные (например, названия отделов из кэша)
+    Параметры:
+        projection: tuple | None — результат parse_projection
+        name: str — "department", "position" или "salary"
+    Возвращаемое значение: bool — True, если данные нужны
+"""
+def includes(projection, name):
+    return projection is None or name in projection[1]
+
+
+"""
+Функция преобразует строку выборки с выбранными полями в словарь ответа
+    Параметры:
+        row: Row — строка из employees_query или employees_full_query с projection
+        projection: tuple — результат parse_projection
+        departments: dict[int, str] — названия отделов по id
+        positions: dict[int, str] — названия должностей по id
+        nested: bool — отдел и должность объектом {"id", "name"} (/employees) или названием (/employees/full)
+    Возвращаемое значение: dict — выбранные поля сотрудника
+"""
+def projection_to_dict(row, projection, departments, positions, nested = True):
+    fields, include = projection
+    item = {field: getattr(row, field) for field in fields}
+    if "department" in include:
+        name = departments.get(row.department_id)
+        item["department"] = {"id": row.department_id, "name": name} if nested else name
+    if "position" in include:
+        name = positions.get(row.position_id)
+        item["position"] = {"id": row.position_id, "name": name} if nested else name
+    if "salary" in include:
+        item["current_salary"] = row.current_salary
+    return item
+
+
+"""
+Функция выбирает функцию преобразования строки списка сотрудников в словарь ответа
+    Параметры:
+        projection: tuple | None — результат parse_projection
+        departments: dict[int, str] — названия отделов по id
+        positions: dict[int, str] — названия должностей по id
+        full: bool — формат /employees/full (названия вместо объектов отдела и должности)
+    Возвращаемое значение: callable — функция to_dict(row)
+"""
+def employee_serializer(projection, departments, positions, full = False):
+    if projection is not None:
+        return lambda row: projection_to_dict(row, projection, departments, positions, nested = not full)
+    if full:
+        return lambda row: employee_full_to_dict(row, departments, positions)
+    return lambda row: employee_to_dict(row, departments, positions)
+
+
+"""
+Функция строит запрос списка сотрудников с id отдела, должности и текущей зарплатой
+    Сотрудники упорядочены по id, что позволяет листать список курсором (keyset-пагинация).
+    Названия отделов и должностей не соединяются в запросе, а берутся из кэша справочников
+    Параметры:
+        dept, pos, date_from, date_to — фильтры, как в employee_filters
+        after: int | None — курсор: id последнего сотрудника предыдущей страницы
+        projection: tuple | None — выбираемые поля (parse_projection), None — все
+    Возвращаемое значение: Select — запрос SQLAlchemy
+"""
+def employees_query(dept = None, pos = None, date_from = None, date_to = None, after = None, projection = None):
+    columns = projection_columns(projection) or [
+        Employee.id,
+        Employee.last_name,
+        Employee.first_name,
+        Employee.middle_name,
+        Employee.hire_date,
+        Employee.department_id,
+        Employee.position_id,
+        Employee.current_salary
+    ]
+    query = (
+        select(*columns)
+        .where(Employee.department_id.isnot(None), Employee.position_id.isnot(None))
+        .where(*employee_filters(dept, pos, date_from, date_to))
+        .order_by(Employee.id)
+    )
+
+    if after is not None:
+        query = query.where(Employee.id > after)  # Продолжаем после последнего выданного сотрудника
+
+    return query
+
 
-    employees = query.all()  # Выполняем запрос и получаем список сотрудников
+"""
+Функция получает список сотрудников с возможной фильтрацией
+    Параметры: 
+        db: Session — объект SQLAlchemy
+        dept: int | None — id отдела для фильтрации
+        pos: int | None — id должности для фильтрации
+        date_from: date | None — дата найма (начало)
+        date_to: date | None — дата найма (конец)
+        after: int | None — курсор: id последнего сотрудника предыдущей страницы
+        limit: int | None — максимальное количество сотрудников
+        projection: tuple | None — выбираемые поля (parse_projection), None — все
+    Возвращаемое значение: list[Row] — список сотрудников с текущей зарплатой
+"""
+def get_employees(db: Session, dept = None, pos = None, date_from = None, date_to = None, after = None, limit = None,
+                  projection = None):
+    query = employees_query(dept, pos, date_from, date_to, after, projection)
+
+    if limit:
+        query = query.limit(limit)
+
+    return db.execute(query).all()
+
+
+"""
+Функция получает сотрудников по списку id в том же порядке
+    Параметры:
+        db: Session — объект SQLAlchemy
+        ids: list[int] — id сотрудников
+    Возвращаемое значение: list[Row] — сотрудники с текущей зарплатой (несуществующие id пропускаются)
+"""
+def get_employees_by_ids(db: Session, ids):
+    if not ids:
+        return []
+    rows = {row.id: row for row in db.execute(employees_query().where(Employee.id.in_(ids)))}
+    return [rows[i] for i in ids if i in rows]
 
-    # Добавляем текущую зарплату для каждого сотрудника
-    for e in employees:
-        if e.salary_history: # Если есть история зарплаты
-            e.current_salary = max(h.amount for h in e.salary_history) # Берём максимальную зарплату
-        else:   # Иначе оставляем пустое значение
-            e.current_salary = None
 
-    return employees
+"""
+Функция построчно читает сотрудников серверным курсором
+    Строки приходят из БД пачками, весь список в памяти не собирается
+    Параметры:
+        db: Session — объект SQLAlchemy
+        query: Select — запрос, например из employees_query
+        batch_size: int — размер пачки строк
+    Возвращаемое значение: Iterator[Row] — строки результата
+"""
+def iter_rows(db: Session, query, batch_size = 1000):
+    result = db.execute(query.execution_options(stream_results = True))  # Серверный курсор (SSCursor в pymysql)
+    yield from result.yield_per(batch_size)
+
+
+"""
+Функция преобразует строку списка сотрудников в словарь схемы Employee
+    Параметры:
+        row: Row — строка из employees_query
+        departments: dict[int, str] — названия отделов по id
+        positions: dict[int, str] — названия должностей по id
+    Возвращаемое значение: dict — сотрудник с вложенными отделом и должностью
+"""
+def employee_to_dict(row, departments, positions):
+    return {
+        "id": row.id,
+        "last_name": row.last_name,
+        "first_name": row.first_name,
+        "middle_name": row.middle_name,
+        "hire_date": row.hire_date,
+        "department": {"id": row.department_id, "name": departments.get(row.department_id)},
+        "position": {"id": row.position_id, "name": positions.get(row.position_id)},
+        "current_salary": row.current_salary
+    }
 
 
 """
 Функция получает историю зарплат указанного сотрудника
+    Записи упорядочены по (change_date, amount, id), как у сотрудника в get_salary_histories
     Параметры: 
         db: Session — объект сессии SQLAlchemy
         employee_id: int — ID сотрудника
-    Возвращаемое значение: list[SalaryHistory] — список записей истории зарплат
+    Возвращаемое значение: list[Row] — записи истории зарплат (id, employee_id, change_date, amount)
 """
 def get_salary_history(db: Session, employee_id: int):
-    # Выполняем запрос всех записей истории зарплат для конкретного сотрудника
-    return db.query(SalaryHistory).filter(SalaryHistory.employee_id == employee_id).all()
+    # Выбираем только столбцы, без создания объектов ORM для каждой записи
+    return db.execute(
+        select(SalaryHistory.id, SalaryHistory.employee_id, SalaryHistory.change_date, SalaryHistory.amount)
+        .where(SalaryHistory.employee_id == employee_id)
+        .order_by(SalaryHistory.change_date, SalaryHistory.amount, SalaryHistory.id)
+    ).all()
+
+
+"""
+Функция получает истории зарплат нескольких сотрудников одним запросом
+    Записи упорядочены по (employee_id, change_date, amount, id) — в порядке индекса истории,
+    среди записей одного дня последней идёт большая сумма, как и в правиле текущей зарплаты.
+    С параметром last по каждому сотруднику берутся только последние записи (оконная функция)
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        employee_ids: list[int] — id сотрудников
+        date_from: date | None — дата изменения (начало)
+        date_to: date | None — дата изменения (конец)
+        last: int | None — сколько последних записей каждого сотрудника вернуть
+    Возвращаемое значение: list[Row] — записи истории зарплат (id, employee_id, change_date, amount)
+"""
+def get_salary_histories(db: Session, employee_ids, date_from = None, date_to = None, last = None):
+    conditions = [SalaryHistory.employee_id.in_(employee_ids)]
+    if date_from:
+        conditions.append(SalaryHistory.change_date >= date_from)
+    if date_to:
+        conditions.append(SalaryHistory.change_date <= date_to)
+
+    columns = [SalaryHistory.id, SalaryHistory.employee_id, SalaryHistory.change_date, SalaryHistory.amount]
+    if not last:
+        return db.execute(
+            select(*columns).where(*conditions)
+            .order_by(SalaryHistory.employee_id, SalaryHistory.change_date, SalaryHistory.amount, SalaryHistory.id)
+        ).all()
+
+    ranked = select(*columns, salary_rank()).where(*conditions).subquery()  # rn = 1 — последняя запись сотрудника
+    return db.execute(
+        select(ranked.c.id, ranked.c.employee_id, ranked.c.change_date, ranked.c.amount)
+        .where(ranked.c.rn <= last)
+        .order_by(ranked.c.employee_id, ranked.c.change_date, ranked.c.amount, ranked.c.id)
+    ).all()
+
+
+"""
+Функция разбирает список id сотрудников пакетной выборки
+    Параметры: values: list[str | int] — id; строки могут содержать несколько id через запятую ("1,2,3")
+    Возвращаемое значение: list[int] — различные id в порядке запроса
+"""
+def batch_employee_ids(values):
+    ids = []
+    for value in values:
+        for part in str(value).split(","):
+            if part.strip():
+                try:
+                    ids.append(int(part))
+                except ValueError:
+                    raise ValueError(f"Некорректный id сотрудника: {part.strip()}")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError("Не указаны id сотрудников")
+    if len(ids) > MAX_BATCH_EMPLOYEES:
+        raise ValueError(f"Можно запросить не больше {MAX_BATCH_EMPLOYEES} сотрудников")
+    return ids
+
+
+"""
+Функция группирует записи истории зарплат по сотрудникам
+    Параметры:
+        rows: list[Row] — записи из get_salary_histories, упорядоченные по employee_id
+        employee_ids: list[int] — id сотрудников в порядке запроса
+    Возвращаемое значение: list[dict] — данные схемы EmployeeSalaryHistory для каждого id
+        (пустая история, если записей нет или сотрудника нет)
+"""
+def group_salary_histories(rows, employee_ids):
+    histories = {emp_id: [] for emp_id in employee_ids}
+    for row in rows:
+        histories[row.employee_id].append(dict(row._mapping))
+    return [{"employee_id": emp_id, "history": history} for emp_id, history in histories.items()]
+
+
+"""
+Функция получает зарплату каждого сотрудника, действовавшую на указанную дату
+    Одним запросом по индексу истории зарплат: среди записей с датой не позже as_of
+    выбирается последняя, при нескольких записях одного дня — с максимальной суммой
+    (то же правило, что у текущей зарплаты). Сотрудники, принятые позже as_of, не попадают
+    Параметры:
+        db: Session — объект SQLAlchemy
+        as_of: date — дата, на которую нужна зарплата
+        dept: int | None — id отдела для фильтрации
+        pos: int | None — id должности для фильтрации
+        date_from: date | None — дата найма (начало)
+        date_to: date | None — дата найма (конец)
+    Возвращаемое значение: list[Row] — сотрудники с суммой и датой действующей записи, по возрастанию id
+"""
+def get_payroll(db: Session, as_of, dept = None, pos = None, date_from = None, date_to = None):
+    ranked = (
+        select(
+            Employee.id.label("employee_id"),
+            Employee.last_name,
+            Employee.first_name,
+            Employee.middle_name,
+            Employee.department_id,
+            Employee.position_id,
+            SalaryHistory.amount,
+            SalaryHistory.change_date,
+            salary_rank()
+        )
+        .join(SalaryHistory, SalaryHistory.employee_id == Employee.id)
+        .where(SalaryHistory.change_date <= as_of, *employee_filters(dept, pos, date_from, date_to))
+        .subquery()
+    )
+
+    return db.execute(
+        select(*[c for c in ranked.c if c.name != "rn"])
+        .where(ranked.c.rn == 1)
+        .order_by(ranked.c.employee_id)
+    ).all()
+
 
+"""
+Функция строит номер записи в истории зарплат сотрудника, 1 — действующая зарплата
+    Порядок: самая поздняя дата изменения, среди записей одного дня — максимальная сумма,
+    при равных суммах — последняя добавленная запись
+    Параметры: отсутствуют
+    Возвращаемое значение: Label — оконная функция ROW_NUMBER() с именем rn
+"""
+def salary_rank():
+    return func.row_number().over(
+        partition_by = SalaryHistory.employee_id,
+        order_by = (SalaryHistory.change_date.desc(), SalaryHistory.amount.desc(), SalaryHistory.id.desc())
+    ).label("rn")
+
+
+"""
+Функция строит подзапрос текущей зарплаты каждого сотрудника
+    Текущая зарплата — запись с самой поздней датой изменения, а среди записей
+    с одинаковой датой — с максимальной суммой. Считается в БД оконной функцией
+    Параметры: отсутствуют
+    Возвращаемое значение: Subquery — подзапрос со столбцами employee_id, current_salary и current_salary_date
+"""
+def current_salary_subquery():
+    ranked = select(
+        SalaryHistory.employee_id,
+        SalaryHistory.amount,
+        SalaryHistory.change_date,
+        salary_rank()
+    ).subquery()
+
+    return (
+        select(
+            ranked.c.employee_id,
+            ranked.c.amount.label("current_salary"),
+            ranked.c.change_date.label("current_salary_date")
+        )
+        .where(ranked.c.rn == 1)
+        .subquery("current_salary")
+    )
+
+
+"""
+Функция строит условие «запись новее текущей зарплаты сотрудника»
+    Запись новее, если у сотрудника ещё нет истории, её дата позже текущей
+    или дата та же, а сумма больше (правило выбора среди записей одного дня)
+    Параметры:
+        change_date: date — дата изменения зарплаты
+        amount: float | ColumnElement — сумма зарплаты или выражение SQL
+    Возвращаемое значение: ColumnElement — условие для WHERE
+"""
+def newer_salary_condition(change_date, amount):
+    return or_(
+        Employee.current_salary_date.is_(None),  # Истории ещё не было
+        Employee.current_salary_date < change_date,  # Запись новее текущей
+        and_(Employee.current_salary_date == change_date, Employee.current_salary < amount)  # Та же дата, большая сумма
+    )
+
+
+"""
+Функция обновляет текущую зарплату сотрудника после добавления записи в историю
+    Проекция меняется, только если запись новее текущей (или той же даты, но с большей суммой),
+    поэтому запись задним числом её не портит. Изменения не фиксируются — commit делает вызывающий
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        employee_id: int — id сотрудника
+        change_date: date — дата изменения зарплаты
+        amount: float — сумма зарплаты
+    Возвращаемое значение: отсутствует
+"""
+def apply_salary_change(db: Session, employee_id: int, change_date, amount):
+    db.execute(
+        update(Employee)
+        .where(Employee.id == employee_id, newer_salary_condition(change_date, amount))
+        .values(current_salary = amount, current_salary_date = change_date, **changes.stamp(db))
+        .execution_options(synchronize_session = False)
+    )
+
+
+"""
+Функция пересчитывает текущие зарплаты всех сотрудников по истории зарплат
+    Используется для первоначального заполнения и восстановления проекции. Изменения не фиксируются.
+    Номер изменения (row_version) не меняется: проекция восстанавливается по уже выданной истории
+    Параметры: db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: int — количество сотрудников, у которых есть история зарплат
+"""
+def rebuild_current_salaries(db: Session):
+    options = {"synchronize_session": False}
+
+    # Сбрасываем проекцию, чтобы у сотрудников без истории не осталось старых значений
+    db.execute(update(Employee).values(current_salary = None, current_salary_date = None).execution_options(**options))
+
+    salary = current_salary_subquery()
+    result = db.execute(
+        update(Employee)
+        .where(Employee.id == salary.c.employee_id)
+        .values(current_salary = salary.c.current_salary, current_salary_date = salary.c.current_salary_date)
+        .execution_options(**options)
+    )
+    return result.rowcount
+
+
+"""
+Функция возвращает значения stamp для списка столбцов INSERT ... SELECT
+    Параметры: row_stamp: dict — результат changes.stamp
+    Возвращаемое значение: tuple — выражения row_version и updated_at
+"""
+def stamp_columns(row_stamp):
+    return literal(row_stamp["row_version"], BigInteger), literal(row_stamp["updated_at"], DateTime)
+
+
+"""
+Функция вставляет пачку сотрудников вместе с начальными записями о зарплате
+    Сотрудники вставляются одним многострочным INSERT (executemany), записи истории —
+    одним INSERT ... SELECT по новым сотрудникам, у которых ещё нет истории.
+    Изменения не фиксируются — commit делает вызывающий
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        employees: list[EmployeeCreate] — проверенные данные сотрудников
+    Возвращаемое значение: отсутствует
+"""
+def bulk_insert_employees(db: Session, employees):
+    row_stamp = changes.stamp(db)  # Номер изменения для ленты /changes
+    watermark = db.execute(select(func.max(Employee.id))).scalar() or 0  # Все новые сотрудники получат id больше
+
+    db.execute(insert(Employee), [
+        {
+            "last_name": emp.last_name,
+            "first_name": emp.first_name,
+            "middle_name": emp.middle_name,
+            "hire_date": emp.hire_date,
+            "department_id": emp.department_id,
+            "position_id": emp.position_id,
+            "current_salary": emp.amount,  # Начальная зарплата сразу становится текущей
+            "current_salary_date": emp.hire_date if emp.amount is not None else None,
+            **row_stamp
+        }
+        for emp in employees
+    ])
+
+    # Начальная запись истории строится из проекции текущей зарплаты, id сотрудников не нужны
+    db.execute(
+        insert(SalaryHistory).from_select(
+            ["employee_id", "change_date", "amount", "row_version", "updated_at"],
+            select(Employee.id, Employee.current_salary_date, Employee.current_salary, *stamp_columns(row_stamp))
+            .where(
+                Employee.id > watermark,
+                Employee.current_salary.isnot(None),
+                ~exists().where(SalaryHistory.employee_id == Employee.id)
+            )
+        )
+    )
+    bump_version(db, "employees")
+    bump_version(db, "salary_history")
+
+
+"""
+Функция индексирует зарплаты отобранных сотрудников
+    Новые записи истории пишутся одним INSERT ... SELECT из текущих зарплат, затем
+    одним UPDATE обновляется проекция текущей зарплаты. В режиме dry_run ничего не пишется,
+    возвращается только оценка. Изменения не фиксируются — commit делает вызывающий
+    Параметры:
+        db: Session — объект SQLAlchemy
+        dept, pos, date_from, date_to — фильтры, как в employee_filters
+        effective_date: date — дата, с которой действует новая зарплата
+        percent: float | None — процент индексации
+        delta: float | None — фиксированная прибавка (если процент не задан)
+        dry_run: bool — только посчитать, без записи
+    Возвращаемое значение: Row — employees, current_total, new_total
+"""
+def index_salaries(db: Session, dept = None, pos = None, date_from = None, date_to = None,
+                   effective_date = None, percent = None, delta = None, dry_run = False):
+    if percent is not None:
+        new_amount = func.round(Employee.current_salary * (1 + percent / 100), 2)  # Индексация в процентах
+    else:
+        new_amount = Employee.current_salary + delta  # Фиксированная прибавка
+
+    conditions = employee_filters(dept, pos, date_from, date_to) + [Employee.current_salary.isnot(None)]
+
+    summary = db.execute(
+        select(
+            func.count().label("employees"),
+            func.coalesce(func.sum(Employee.current_salary), 0).label("current_total"),
+            func.coalesce(func.sum(new_amount), 0).label("new_total")
+        )
+        .where(*conditions)
+    ).one()
+
+    if dry_run or summary.employees == 0:
+        return summary
+
+    # Сначала история: INSERT читает текущие зарплаты до их обновления
+    row_stamp = changes.stamp(db)
+    db.execute(
+        insert(SalaryHistory).from_select(
+            ["employee_id", "change_date", "amount", "row_version", "updated_at"],
+            select(Employee.id, literal(effective_date, Date), new_amount, *stamp_columns(row_stamp)).where(*conditions)
+        )
+    )
+    db.execute(
+        update(Employee)
+        .where(*conditions, newer_salary_condition(effective_date, new_amount))
+        .values(current_salary = new_amount, current_salary_date = effective_date, **row_stamp)
+        .execution_options(synchronize_session = False)
+    )
+    bump_version(db, "salary_history")
+    return summary
+
+
+"""
+Функция строит запрос всех сотрудников с id отдела, должности и текущей зарплатой
+    Запрос читает только таблицу сотрудников, названия берутся из кэша справочников
+    Параметры:
+        after: int | None — курсор: id последнего сотрудника предыдущей страницы
+        projection: tuple | None — выбираемые поля (parse_projection), None — все
+    Возвращаемое значение: Select — запрос SQLAlchemy
+"""
+def employees_full_query(after = None, projection = None):
+    columns = projection_columns(projection) or [
+        Employee.id,
+        Employee.last_name,
+        Employee.first_name,
+        Employee.middle_name,
+        Employee.hire_date,
+        Employee.department_id,  # id отдела, название — из кэша
+        Employee.position_id,  # id должности, название — из кэша
+        Employee.current_salary  # Текущая зарплата из проекции, без чтения salary_history
+    ]
+    query = select(*columns).order_by(Employee.id)
+
+    if after is not None:
+        query = query.where(Employee.id > after)  # Продолжаем после последнего выданного сотрудника
+
+    return query
+
+
+"""
+Функция преобразует строку полного списка сотрудников в словарь схемы EmployeeFull
+    Параметры:
+        row: Row — строка из employees_full_query
+        departments: dict[int, str] — названия отделов по id
+        positions: dict[int, str] — названия должностей по id
+    Возвращаемое значение: dict — сотрудник с названиями отдела и должности
+"""
+def employee_full_to_dict(row, departments, positions):
+    return {
+        "id": row.id,
+        "last_name": row.last_name,
+        "first_name": row.first_name,
+        "middle_name": row.middle_name,
+        "hire_date": row.hire_date,
+        "department": departments.get(row.department_id),
+        "position": positions.get(row.position_id),
+        "current_salary": row.current_salary
+    }
+
+
+"""
+Функция получает всех сотрудников с id отдела, должности и текущей зарплатой
+    Все данные выбираются одним SQL-запросом, количество запросов не зависит от числа сотрудников
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        after: int | None — курсор: id последнего сотрудника предыдущей страницы
+        limit: int | None — максимальное количество сотрудников
+        projection: tuple | None — выбираемые поля (parse_projection), None — все
+    Возвращаемое значение: list[Row] — строки из employees_full_query
+"""
+def get_employees_full(db: Session, after = None, limit = None, projection = None):
+    query = employees_full_query(after, projection)
+
+    if limit:
+        query = query.limit(limit)
+
+    return db.execute(query).all()
+
+
+"""
+Функция создаёт нового сотрудника вместе с начальной записью о зарплате
+    Сотрудник, запись истории и текущая зарплата добавляются в одной транзакции: id сотрудника
+    возвращается самим INSERT, а ответ собирается из уже известных данных и названий из кэша,
+    без повторного чтения. Несуществующий отдел или должность обнаруживаются по ошибке
+    внешнего ключа. Изменения не фиксируются — commit делает вызывающий
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        emp: EmployeeCreate — данные нового сотрудника
+        departments: dict[int, str] — названия отделов по id
+        positions: dict[int, str] — названия должностей по id
+    Возвращаемое значение: dict | None — данные схемы Employee для ответа или None, если нет отдела или должности
+"""
+def create_employee(db: Session, emp, departments, positions):
+    new_emp = Employee(    # Создаём объект сотрудника SQLAlchemy
+        last_name = emp.last_name,  # Фамилия сотрудника
+        first_name = emp.first_name,  # Имя сотрудника
+        middle_name = emp.middle_name,  # Отчество сотрудника 
+        hire_date = emp.hire_date,  # Дата найма
+        department_id = emp.department_id,  # id отдела
+        position_id = emp.position_id,  # id должности
+        current_salary = emp.amount,  # Текущая зарплата — начальная
+        current_salary_date = emp.hire_date if emp.amount is not None else None  # Дата текущей зарплаты
+    )
+    db.add(new_emp)  # Добавляем сотрудника в сессию
+    try:
+        db.flush()  # Отправляем INSERT, чтобы получить id сотрудника в той же транзакции
+    except IntegrityError:  # Нарушен внешний ключ: отдела или должности нет
+        db.rollback()
+        return None
+
+     # Создание начальной записи зарплаты (INSERT уйдёт при commit)
+    if emp.amount is not None:
+        db.add(SalaryHistory(
+            employee_id = new_emp.id,  # id сотрудника
+            change_date = emp.hire_date,  # Дата начала зарплаты
+            amount = emp.amount  # Сумма зарплаты
+        ))
+        bump_version(db, "employees", "salary_history")  # Кэши выборок по сотрудникам и зарплатам устаревают
+    else:
+        bump_version(db, "employees")
+
+    return employee_to_dict(new_emp, departments, positions)
+
+
+"""
+Функция добавляет запись в историю зарплат сотрудника и обновляет его текущую зарплату
+    Отдельной проверки сотрудника нет: несуществующий сотрудник обнаруживается по ошибке
+    внешнего ключа при INSERT. Изменения не фиксируются — commit делает вызывающий
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        employee_id: int — id сотрудника
+        sal: SalaryHistoryBase — дата изменения и сумма
+    Возвращаемое значение: dict | None — данные схемы SalaryHistory для ответа или None, если сотрудник не найден
+"""
+def add_salary_record(db: Session, employee_id: int, sal):
+    new_record = SalaryHistory(  # Создаём новый объект истории зарплаты
+        employee_id = employee_id,  # Привязываем запись к конкретному сотруднику
+        change_date = sal.change_date,  # Дата изменения зарплаты
+        amount = sal.amount  # Сумма зарплаты
+    )
+
+    db.add(new_record)  # Добавляем запись в БД
+    try:
+        db.flush()  # INSERT возвращает id записи
+    except IntegrityError:  # Нарушен внешний ключ: сотрудника нет
+        db.rollback()
+        return None
+
+    apply_salary_change(db, employee_id, sal.change_date, sal.amount)  # Обновляем текущую зарплату сотрудника
+    bump_version(db, "salary_history")  # Кэши выборок по зарплатам (в том числе за прошлые даты) устаревают
+    return {"id": new_record.id, "employee_id": employee_id, "change_date": sal.change_date, "amount": sal.amount}
+
+
+"""
+Класс IdempotencyConflict — Idempotency-Key уже использован для запроса с другим телом
+"""
+class IdempotencyConflict(Exception):
+    pass
+
+
+"""
+Функция строит хэш запроса для проверки повторов с тем же Idempotency-Key
+    Параметры: request: dict — тело и параметры запроса
+    Возвращаемое значение: str — SHA-256 в шестнадцатеричном виде
+"""
+def request_hash(request):
+    data = json.dumps(request, sort_keys = True, default = str, ensure_ascii = False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+"""
+Функция получает сохранённый ответ на запрос с тем же Idempotency-Key
+    Если ключ использован для запроса с другим телом — исключение IdempotencyConflict
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        endpoint: str — метод и маршрут, например "POST /employees"
+        key: str | None — значение заголовка Idempotency-Key
+        request: dict — тело и параметры запроса
+    Возвращаемое значение: dict | None — сохранённый ответ или None, если запроса с таким ключом не было
+"""
+def get_idempotent_response(db: Session, endpoint, key, request):
+    if key is None:
+        return None
+    saved = db.get(IdempotencyKey, (endpoint, key))  # Поиск по первичному ключу
+    if saved is None:
+        return None
+    if saved.request_hash != request_hash(request):
+        raise IdempotencyConflict("Idempotency-Key уже использован для другого запроса")
+    return json.loads(saved.response)
+
+
+"""
+Функция фиксирует транзакцию записи; с Idempotency-Key в той же транзакции сохраняет ответ
+    Если такой же запрос параллельно зафиксирован раньше, вставка ключа нарушает первичный ключ:
+    транзакция откатывается, и возвращается ответ первого запроса — дубликата в БД не остаётся
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        endpoint: str — метод и маршрут
+        key: str | None — значение заголовка Idempotency-Key
+        request: dict — тело и параметры запроса
+        response: dict — ответ на запрос
+    Возвращаемое значение: dict — ответ этого запроса или сохранённый ответ параллельного повтора
+"""
+def commit_idempotent(db: Session, endpoint, key, request, response):
+    if key is not None:
+        db.add(IdempotencyKey(
+            endpoint = endpoint,
+            key = key,
+            request_hash = request_hash(request),
+            response = json.dumps(response, default = str, ensure_ascii = False),
+            created_at = datetime.now(timezone.utc).replace(tzinfo = None)
+        ))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        saved = get_idempotent_response(db, endpoint, key, request)
+        if saved is None:
+            raise
+        return saved
+    return response
+
+
+"""
+Функция создаёт новый отдел и увеличивает версию справочника отделов
+    Изменения не фиксируются — commit делает вызывающий
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        name: str — название отдела
+    Возвращаемое значение: Department | None — созданный отдел или None, если такой уже есть
+"""
+def create_department(db: Session, name: str):
+    existing = db.query(Department).filter(Department.name == name).first()      # Ищем отдел с таким же именем
+    if existing:
+        return None
+
+    new_dep = Department(name = name)     # Создаём объект модели SQLAlchemy
+    db.add(new_dep)  # Добавляем объект в сессию БД
+    bump_version(db, "departments")  # Новая версия справочника — кэши всех процессов устаревают
+    db.flush()  # Получаем id, созданный БД
+    return new_dep
+
+
+"""
+Функция создаёт новую должность и увеличивает версию справочника должностей
+    Изменения не фиксируются — commit делает вызывающий
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        name: str — название должности
+    Возвращаемое значение: Position | None — созданная должность или None, если такая уже есть
+"""
+def create_position(db: Session, name: str):
+    existing = db.query(Position).filter(Position.name == name).first()    # Ищем должность с таким же именем
+    if existing:
+        return None
 
+    new_pos = Position(name = name)
+    db.add(new_pos)  # Добавляем запись в сессию
+    bump_version(db, "positions")  # Новая версия справочника — кэши всех процессов устаревают
+    db.flush()  # Получаем id, созданный БД
+    return new_pos
@@ -0,0 +1,53 @@
+# Асинхронные версии запросов db_queries
+#
+# SQL не дублируется: каждая функция выполняет синхронную функцию db_queries через
+# AsyncSession.run_sync — запросы идут через асинхронный драйвер, а поток не блокируется.
+
+from sqlalchemy.ext.asyncio import AsyncSession
+import db_queries
+
+
+"""
+Функция делает из синхронной функции db_queries асинхронную
+    Параметры: func: callable — функция вида func(db, *args)
+    Возвращаемое значение: callable — корутина вида await wrapper(db: AsyncSession, *args)
+"""
+def run_sync(func):
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(func, *args, **kwargs)
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+get_departments = run_sync(db_queries.get_departments)
+get_positions = run_sync(db_queries.get_positions)
+get_employees = run_sync(db_queries.get_employees)
+get_employees_full = run_sync(db_queries.get_employees_full)
+get_salary_history = run_sync(db_queries.get_salary_history)
+get_salary_histories = run_sync(db_queries.get_salary_histories)
+create_employee = run_sync(db_queries.create_employee)
+add_salary_record = run_sync(db_queries.add_salary_record)
+get_idempotent_response = run_sync(db_queries.get_idempotent_response)
+commit_idempotent = run_sync(db_queries.commit_idempotent)
+create_department = run_sync(db_queries.create_department)
+create_position = run_sync(db_queries.create_position)
+index_salaries = run_sync(db_queries.index_salaries)
+get_versions = run_sync(db_queries.get_versions)
+get_payroll = run_sync(db_queries.get_payroll)
+get_employees_by_ids = run_sync(db_queries.get_employees_by_ids)
+
+
+"""
+Функция-генератор построчно читает результат запроса серверным курсором
+    Параметры:
+        db: AsyncSession — асинхронная сессия SQLAlchemy
+        query: Select — запрос, например из db_queries.employees_query
+        batch_size: int — размер пачки строк
+    Возвращаемое значение: AsyncIterator[Row] — строки результата
+"""
+async def iter_rows(db: AsyncSession, query, batch_size = 1000):
+    result = await db.stream(query.execution_options(yield_per = batch_size))
+    async for row in result:
+        yield row
@@ -0,0 +1,366 @@
+# Потоковая выгрузка реестра сотрудников в CSV и XLSX
+#
+# Строки читаются из БД серверным курсором и сразу кодируются в файл, который
+# отдаётся клиенту по частям: память не растёт с числом сотрудников, а первые байты
+# уходят клиенту до окончания запроса. XLSX — это ZIP-архив с XML-файлами; архив
+# пишется в поток без перемотки (zipfile поддерживает запись в неперематываемый
+# поток), а лист — построчно, поэтому готовая книга в памяти не собирается.
+
+import csv
+import io
+import re
+import zipfile
+from datetime import date
+from xml.sax.saxutils import escape
+from fastapi.responses import StreamingResponse
+from streaming import CHUNK_ROWS
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_DELIMITER = ";"  # Разделитель, который Excel с русскими региональными настройками открывает без мастера импорта
+
+# Столбцы реестра: заголовок и функция получения значения из строки
+EXPORT_COLUMNS = [
+    ("id", lambda row, deps, poss: row.id),
+    ("Фамилия", lambda row, deps, poss: row.last_name),
+    ("Имя", lambda row, deps, poss: row.first_name),
+    ("Отчество", lambda row, deps, poss: row.middle_name),
+    ("Дата приёма", lambda row, deps, poss: row.hire_date),
+    ("Отдел", lambda row, deps, poss: deps.get(row.department_id)),
+    ("Должность", lambda row, deps, poss: poss.get(row.position_id)),
+    ("Текущая зарплата", lambda row, deps, poss: row.current_salary),
+]
+
+EXCEL_EPOCH = date(1899, 12, 30)  # Дата, от которой Excel отсчитывает дни
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")  # Управляющие символы, недопустимые в XML
+
+
+"""
+Функция преобразует строку запроса сотрудников в значения столбцов реестра
+    Параметры:
+        row: Row — строка из db_queries.employees_query
+        departments: dict[int, str] — названия отделов по id
+        positions: dict[int, str] — названия должностей по id
+    Возвращаемое значение: list — значения столбцов EXPORT_COLUMNS
+"""
+def export_values(row, departments, positions):
+    return [value(row, departments, positions) for _, value in EXPORT_COLUMNS]
+
+
+"""
+Класс CsvWriter кодирует реестр в CSV (UTF-8 с BOM, чтобы Excel распознал кодировку)
+"""
+class CsvWriter:
+    media_type = CSV_MEDIA_TYPE
+    extension = "csv"
+
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, delimiter = CSV_DELIMITER, lineterminator = "\r\n")
+
+    """
+    Метод забирает накопленный в буфере текст и очищает буфер
+        Параметры: отсутствуют
+        Возвращаемое значение: bytes — кусок файла в UTF-8
+    """
+    def take(self):
+        data = self.buffer.getvalue().encode("utf-8")
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    """
+    Метод возвращает начало файла: BOM и строку заголовка
+        Параметры: отсутствуют
+        Возвращаемое значение: bytes — кусок файла
+    """
+    def start(self):
+        self.buffer.write("﻿")
+        self.writer.writerow([title for title, _ in EXPORT_COLUMNS])
+        return self.take()
+
+    """
+    Метод кодирует пачку строк реестра
+        Параметры: rows: list[list] — значения столбцов
+        Возвращаемое значение: bytes — кусок файла
+    """
+    def write(self, rows):
+        self.writer.writerows(rows)
+        return self.take()
+
+    """
+    Метод возвращает окончание файла
+        Параметры: отсутствуют
+        Возвращаемое значение: bytes — кусок файла (для CSV пустой)
+    """
+    def finish(self):
+        return b""
+
+
+"""
+Класс ChunkStream — неперематываемый поток, накапливающий записанные байты до выдачи клиенту
+"""
+class ChunkStream:
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+# Неизменные части книги XLSX: типы содержимого, связи, книга с одним листом и стили
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Сотрудники" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/styles.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="3">'
+        '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+        '</cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" state="frozen"/></sheetView></sheetViews>'
+    '<sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+DATE_STYLE = 1  # Номер стиля ячейки с датой в xl/styles.xml
+HEADER_STYLE = 2  # Номер стиля ячейки заголовка (полужирный)
+
+
+"""
+Функция кодирует значение в ячейку листа XLSX
+    Параметры:
+        value — значение (число, дата, строка или None)
+        style: int — номер стиля ячейки (0 — обычный)
+    Возвращаемое значение: str — XML ячейки
+"""
+def xlsx_cell(value, style = 0):
+    styled = f' s="{style}"' if style else ""
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        value = str(value)
+    if isinstance(value, (int, float)):
+        return f"<c{styled}><v>{value}</v></c>"
+    if isinstance(value, date):
+        return f'<c s="{DATE_STYLE}"><v>{(value - EXCEL_EPOCH).days}</v></c>'
+    text = escape(INVALID_XML_CHARS.sub("", str(value)))
+    return f'<c{styled} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+"""
+Класс XlsxWriter кодирует реестр в книгу XLSX, записывая архив в поток по частям
+"""
+class XlsxWriter:
+    media_type = XLSX_MEDIA_TYPE
+    extension = "xlsx"
+
+    def __init__(self):
+        self.stream = ChunkStream()
+        self.archive = zipfile.ZipFile(self.stream, "w", zipfile.ZIP_DEFLATED)
+        self.sheet = None
+
+    """
+    Метод записывает неизменные части книги, начало листа и строку заголовка
+        Параметры: отсутствуют
+        Возвращаемое значение: bytes — кусок файла
+    """
+    def start(self):
+        for name, content in XLSX_PARTS.items():
+            self.archive.writestr(name, content)
+        self.sheet = self.archive.open("xl/worksheets/sheet1.xml", "w", force_zip64 = True)  # Размер листа заранее неизвестен
+        header = "".join(xlsx_cell(title, HEADER_STYLE) for title, _ in EXPORT_COLUMNS)
+        self.sheet.write(f"{SHEET_START}<row>{header}</row>".encode("utf-8"))
+        return self.stream.take()
+
+    """
+    Метод кодирует пачку строк реестра в лист
+        Параметры: rows: list[list] — значения столбцов
+        Возвращаемое значение: bytes — сжатые данные, готовые к отправке (могут быть пустыми)
+    """
+    def write(self, rows):
+        self.sheet.write("".join("<row>" + "".join(map(xlsx_cell, row)) + "</row>" for row in rows).encode("utf-8"))
+        return self.stream.take()
+
+    """
+    Метод завершает лист и архив (центральный каталог ZIP)
+        Параметры: отсутствуют
+        Возвращаемое значение: bytes — окончание файла
+    """
+    def finish(self):
+        self.sheet.write(SHEET_END.encode("utf-8"))
+        self.sheet.close()
+        self.archive.close()
+        return self.stream.take()
+
+
+WRITERS = {"csv": CsvWriter, "xlsx": XlsxWriter}  # Форматы выгрузки
+
+
+"""
+Функция-генератор кодирует строки выгрузки пачками по CHUNK_ROWS в открытой сессии
+    Начало и конец файла (writer.start, writer.finish) пишет вызывающий код
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        fetch: callable — функция fetch(db), возвращающая итератор строк
+        writer: CsvWriter | XlsxWriter — кодировщик файла
+        to_values: callable — функция преобразования строки в значения столбцов
+    Возвращаемое значение: Iterator[bytes] — куски файла
+"""
+def export_rows(db, fetch, writer, to_values):
+    rows = []
+    for row in fetch(db):
+        rows.append(to_values(row))
+        if len(rows) >= CHUNK_ROWS:
+            data = writer.write(rows)
+            rows = []
+            if data:
+                yield data
+    if rows:
+        yield writer.write(rows)
+
+
+"""
+Функция-генератор читает сотрудников и отдаёт файл выгрузки по частям
+    Работает в собственной сессии, как streaming.ndjson_chunks
+    Параметры:
+        session_factory: callable — функция, открывающая сессию
+        fetch: callable — функция fetch(db), возвращающая итератор строк
+        writer: CsvWriter | XlsxWriter — кодировщик файла
+        to_values: callable — функция преобразования строки в значения столбцов
+    Возвращаемое значение: Iterator[bytes] — куски файла
+"""
+def export_chunks(session_factory, fetch, writer, to_values):
+    yield writer.start()  # Заголовок уходит клиенту сразу, до выполнения запроса
+    db = session_factory()
+    try:
+        yield from export_rows(db, fetch, writer, to_values)
+    finally:
+        db.close()
+    yield writer.finish()
+
+
+"""
+Асинхронная версия export_chunks для приложения HRM_async
+    Параметры:
+        session_factory: async_sessionmaker — фабрика асинхронных сессий
+        fetch: callable — функция fetch(db), возвращающая асинхронный итератор строк
+        writer: CsvWriter | XlsxWriter — кодировщик файла
+        to_values: callable — функция преобразования строки в значения столбцов
+    Возвращаемое значение: AsyncIterator[bytes] — куски файла
+"""
+async def export_chunks_async(session_factory, fetch, writer, to_values):
+    yield writer.start()
+    async with session_factory() as db:
+        rows = []
+        async for row in fetch(db):
+            rows.append(to_values(row))
+            if len(rows) >= CHUNK_ROWS:
+                data = writer.write(rows)
+                rows = []
+                if data:
+                    yield data
+        if rows:
+            yield writer.write(rows)
+    yield writer.finish()
+
+
+"""
+Функция создаёт потоковый ответ с файлом выгрузки
+    Параметры:
+        format: str — формат файла: "csv" или "xlsx"
+        session_factory: callable — функция, открывающая сессию (например, на реплике)
+        fetch: callable — функция fetch(db), возвращающая итератор строк
+        to_values: callable — функция преобразования строки в значения столбцов
+    Возвращаемое значение: StreamingResponse — файл, который пишется по мере чтения строк из БД
+"""
+def export_response(format, session_factory, fetch, to_values):
+    writer = WRITERS[format]()
+    return StreamingResponse(export_chunks(session_factory, fetch, writer, to_values), media_type = writer.media_type,
+                             headers = attachment(writer))
+
+
+"""
+Функция создаёт потоковый ответ с файлом выгрузки для асинхронного приложения
+    Параметры:
+        format: str — формат файла: "csv" или "xlsx"
+        session_factory: async_sessionmaker — фабрика асинхронных сессий
+        fetch: callable — функция fetch(db), возвращающая асинхронный итератор строк
+        to_values: callable — функция преобразования строки в значения столбцов
+    Возвращаемое значение: StreamingResponse — файл, который пишется по мере чтения строк из БД
+"""
+def export_response_async(format, session_factory, fetch, to_values):
+    writer = WRITERS[format]()
+    return StreamingResponse(export_chunks_async(session_factory, fetch, writer, to_values),
+                             media_type = writer.media_type, headers = attachment(writer))
+
+
+"""
+Функция формирует заголовок Content-Disposition, чтобы браузер сохранил ответ как файл
+    Параметры: writer: CsvWriter | XlsxWriter — кодировщик файла
+    Возвращаемое значение: dict — заголовки ответа
+"""
+def attachment(writer):
+    return {"Content-Disposition": f'attachment; filename="employees.{writer.extension}"'}
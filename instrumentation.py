@@ -0,0 +1,251 @@
+# Замеры SQL-запросов и сериализации для каждого HTTP-запроса
+#
+# Обработчики событий SQLAlchemy before/after_cursor_execute считают запросы к БД
+# всех подключений процесса (основная БД, реплики, асинхронный движок) и складывают
+# их в статистику текущего HTTP-запроса (contextvar). Промежуточный слой отдаёт
+# статистику в заголовке Server-Timing и пишет строку JSON в журнал hrm.requests
+# после отправки ответа. Медленные запросы (SLOW_QUERY_MS) пишутся в журнал
+# hrm.slow_queries с текстом SQL и формой параметров, без самих значений.
+
+import inspect
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))  # Порог журнала медленных запросов, 0 — журнал выключен
+REQUEST_LOG = os.getenv("REQUEST_LOG", "1") == "1"  # Писать ли строку журнала на каждый HTTP-запрос
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))  # Сколько одинаковых запросов считать признаком N+1
+
+request_logger = logging.getLogger("hrm.requests")
+slow_query_logger = logging.getLogger("hrm.slow_queries")
+
+current_stats = ContextVar("current_stats", default = None)  # Статистика обрабатываемого HTTP-запроса
+
+
+"""
+Класс RequestStats — статистика одного HTTP-запроса
+"""
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0  # Количество SQL-запросов
+        self.db_seconds = 0.0  # Суммарное время SQL-запросов
+        self.slowest_seconds = 0.0  # Время самого медленного SQL-запроса
+        self.slowest_statement = None  # Текст самого медленного SQL-запроса
+        self.repeats = Counter()  # Сколько раз выполнялся каждый текст SQL (признак N+1)
+        self.endpoint_done = None  # Когда обработчик вернул результат (начало сериализации)
+        self.serialize_seconds = 0.0  # Проверка и сериализация ответа по response_model
+
+    """
+    Метод учитывает выполненный SQL-запрос
+        Параметры:
+            statement: str — текст SQL
+            seconds: float — время выполнения
+        Возвращаемое значение: отсутствует
+    """
+    def add_statement(self, statement, seconds):
+        self.statements += 1
+        self.db_seconds += seconds
+        self.repeats[statement] += 1
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+    """
+    Метод возвращает наибольшее количество повторов одного и того же SQL
+        Параметры: отсутствуют
+        Возвращаемое значение: int — количество повторов
+    """
+    def max_repeats(self):
+        return max(self.repeats.values(), default = 0)
+
+    """
+    Метод формирует значение заголовка Server-Timing
+        Параметры: отсутствуют
+        Возвращаемое значение: str — значение заголовка
+    """
+    def server_timing(self):
+        return ", ".join([
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} queries"',
+            f"db-slowest;dur={self.slowest_seconds * 1000:.2f}",
+            f"serialize;dur={self.serialize_seconds * 1000:.2f}",
+            f"app;dur={(time.perf_counter() - self.started) * 1000:.2f}",
+        ])
+
+
+"""
+Функция описывает форму параметров SQL-запроса без самих значений
+    Значения (зарплаты, ФИО) в журнал не попадают, только типы и количество строк
+    Параметры:
+        parameters: dict | tuple | list — параметры запроса
+        executemany: bool — выполняется ли запрос для набора строк
+    Возвращаемое значение: dict | list — форма параметров
+"""
+def parameter_shape(parameters, executemany):
+    if executemany and parameters:
+        return {"rows": len(parameters), "row": parameter_shape(parameters[0], False)}
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+
+    stats = current_stats.get()
+    if stats is not None:
+        stats.add_statement(statement, seconds)
+
+    if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+        slow_query_logger.warning(json.dumps({
+            "duration_ms": round(seconds * 1000, 2),
+            "statement": statement,
+            "parameters": parameter_shape(parameters, executemany)
+        }, ensure_ascii = False))
+
+
+"""
+Класс InstrumentationMiddleware — промежуточный слой ASGI со статистикой запроса
+    Заголовок Server-Timing содержит замеры на момент отправки заголовков, строка
+    журнала пишется после отправки всего тела, поэтому для потоковых ответов (NDJSON)
+    в журнал попадают и запросы, выполненные во время передачи
+"""
+class InstrumentationMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        status = None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", []).append((b"server-timing", stats.server_timing().encode("latin-1")))
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                log_request(scope, status, stats)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_stats.reset(token)
+
+
+"""
+Функция пишет строку журнала со статистикой HTTP-запроса
+    Если один и тот же SQL выполнился N_PLUS_ONE_THRESHOLD раз и больше, строка пишется
+    с уровнем WARNING — так сразу видны ленивые загрузки связей в цикле (N+1)
+    Параметры:
+        scope: dict — описание запроса ASGI
+        status: int — код ответа
+        stats: RequestStats — статистика запроса
+    Возвращаемое значение: отсутствует
+"""
+def log_request(scope, status, stats):
+    repeats = stats.max_repeats()
+    suspect = N_PLUS_ONE_THRESHOLD and repeats >= N_PLUS_ONE_THRESHOLD
+    if not (REQUEST_LOG or suspect):
+        return
+
+    line = {
+        "method": scope["method"],
+        "path": scope["path"],
+        "status": status,
+        "duration_ms": round((time.perf_counter() - stats.started) * 1000, 2),
+        "db_statements": stats.statements,
+        "db_ms": round(stats.db_seconds * 1000, 2),
+        "db_slowest_ms": round(stats.slowest_seconds * 1000, 2),
+        "db_slowest_sql": stats.slowest_statement,
+        "serialize_ms": round(stats.serialize_seconds * 1000, 2),
+        "max_statement_repeats": repeats,
+    }
+    if suspect:
+        line["n_plus_one"] = stats.repeats.most_common(1)[0][0]
+        request_logger.warning(json.dumps(line, ensure_ascii = False))
+    else:
+        request_logger.info(json.dumps(line, ensure_ascii = False))
+
+
+"""
+Функция оборачивает обработчик маршрута, чтобы отметить момент, когда он вернул результат
+    Параметры: endpoint: callable — обработчик (обычная функция или корутина)
+    Возвращаемое значение: callable — обёртка с той же сигнатурой
+"""
+def mark_endpoint_done(endpoint):
+    def done(result):
+        stats = current_stats.get()
+        if stats is not None:
+            stats.endpoint_done = time.perf_counter()
+        return result
+
+    if inspect.iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            return done(await endpoint(*args, **kwargs))
+    else:
+        @wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            return done(endpoint(*args, **kwargs))
+    return wrapper
+
+
+"""
+Класс TimedRoute — маршрут FastAPI, замеряющий проверку и сериализацию ответа
+    Время сериализации — от возврата результата обработчиком до готового объекта Response
+"""
+class TimedRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, mark_endpoint_done(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            stats = current_stats.get()
+            if stats is not None and stats.endpoint_done is not None:
+                stats.serialize_seconds += time.perf_counter() - stats.endpoint_done
+                stats.endpoint_done = None
+            return response
+
+        return timed_handler
+
+
+"""
+Функция подключает замеры к приложению FastAPI
+    Вызывается сразу после создания приложения, до объявления маршрутов
+    Параметры: app: FastAPI — приложение
+    Возвращаемое значение: отсутствует
+"""
+def instrument(app):
+    app.router.route_class = TimedRoute
+    app.add_middleware(InstrumentationMiddleware)
+
+    if not request_logger.handlers:  # Строки JSON без префиксов, если журнал не настроен снаружи
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        for logger in (request_logger, slow_query_logger):
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
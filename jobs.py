@@ -0,0 +1,346 @@
+# Фоновые задания для тяжёлых отчётов
+#
+# Полный список сотрудников, выгрузка реестра и ведомость зарплат на больших данных
+# считаются долго: внутри обработчика они держат подключение к БД и поток сервера
+# и обрываются таймаутом прокси. POST /jobs ставит отчёт в очередь и сразу отвечает
+# номером задания, GET /jobs/{id} показывает состояние, а GET /jobs/{id}/result отдаёт файл.
+#
+# Задания выполняются в ограниченном пуле потоков (JOB_WORKERS), а в очереди может
+# быть не больше JOB_QUEUE_SIZE заданий — сверх этого сервер отвечает 503. Номер
+# задания — хэш типа отчёта, формата, параметров и версий данных из data_versions,
+# поэтому одинаковые запросы, пришедшие одновременно, получают одно задание, а
+# повторный запрос при неизменных данных сразу получает готовый файл с диска.
+# Файлы со старыми версиями данных больше не запрашиваются и удаляются через JOB_RESULT_TTL.
+#
+# Версии для номера задания читаются с основной БД, а отчёт может строиться на реплике.
+# Поэтому задание сверяет версии в своей сессии до и после построения: реплика, которая
+# отстаёт, ожидается до JOB_VERSION_WAIT секунд, а если данные изменились, файл не
+# сохраняется под номером, который описывает другие данные, и задание завершается ошибкой.
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from itertools import islice
+from database import SessionLocal
+import db_queries
+import streaming
+import export
+import cache
+
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "hrm_jobs"))  # Каталог с результатами заданий
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Сколько заданий выполняется одновременно
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))  # Сколько заданий может ждать и выполняться, сверх — 503
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "86400"))  # Сколько секунд хранить результат задания
+JOB_VERSION_WAIT = float(os.getenv("JOB_VERSION_WAIT", "10"))  # Сколько секунд ждать, пока реплика догонит версии задания
+JOB_VERSION_POLL = 0.2  # Как часто (сек) перечитывать версии отстающей реплики
+
+# Отчёты: наборы данных, от которых зависит результат, и доступные форматы
+REPORT_DATA = {"employees": db_queries.EMPLOYEE_LIST_DATA, "payroll": db_queries.PAYROLL_DATA}
+REPORT_FORMATS = {"employees": ("json", "csv", "xlsx"), "payroll": ("json",)}
+MEDIA_TYPES = {"json": "application/json", "csv": export.CSV_MEDIA_TYPE, "xlsx": export.XLSX_MEDIA_TYPE}
+JOB_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+"""
+Класс QueueFull — очередь заданий заполнена
+"""
+class QueueFull(Exception):
+    pass
+
+
+"""
+Класс DataChanged — данные отчёта изменились после постановки задания в очередь
+"""
+class DataChanged(Exception):
+    pass
+
+
+"""
+Функция проверяет параметры отчёта и приводит их к виду, по которому строится номер задания
+    Параметры:
+        report: str — тип отчёта: "employees" или "payroll"
+        format: str — формат результата: "json", "csv" или "xlsx"
+        params: dict — фильтры department_id, position_id, hire_date_from, hire_date_to и дата as_of
+    Возвращаемое значение: dict — параметры отчёта (as_of ведомости по умолчанию — сегодня)
+"""
+def report_params(report, format, params):
+    if format not in REPORT_FORMATS[report]:
+        raise ValueError(f"Отчёт {report} не выгружается в формате {format}")
+
+    result = {name: params.get(name) for name in ("department_id", "position_id", "hire_date_from", "hire_date_to")}
+    if report == "payroll":
+        result["as_of"] = params.get("as_of") or date.today()  # Дата фиксируется при постановке в очередь
+    return result
+
+
+"""
+Функция строит номер задания по отчёту, параметрам и версиям данных
+    Параметры:
+        report: str — тип отчёта
+        format: str — формат результата
+        params: dict — параметры из report_params
+        versions: tuple[int] — версии данных отчёта
+    Возвращаемое значение: str — номер задания (32 шестнадцатеричных символа)
+"""
+def job_id(report, format, params, versions):
+    key = json.dumps([report, format, sorted(params.items()), list(versions)], default = str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+"""
+Функция записывает строки в файл как список JSON, частями по CHUNK_ROWS строк
+    Параметры:
+        file: BinaryIO — файл результата
+        rows: Iterator[Row] — строки выборки
+        to_dict: callable — функция преобразования строки в словарь
+    Возвращаемое значение: отсутствует
+"""
+def write_json_list(file, rows, to_dict):
+    file.write(b"[")
+    first = True
+    while True:
+        batch = [to_dict(row) for row in islice(rows, streaming.CHUNK_ROWS)]
+        if not batch:
+            break
+        data = streaming.dumps(batch)[1:-1]  # Элементы списка без квадратных скобок
+        file.write(data if first else b"," + data)
+        first = False
+    file.write(b"]")
+
+
+"""
+Функция пишет полный список сотрудников (как /employees/full) или реестр CSV/XLSX (как /employees/export)
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        format: str — формат результата
+        params: dict — параметры из report_params
+        file: BinaryIO — файл результата
+    Возвращаемое значение: отсутствует
+"""
+def write_employees(db, format, params, file):
+    departments = cache.departments.get(db).names
+    positions = cache.positions.get(db).names
+    query = db_queries.employees_query(params["department_id"], params["position_id"],
+                                       params["hire_date_from"], params["hire_date_to"])
+    if format == "json":
+        write_json_list(file, db_queries.iter_rows(db, query),
+                        lambda row: db_queries.employee_full_to_dict(row, departments, positions))
+        return
+
+    writer = export.WRITERS[format]()
+    file.write(writer.start())
+    for chunk in export.export_rows(db, lambda s: db_queries.iter_rows(s, query), writer,
+                                    lambda row: export.export_values(row, departments, positions)):
+        file.write(chunk)
+    file.write(writer.finish())
+
+
+"""
+Функция пишет ведомость зарплат на дату (как /payroll)
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        format: str — формат результата (только "json")
+        params: dict — параметры из report_params
+        file: BinaryIO — файл результата
+    Возвращаемое значение: отсутствует
+"""
+def write_payroll(db, format, params, file):
+    rows = db_queries.get_payroll(db, params["as_of"], params["department_id"], params["position_id"],
+                                  params["hire_date_from"], params["hire_date_to"])
+    write_json_list(file, iter(rows), lambda row: dict(row._mapping))
+
+
+REPORTS = {"employees": write_employees, "payroll": write_payroll}  # Функции построения отчётов
+
+
+"""
+Класс Job описывает задание и его состояние
+"""
+class Job:
+    def __init__(self, id, report, format, params, versions = None, status = "queued"):
+        self.id = id
+        self.report = report  # Тип отчёта, None — задание найдено только по файлу на диске
+        self.format = format
+        self.params = params
+        self.versions = versions  # Версии данных, по которым построен номер задания
+        self.status = status  # queued, running, done или failed
+        self.error = None  # Текст ошибки задания со статусом failed
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at = None
+
+    """
+    Метод возвращает путь к файлу результата
+        Параметры: directory: str — каталог результатов
+        Возвращаемое значение: str — путь к файлу
+    """
+    def path(self, directory):
+        return os.path.join(directory, f"{self.id}.{self.format}")
+
+    """
+    Метод возвращает описание задания для ответа API
+        Параметры: отсутствуют
+        Возвращаемое значение: dict — поля схемы JobStatus
+    """
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "report": self.report,
+            "format": self.format,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result_url": f"/jobs/{self.id}/result" if self.status == "done" else None
+        }
+
+
+"""
+Класс JobManager ставит задания в очередь, выполняет их в пуле потоков и хранит результаты на диске
+"""
+class JobManager:
+    def __init__(self, directory, workers, queue_size):
+        self.directory = directory
+        self.workers = workers
+        self.queue_size = queue_size  # Сколько заданий может ждать и выполняться одновременно
+        self.jobs = {}  # Задания этого процесса по номеру
+        self.executor = None  # Пул потоков создаётся при первом задании
+        self.lock = threading.Lock()
+
+    """
+    Метод ставит отчёт в очередь или возвращает уже существующее задание с тем же номером
+        Параметры:
+            report: str — тип отчёта
+            format: str — формат результата
+            params: dict — параметры из report_params
+            versions: tuple[int] — версии данных отчёта на момент запроса
+            session_factory: callable — функция, открывающая сессию для задания
+        Возвращаемое значение: Job — задание
+    """
+    def submit(self, report, format, params, versions, session_factory = SessionLocal):
+        id = job_id(report, format, params, versions)
+        self.sweep()
+        with self.lock:
+            job = self.jobs.get(id)
+            if job is not None and job.status in ("queued", "running", "done"):
+                if job.status != "done" or os.path.exists(job.path(self.directory)):
+                    return job  # Такой же отчёт уже считается или готов
+
+            job = Job(id, report, format, params, versions)
+            if os.path.exists(job.path(self.directory)):  # Готов на диске (в том числе другим процессом)
+                job.status = "done"
+                job.finished_at = job.created_at
+                self.jobs[id] = job
+                return job
+
+            active = sum(1 for item in self.jobs.values() if item.status in ("queued", "running"))
+            if active >= self.queue_size:
+                raise QueueFull()
+
+            if self.executor is None:
+                os.makedirs(self.directory, exist_ok = True)
+                self.executor = ThreadPoolExecutor(max_workers = self.workers, thread_name_prefix = "hrm-job")
+            self.jobs[id] = job
+            self.executor.submit(self.run, job, session_factory)
+        return job
+
+    """
+    Метод ждёт, пока версии данных в сессии задания станут равны версиям его номера
+        Параметры:
+            db: Session — сессия задания (возможно, на реплике)
+            job: Job — задание
+        Возвращаемое значение: отсутствует
+    """
+    def wait_versions(self, db, job):
+        deadline = time.monotonic() + JOB_VERSION_WAIT
+        while True:
+            versions = db_queries.get_versions(db, REPORT_DATA[job.report])
+            if versions == job.versions:
+                return
+            if any(current > expected for current, expected in zip(versions, job.versions)):
+                raise DataChanged("Данные изменились после постановки задания, поставьте его заново")
+            if time.monotonic() >= deadline:
+                raise DataChanged("Реплика не догнала данные задания, поставьте его заново")
+            db.rollback()  # Следующее чтение видит то, что реплика применила за это время
+            time.sleep(JOB_VERSION_POLL)
+
+    """
+    Метод строит отчёт задания во временный файл и переименовывает его в файл результата
+        Версии данных сверяются до и после построения: файл сохраняется, только если отчёт
+        построен по тем данным, которые описывает номер задания
+        Параметры:
+            job: Job — задание
+            session_factory: callable — функция, открывающая сессию
+        Возвращаемое значение: отсутствует
+    """
+    def run(self, job, session_factory):
+        job.status = "running"
+        path = job.path(self.directory)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            db = session_factory()
+            try:
+                self.wait_versions(db, job)
+                with open(temp_path, "wb") as file:
+                    REPORTS[job.report](db, job.format, job.params, file)
+                if db_queries.get_versions(db, REPORT_DATA[job.report]) != job.versions:
+                    raise DataChanged("Данные изменились во время построения отчёта, поставьте задание заново")
+            finally:
+                db.close()
+            os.replace(temp_path, path)  # Файл появляется целиком: читатели не видят недописанный результат
+            job.status = "done"
+        except Exception as error:
+            job.error = str(error)
+            job.status = "failed"
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        job.finished_at = datetime.now(timezone.utc)
+
+    """
+    Метод находит задание по номеру: в памяти процесса или по файлу результата на диске
+        Параметры: id: str — номер задания
+        Возвращаемое значение: Job | None — задание или None, если его нет
+    """
+    def get(self, id):
+        if not JOB_ID.match(id):
+            return None
+        job = self.jobs.get(id)
+        if job is not None and (job.status != "done" or os.path.exists(job.path(self.directory))):
+            return job
+
+        for format in MEDIA_TYPES:  # Задание другого процесса или до перезапуска
+            path = os.path.join(self.directory, f"{id}.{format}")
+            if os.path.exists(path):
+                job = Job(id, None, format, None, status = "done")
+                job.created_at = job.finished_at = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+                return job
+        return None
+
+    """
+    Метод удаляет результаты старше JOB_RESULT_TTL и завершённые задания из памяти
+        Параметры: отсутствуют
+        Возвращаемое значение: отсутствует
+    """
+    def sweep(self):
+        deadline = time.time() - JOB_RESULT_TTL
+        with self.lock:
+            for id, job in list(self.jobs.items()):
+                if job.finished_at is not None and job.finished_at.timestamp() < deadline:
+                    del self.jobs[id]
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+            except OSError:
+                pass  # Файл уже удалён другим процессом
+
+
+manager = JobManager(JOBS_DIR, JOB_WORKERS, JOB_QUEUE_SIZE)  # Задания процесса
@@ -0,0 +1,103 @@
+# Служебные команды обслуживания базы данных
+#   python manage.py migrate — создать или обновить схему базы (выполняется при развёртывании)
+#   python manage.py check-schema — проверить, что схема базы соответствует коду
+#   python manage.py rebuild-salaries — пересчитать текущие зарплаты сотрудников
+#   python manage.py seed — заполнить базу синтетическими данными для нагрузочного тестирования
+
+import argparse
+import sys
+from database import SessionLocal, engine
+import db_queries
+import migrations
+import dataHRM
+
+
+"""
+Функция применяет к базе все новые миграции схемы
+    Параметры: args: argparse.Namespace — аргументы командной строки
+    Возвращаемое значение: отсутствует
+"""
+def migrate(args):
+    applied = migrations.upgrade(engine)
+    for number, description in applied:
+        print(f"Применена миграция {number}: {description}")
+    print(f"Версия схемы: {migrations.LATEST_VERSION}")
+
+
+"""
+Функция проверяет версию схемы базы, при расхождении завершает процесс с кодом 1
+    Параметры: args: argparse.Namespace — аргументы командной строки
+    Возвращаемое значение: отсутствует
+"""
+def check_schema(args):
+    version, expected = migrations.check(engine)
+    if version != expected:
+        print(f"Схема базы устарела: версия {version}, требуется {expected}. Выполните: python manage.py migrate")
+        sys.exit(1)
+    print(f"Схема базы актуальна, версия {version}")
+
+
+"""
+Функция пересчитывает текущие зарплаты всех сотрудников по истории зарплат
+    Параметры: args: argparse.Namespace — аргументы командной строки
+    Возвращаемое значение: отсутствует
+"""
+def rebuild_salaries(args):
+    db = SessionLocal()
+    try:
+        count = db_queries.rebuild_current_salaries(db)
+        db_queries.bump_version(db, "employees")  # Текущие зарплаты могли измениться — кэши выборок устаревают
+        db.commit()  # Пересчёт выполняется одной транзакцией
+        print(f"Текущие зарплаты пересчитаны, сотрудников с историей: {count}")
+    finally:
+        db.close()
+
+
+"""
+Функция заполняет базу синтетическими данными заданного объёма
+    Параметры: args: argparse.Namespace — аргументы командной строки
+    Возвращаемое значение: отсутствует
+"""
+def seed(args):
+    migrations.upgrade(engine)  # Генератору нужна актуальная схема
+    db = SessionLocal()
+    try:
+        employees, salaries = dataHRM.generate_data(
+            db, args.employees, args.salary_rows, args.departments, args.positions, args.same_day_share, args.seed,
+            progress = lambda e, s: print(f"Сотрудников: {e}, записей истории зарплат: {s}", end = "\r")
+        )
+        print(f"\nДобавлено сотрудников: {employees}, записей истории зарплат: {salaries}")
+    finally:
+        db.close()
+
+
+"""
+Функция разбирает аргументы командной строки и запускает команду
+    Параметры: argv: list[str] | None — аргументы (по умолчанию из sys.argv)
+    Возвращаемое значение: отсутствует
+"""
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Служебные команды HRM")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    commands.add_parser("migrate", help = "создать или обновить схему базы").set_defaults(func = migrate)
+    commands.add_parser("check-schema", help = "проверить версию схемы базы").set_defaults(func = check_schema)
+
+    rebuild = commands.add_parser("rebuild-salaries", help = "пересчитать текущие зарплаты по истории зарплат")
+    rebuild.set_defaults(func = rebuild_salaries)
+
+    generator = commands.add_parser("seed", help = "заполнить базу синтетическими данными")
+    generator.add_argument("--employees", type = int, default = 100000, help = "количество сотрудников")
+    generator.add_argument("--salary-rows", type = int, default = 2000000, help = "примерное количество записей истории зарплат")
+    generator.add_argument("--departments", type = int, default = 30, help = "количество отделов")
+    generator.add_argument("--positions", type = int, default = 40, help = "количество должностей")
+    generator.add_argument("--same-day-share", type = float, default = 0.05, help = "доля изменений зарплаты в один день")
+    generator.add_argument("--seed", type = int, default = 42, help = "начальное значение генератора случайных чисел")
+    generator.set_defaults(func = seed)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Метрики пула подключений к БД в формате Prometheus
+#
+# Пул подключений заменяется на подкласс QueuePool, который замеряет время выдачи
+# подключения (ожидание в очереди, создание подключения, pre-ping), отдельно — ожидание
+# в очереди, когда все подключения заняты, и считает таймауты.
+# Текущее состояние пула (занято, переполнение) берётся из самого пула при выдаче метрик.
+
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"  # Текстовый формат Prometheus
+
+# Границы корзин гистограммы времени выдачи подключения, в секундах
+CHECKOUT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+"""
+Класс Histogram — гистограмма с накопительными корзинами, как в Prometheus
+"""
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # Сколько значений попало в корзину (не больше её границы)
+        self.total = 0.0  # Сумма значений
+        self.count = 0  # Количество значений
+        self.lock = threading.Lock()
+
+    """
+    Метод добавляет наблюдение в гистограмму
+        Параметры: value: float — значение
+        Возвращаемое значение: отсутствует
+    """
+    def observe(self, value):
+        with self.lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+            self.total += value
+            self.count += 1
+
+    """
+    Метод формирует строки гистограммы в формате Prometheus
+        Параметры:
+            name: str — имя метрики
+            labels: str — метки вида 'pool="primary"'
+        Возвращаемое значение: list[str] — строки метрики
+    """
+    def render(self, name, labels):
+        with self.lock:
+            lines = [f'{name}_bucket{{{labels},le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+            lines.append(f"{name}_sum{{{labels}}} {self.total}")
+            lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+"""
+Класс PoolStats — накопленная статистика одного пула подключений
+"""
+class PoolStats:
+    def __init__(self):
+        self.checkout_latency = Histogram(CHECKOUT_BUCKETS)  # Полное время выдачи подключения
+        self.wait_seconds = 0.0  # Суммарное время ожидания свободного подключения в очереди пула
+        self.timeouts = 0  # Сколько раз подключение не дождались за pool_timeout
+        self.lock = threading.Lock()  # Счётчики обновляются из потоков всех запросов
+
+    """
+    Метод учитывает ожидание подключения в очереди пула
+        Параметры:
+            seconds: float — время ожидания
+            timeout: bool — True, если подключение не дождались за pool_timeout
+        Возвращаемое значение: отсутствует
+    """
+    def add_wait(self, seconds, timeout):
+        with self.lock:
+            self.wait_seconds += seconds
+            if timeout:
+                self.timeouts += 1
+
+
+"""
+Класс TimedPoolMixin добавляет пулу замеры времени выдачи подключений
+"""
+class TimedPoolMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    """
+    Метод выдаёт подключение из пула, замеряя полное время выдачи (включая pre-ping)
+        Параметры: отсутствуют
+        Возвращаемое значение: подключение из пула
+    """
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            self.stats.checkout_latency.observe(time.perf_counter() - start)
+
+    """
+    Метод берёт подключение из очереди пула, замеряя ожидание и считая таймауты
+        Ожидание замеряется, только если свободных подключений нет и новое открыть нельзя
+        (переполнение исчерпано): открытие нового подключения ожиданием в очереди не считается
+        Параметры: отсутствуют
+        Возвращаемое значение: запись пула с подключением
+    """
+    def _do_get(self):
+        if self.checkedin() > 0 or self._max_overflow == -1 or self.overflow() < self._max_overflow:
+            return super()._do_get()
+
+        start = time.perf_counter()
+        timeout = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timeout = True
+            raise
+        finally:
+            self.stats.add_wait(time.perf_counter() - start, timeout)
+
+
+"""
+Класс TimedQueuePool — QueuePool с замерами для синхронного движка
+"""
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+"""
+Класс TimedAsyncQueuePool — пул с замерами для асинхронного движка
+"""
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+"""
+Функция формирует метрики пулов подключений в формате Prometheus
+    Параметры: pools: dict[str, Pool] — пулы по имени (например {"primary": engine.pool})
+    Возвращаемое значение: str — текст метрик
+"""
+def render_pool_metrics(pools):
+    gauges = [
+        ("hrm_db_pool_size", "Постоянный размер пула", lambda p: p.size()),
+        ("hrm_db_pool_checked_out", "Выданные подключения", lambda p: p.checkedout()),
+        ("hrm_db_pool_checked_in", "Свободные подключения в пуле", lambda p: p.checkedin()),
+        ("hrm_db_pool_overflow", "Подключения сверх pool_size (отрицательное — ещё не созданы)", lambda p: p.overflow()),
+    ]
+
+    lines = []
+    for name, help_text, read in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{pool="{pool_name}"}} {read(pool)}' for pool_name, pool in pools.items()]
+
+    timed = {pool_name: pool for pool_name, pool in pools.items() if isinstance(pool, TimedPoolMixin)}
+
+    lines += ["# HELP hrm_db_pool_wait_seconds_total Время ожидания подключения в очереди пула",
+              "# TYPE hrm_db_pool_wait_seconds_total counter"]
+    lines += [f'hrm_db_pool_wait_seconds_total{{pool="{n}"}} {p.stats.wait_seconds}' for n, p in timed.items()]
+
+    lines += ["# HELP hrm_db_pool_timeouts_total Подключение не выдано за pool_timeout",
+              "# TYPE hrm_db_pool_timeouts_total counter"]
+    lines += [f'hrm_db_pool_timeouts_total{{pool="{n}"}} {p.stats.timeouts}' for n, p in timed.items()]
+
+    lines += ["# HELP hrm_db_pool_checkout_seconds Время выдачи подключения из пула",
+              "# TYPE hrm_db_pool_checkout_seconds histogram"]
+    for n, p in timed.items():
+        lines += p.stats.checkout_latency.render("hrm_db_pool_checkout_seconds", f'pool="{n}"')
+
+    return "\n".join(lines) + "\n"
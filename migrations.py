@@ -0,0 +1,197 @@
+# Версионированные миграции схемы базы данных
+#
+# Схема создаётся и обновляется один раз при развёртывании командой
+#   python manage.py migrate
+# а не при каждом запуске процесса приложения. Номер применённой миграции
+# хранится в таблице schema_version. Каждая миграция проверяет текущее
+# состояние схемы, поэтому её можно безопасно применить и к базе,
+# созданной старой версией проекта через create_all.
+
+from sqlalchemy import Table, Column, Integer, MetaData, inspect, select, text, update
+from sqlalchemy.orm import Session
+from database import Base
+import models
+import db_queries
+import changes
+
+# Служебная таблица с номером версии схемы (не входит в модели приложения)
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", version_metadata,
+    Column("version", Integer, nullable = False)  # Номер последней применённой миграции
+)
+
+
+"""
+Функция добавляет столбец модели в таблицу, если его там ещё нет
+    Параметры:
+        conn: Connection — подключение к БД
+        column: Column — столбец модели SQLAlchemy
+    Возвращаемое значение: bool — True, если столбец был добавлен
+"""
+def add_column_if_missing(conn, column):
+    table = column.table.name
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column.name in existing:
+        return False
+
+    column_type = column.type.compile(dialect = conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column_type} NULL"))
+    return True
+
+
+"""
+Функция создаёт индексы таблицы модели, которых ещё нет в БД
+    Параметры:
+        conn: Connection — подключение к БД
+        table: Table — таблица модели SQLAlchemy
+    Возвращаемое значение: отсутствует
+"""
+def create_missing_indexes(conn, table):
+    existing = {i["name"] for i in inspect(conn).get_indexes(table.name)}
+    columns = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for index in table.indexes:
+        # Индекс по столбцу из более поздней миграции создаётся вместе с этим столбцом
+        if index.name not in existing and all(c.name in columns for c in index.columns):
+            index.create(conn)
+
+
+"""
+Функция создаёт недостающие счётчики версий данных
+    Строки создаются заранее, чтобы первая запись данных только увеличивала счётчик
+    Параметры:
+        conn: Connection — подключение к БД
+        names: tuple[str] — имена наборов данных
+    Возвращаемое значение: отсутствует
+"""
+def seed_data_versions(conn, names):
+    existing = set(conn.execute(select(models.DataVersion.name)).scalars())
+    for name in names:
+        if name not in existing:
+            conn.execute(models.DataVersion.__table__.insert().values(name = name, version = 1))
+
+
+"""
+Миграция 1: базовые таблицы отделов, должностей, сотрудников и истории зарплат
+"""
+def create_base_tables(conn):
+    Base.metadata.create_all(conn, tables = [
+        models.Department.__table__,
+        models.Position.__table__,
+        models.Employee.__table__,
+        models.SalaryHistory.__table__,
+    ])
+
+
+"""
+Миграция 2: проекция текущей зарплаты сотрудника и её заполнение по истории
+"""
+def add_current_salary(conn):
+    added = add_column_if_missing(conn, models.Employee.__table__.c.current_salary)
+    added = add_column_if_missing(conn, models.Employee.__table__.c.current_salary_date) or added
+    if added:
+        db_queries.rebuild_current_salaries(Session(bind = conn))
+
+
+"""
+Миграция 3: индексы под фильтры списка сотрудников и поиск текущей зарплаты
+"""
+def create_indexes(conn):
+    create_missing_indexes(conn, models.Employee.__table__)
+    create_missing_indexes(conn, models.SalaryHistory.__table__)
+
+
+"""
+Миграция 4: счётчики версий данных для кэшей процессов приложения
+"""
+def create_data_versions(conn):
+    Base.metadata.create_all(conn, tables = [models.DataVersion.__table__])
+    seed_data_versions(conn, ("departments", "positions"))
+
+
+"""
+Миграция 5: счётчики версий сотрудников и истории зарплат для кэшей выборок
+"""
+def create_employee_data_versions(conn):
+    seed_data_versions(conn, ("employees", "salary_history"))
+
+
+"""
+Миграция 6: номер изменения и время изменения строк для ленты /changes
+    Существующие строки получают номер изменения 1, поэтому клиент, начавший
+    синхронизацию с курсора 0, получит их все
+"""
+def add_row_versions(conn):
+    for _, model in changes.TABLES:
+        table = model.__table__
+        add_column_if_missing(conn, table.c.row_version)
+        add_column_if_missing(conn, table.c.updated_at)
+        conn.execute(update(table).where(table.c.row_version.is_(None)).values(row_version = 1))
+        create_missing_indexes(conn, table)
+    seed_data_versions(conn, (changes.ROW_VERSION,))
+
+
+"""
+Миграция 7: ответы на запросы с заголовком Idempotency-Key
+"""
+def create_idempotency_keys(conn):
+    Base.metadata.create_all(conn, tables = [models.IdempotencyKey.__table__])
+
+
+# Список миграций по порядку: (номер, описание, функция)
+MIGRATIONS = [
+    (1, "Базовые таблицы", create_base_tables),
+    (2, "Текущая зарплата сотрудника", add_current_salary),
+    (3, "Индексы сотрудников и истории зарплат", create_indexes),
+    (4, "Счётчики версий данных", create_data_versions),
+    (5, "Счётчики версий сотрудников и истории зарплат", create_employee_data_versions),
+    (6, "Номера изменений строк", add_row_versions),
+    (7, "Ключи идемпотентности", create_idempotency_keys),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]  # Версия схемы, которую ожидает код приложения
+
+
+"""
+Функция читает номер применённой к базе миграции
+    Параметры: conn: Connection — подключение к БД
+    Возвращаемое значение: int — номер версии, 0 для пустой базы
+"""
+def current_version(conn):
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(schema_version.c.version)).scalar() or 0
+
+
+"""
+Функция применяет к базе все ещё не применённые миграции
+    Каждая миграция выполняется в своей транзакции вместе с записью нового номера версии
+    Параметры: engine: Engine — подключение к БД
+    Возвращаемое значение: list[tuple[int, str]] — применённые миграции (номер, описание)
+"""
+def upgrade(engine):
+    with engine.begin() as conn:
+        version_metadata.create_all(conn)
+        if conn.execute(select(schema_version.c.version)).first() is None:
+            conn.execute(schema_version.insert().values(version = 0))
+
+    applied = []
+    for number, description, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            if current_version(conn) >= number:
+                continue
+            migrate(conn)
+            conn.execute(schema_version.update().values(version = number))
+        applied.append((number, description))
+
+    return applied
+
+
+"""
+Функция проверяет, что схема базы соответствует версии кода
+    Параметры: engine: Engine — подключение к БД
+    Возвращаемое значение: tuple[int, int] — (версия базы, ожидаемая версия)
+"""
+def check(engine):
+    with engine.connect() as conn:
+        return current_version(conn), LATEST_VERSION
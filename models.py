@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Float
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Date, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -12,10 +12,17 @@ class Department(Base):
 
     id = Column(Integer, primary_key = True)   # id отдела
     name = Column(String(100), unique = True) # Название отдела
+    row_version = Column(BigInteger)  # Номер изменения, в котором строка создана или изменена (лента /changes)
+    updated_at = Column(DateTime)  # Время последнего изменения (UTC)
 
     # Связь один-ко-многим: один отдел — много сотрудников
     employees = relationship("Employee", back_populates="department")
 
+    # Индекс ленты изменений: строки после курсора (номер изменения, id)
+    __table_args__ = (
+        Index("ix_departments_row_version", row_version, id),
+    )
+
 
 """
 Класс Position описывает таблицу должностей
@@ -25,10 +32,17 @@ class Position(Base):
 
     id = Column(Integer, primary_key = True)  # id должности
     name = Column(String(100), unique = True) # Название должности
+    row_version = Column(BigInteger)  # Номер изменения, в котором строка создана или изменена (лента /changes)
+    updated_at = Column(DateTime)  # Время последнего изменения (UTC)
 
      # Связь один-ко-многим с сотрудниками
     employees = relationship("Employee", back_populates="position")
 
+    # Индекс ленты изменений: строки после курсора (номер изменения, id)
+    __table_args__ = (
+        Index("ix_positions_row_version", row_version, id),
+    )
+
 
 """
 Класс Employee описывает таблицу сотрудников
@@ -45,6 +59,13 @@ class Employee(Base):
     department_id = Column(Integer, ForeignKey("departments.id"))   # Связь с отделом
     position_id = Column(Integer, ForeignKey("positions.id"))    # Связь с должностью
 
+    # Текущая зарплата (проекция истории зарплат), обновляется вместе с записями salary_history
+    current_salary = Column(Float)  # Сумма последней записи истории зарплат
+    current_salary_date = Column(Date)  # Дата последней записи истории зарплат
+
+    row_version = Column(BigInteger)  # Номер изменения, в котором строка создана или изменена (лента /changes)
+    updated_at = Column(DateTime)  # Время последнего изменения (UTC)
+
     # Связь многие-к-одному с отделом
     department = relationship("Department", back_populates="employees")
 
@@ -54,6 +75,14 @@ class Employee(Base):
     # Связь один-ко-многим с историей зарплат
     salary_history = relationship("SalaryHistory", back_populates="employee")
 
+    # Индексы под фильтры списка сотрудников: отдел [+ должность] [+ дата найма], должность [+ дата], дата найма
+    __table_args__ = (
+        Index("ix_employees_department_position_hire", department_id, position_id, hire_date),
+        Index("ix_employees_position_hire", position_id, hire_date),
+        Index("ix_employees_hire_date", hire_date),
+        Index("ix_employees_row_version", row_version, id),  # Лента изменений
+    )
+
 
 """
 Класс SalaryHistory описывает таблицу истории зарплат
@@ -65,6 +94,41 @@ class SalaryHistory(Base):
     employee_id = Column(Integer, ForeignKey("employees.id"))  # Связь с сотрудником
     change_date = Column(Date)  # Дата изменения зарплаты
     amount = Column(Float)  # Зарплата
+    row_version = Column(BigInteger)  # Номер изменения, в котором строка создана или изменена (лента /changes)
+    updated_at = Column(DateTime)  # Время последнего изменения (UTC)
 
     # Связь многие-к-одному с сотрудником
     employee = relationship("Employee", back_populates = "salary_history")
+
+    # История сотрудника от последней записи к первой — порядок, в котором ищется текущая зарплата
+    __table_args__ = (
+        Index("ix_salary_history_employee_date", employee_id, change_date.desc(), amount.desc()),
+        Index("ix_salary_history_row_version", row_version, id),  # Лента изменений
+    )
+
+
+"""
+Класс DataVersion описывает таблицу счётчиков изменений данных
+    Счётчик увеличивается в той же транзакции, что и изменение данных, по нему
+    процессы приложения узнают, что закэшированные данные устарели
+"""
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    name = Column(String(50), primary_key = True)  # Имя набора данных, например "departments"
+    version = Column(Integer, nullable = False, default = 0)  # Номер версии набора данных
+
+
+"""
+Класс IdempotencyKey описывает таблицу ответов на запросы с заголовком Idempotency-Key
+    Ответ сохраняется в той же транзакции, что и запись, поэтому повтор запроса
+    с тем же ключом получает сохранённый ответ и не создаёт дубликат
+"""
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    endpoint = Column(String(100), primary_key = True)  # Метод и маршрут, например "POST /employees"
+    key = Column(String(255), primary_key = True)  # Значение заголовка Idempotency-Key
+    request_hash = Column(String(64), nullable = False)  # Хэш тела и параметров запроса
+    response = Column(Text, nullable = False)  # Ответ в JSON
+    created_at = Column(DateTime, nullable = False)  # Время запроса (UTC)
@@ -0,0 +1,344 @@
+# Помесячный фонд оплаты труда по отделам и должностям: факт и прогноз с индексацией
+#
+# История зарплат один раз читается в память процесса в виде столбцов NumPy: ключ
+# (id сотрудника, день изменения) и сумма в копейках, по возрастанию ключа. Несколько
+# записей одного дня сворачиваются в одну с максимальной суммой — то же правило, что
+# у текущей зарплаты. Новые записи дочитываются по номеру изменения row_version
+# (см. changes.py) и вставляются в отсортированные массивы без повторной загрузки.
+#
+# Зарплата сотрудника — ступенчатая функция времени, фонд группы — сумма ступенек.
+# Каждая запись превращается в скачок (разница с предыдущей суммой сотрудника), и
+# накопленная сумма фонда группы за дни до x равна x * Σ скачков - Σ (скачок * день)
+# по скачкам раньше x. Обе суммы — накопленные суммы по массиву, отсортированному по
+# (группа, день), а нужная позиция для всех групп и границ месяцев находится одним
+# вызовом searchsorted. Стоимость месяца — разность накопленных сумм на его границах,
+# делённая на число дней месяца (зарплата — месячная). Вычисления в копейках (int64) точные.
+
+import os
+import threading
+import time
+from datetime import date
+import numpy as np
+from sqlalchemy import select
+from models import Employee, SalaryHistory
+import db_queries
+
+PROJECTION_CHECK_INTERVAL = float(os.getenv("PROJECTION_CHECK_INTERVAL", "1"))  # Как часто (сек) сверять версии данных с БД
+MAX_PROJECTION_MONTHS = 1200  # Наибольшая длина окна в месяцах
+LOAD_BATCH = 50000  # Сколько строк читать из БД за раз при загрузке
+DAY_OFFSET = 2 ** 31  # Сдвиг дня в составном ключе, чтобы ключ был неотрицательным
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()  # День 0
+
+GRANULARITY_MONTHS = {"month": 1, "quarter": 3, "year": 12}  # Длина периода в месяцах
+GROUP_COLUMNS = {"department": Employee.department_id, "position": Employee.position_id}
+
+
+"""
+Функция строит составной ключ (группа или сотрудник, день) для сортировки и поиска
+    Параметры:
+        high: np.ndarray — id группы или сотрудника
+        day: np.ndarray — день (число дней от 1970-01-01)
+    Возвращаемое значение: np.ndarray — ключи int64
+"""
+def composite_key(high, day):
+    return (np.asarray(high, dtype = np.int64) << 32) | (np.asarray(day, dtype = np.int64) + DAY_OFFSET)
+
+
+"""
+Функция переводит даты в номера дней от 1970-01-01
+    Параметры: dates: list[date] — даты
+    Возвращаемое значение: np.ndarray — номера дней int64
+"""
+def day_numbers(dates):
+    return np.fromiter(map(date.toordinal, dates), dtype = np.int64, count = len(dates)) - EPOCH_ORDINAL
+
+
+"""
+Функция читает результат запроса в столбцы NumPy частями по LOAD_BATCH строк
+    Параметры:
+        db: Session — объект сессии SQLAlchemy
+        query: Select — запрос
+        count: int — количество столбцов
+    Возвращаемое значение: list[list] — значения каждого столбца
+"""
+def load_columns(db, query, count):
+    columns = [[] for _ in range(count)]
+    result = db.connection().execute(query.execution_options(stream_results = True))  # Core: без обработки строк ORM
+    for rows in result.partitions(LOAD_BATCH):
+        for column, values in zip(columns, zip(*rows)):
+            column.extend(values)
+    return columns
+
+
+"""
+Функция сворачивает записи одного сотрудника за один день в одну с максимальной суммой
+    Параметры:
+        keys: np.ndarray — ключи (сотрудник, день)
+        amounts: np.ndarray — суммы в копейках
+    Возвращаемое значение: tuple[np.ndarray, np.ndarray] — уникальные ключи по возрастанию и суммы
+"""
+def collapse(keys, amounts):
+    order = np.lexsort((amounts, keys))  # Внутри дня — по сумме, последняя запись дня — максимальная
+    keys, amounts = keys[order], amounts[order]
+    last = np.append(keys[1:] != keys[:-1], True)
+    return keys[last], amounts[last]
+
+
+"""
+Функция отбирает прочитанные строки, которых ещё нет в массивах
+    Строки читались после номера изменения since; если за время чтения массивы дополнил
+    другой поток до номера current, строки с номером не больше current уже вставлены
+    Параметры:
+        row_versions: np.ndarray — номера изменений строк (0 — строка без номера)
+        since: int | None — номер, после которого читались строки, None — читались все
+        current: int | None — наибольший номер изменения в массивах сейчас
+    Возвращаемое значение: np.ndarray — маска строк для вставки
+"""
+def newer_rows(row_versions, since, current):
+    if current is None or current == since:
+        return np.ones(len(row_versions), dtype = bool)
+    return row_versions > current
+
+
+"""
+Класс SalaryArrays — история зарплат и отделы/должности сотрудников в столбцах NumPy
+"""
+class SalaryArrays:
+    def __init__(self):
+        self.versions = None  # Версии данных сотрудников и истории зарплат, по которым построены массивы
+        self.checked_at = 0.0  # Время последней сверки версий с БД
+        self.salary_row_version = None  # Наибольший загруженный номер изменения истории зарплат
+        self.employee_row_version = None  # Наибольший загруженный номер изменения сотрудников
+        self.keys = np.empty(0, dtype = np.int64)  # Ключи (сотрудник, день) по возрастанию
+        self.amounts = np.empty(0, dtype = np.int64)  # Действующая с этого дня зарплата, копейки
+        self.employee_ids = np.empty(0, dtype = np.int64)  # id сотрудников по возрастанию
+        self.groups = {name: np.empty(0, dtype = np.int64) for name in GROUP_COLUMNS}  # Отдел/должность, -1 — нет
+        self.timelines = {}  # Группировка -> скачки фонда по группам (строятся по запросу)
+        self.lock = threading.Lock()
+
+    """
+    Метод дочитывает новые записи истории зарплат и сотрудников, если версии данных изменились
+        Записи читаются без блокировки, под ней только вставляются в массивы: в HRM_async чтение
+        идёт через run_sync, и пока оно ждёт БД, цикл событий выполняет другие корутины в том же
+        потоке — ожидание threading.Lock остановило бы его
+        Параметры: db: Session — объект сессии SQLAlchemy
+        Возвращаемое значение: SalaryArrays — сами массивы
+    """
+    def refresh(self, db):
+        now = time.monotonic()
+        if self.versions is not None and now - self.checked_at < PROJECTION_CHECK_INTERVAL:
+            return self
+
+        versions = db_queries.get_versions(db, db_queries.PAYROLL_DATA)
+        loaded = None
+        if versions != self.versions:
+            # Сначала история, затем сотрудники: сотрудник каждой прочитанной записи уже виден
+            salary_since, employee_since = self.salary_row_version, self.employee_row_version
+            loaded = (salary_since, self.load_salaries(db, salary_since),
+                      employee_since, self.load_employees(db, employee_since))
+
+        with self.lock:
+            if loaded is not None:
+                salary_since, salaries, employee_since, employees = loaded
+                self.add_salaries(salary_since, *salaries)
+                self.add_employees(employee_since, *employees)
+                self.timelines = {}
+                self.versions = versions
+            self.checked_at = now
+        return self
+
+    """
+    Метод читает записи истории зарплат с номером изменения больше since
+        Параметры:
+            db: Session — объект сессии SQLAlchemy
+            since: int | None — наибольший загруженный номер изменения, None — читать всё
+        Возвращаемое значение: list[list] — id сотрудников, даты, суммы и номера изменений
+    """
+    def load_salaries(self, db, since):
+        query = select(SalaryHistory.employee_id, SalaryHistory.change_date, SalaryHistory.amount,
+                       SalaryHistory.row_version)
+        if since is not None:
+            query = query.where(SalaryHistory.row_version > since)
+        return load_columns(db, query, 4)
+
+    """
+    Метод читает сотрудников с номером изменения больше since (новых и изменённых)
+        Параметры:
+            db: Session — объект сессии SQLAlchemy
+            since: int | None — наибольший загруженный номер изменения, None — читать всех
+        Возвращаемое значение: list[list] — id сотрудников, столбцы GROUP_COLUMNS и номера изменений
+    """
+    def load_employees(self, db, since):
+        query = select(Employee.id, *GROUP_COLUMNS.values(), Employee.row_version)
+        if since is not None:
+            query = query.where(Employee.row_version > since)
+        return load_columns(db, query, len(GROUP_COLUMNS) + 2)
+
+    """
+    Метод вставляет прочитанные записи истории зарплат в массивы (под блокировкой)
+        Если за время чтения массивы дополнил другой поток, вставляются только записи новее его
+        Параметры:
+            since: int | None — номер изменения, после которого читались записи
+            employee_ids, dates, amounts, row_versions: list — столбцы из load_salaries
+        Возвращаемое значение: отсутствует
+    """
+    def add_salaries(self, since, employee_ids, dates, amounts, row_versions):
+        row_versions = np.array([0 if v is None else v for v in row_versions], dtype = np.int64)
+        keep = newer_rows(row_versions, since, self.salary_row_version)
+        if not keep.any():
+            return
+
+        employee_ids = np.asarray(employee_ids, dtype = np.int64)[keep]
+        days = day_numbers([d for d, k in zip(dates, keep) if k])
+        keys, amounts = collapse(composite_key(employee_ids, days),
+                                 np.rint(np.array(amounts, dtype = np.float64)[keep] * 100).astype(np.int64))
+        positions = np.searchsorted(self.keys, keys)
+        existing = positions < len(self.keys)
+        existing[existing] = self.keys[positions[existing]] == keys[existing]
+
+        merged = self.amounts.copy()  # Массивы заменяются целиком: идущие расчёты читают прежние
+        merged[positions[existing]] = np.maximum(merged[positions[existing]], amounts[existing])
+        self.keys = np.insert(self.keys, positions[~existing], keys[~existing])
+        self.amounts = np.insert(merged, positions[~existing], amounts[~existing])
+        self.salary_row_version = max(int(row_versions[keep].max()), self.salary_row_version or 0)
+
+    """
+    Метод вставляет прочитанных сотрудников в массивы (под блокировкой)
+        Если за время чтения массивы дополнил другой поток, вставляются только строки новее его
+        Параметры:
+            since: int | None — номер изменения, после которого читались сотрудники
+            ids: list[int] — id сотрудников
+            columns: list — столбцы GROUP_COLUMNS и номера изменений из load_employees
+        Возвращаемое значение: отсутствует
+    """
+    def add_employees(self, since, ids, *columns):
+        row_versions = np.array([0 if v is None else v for v in columns[-1]], dtype = np.int64)
+        keep = newer_rows(row_versions, since, self.employee_row_version)
+        if not keep.any():
+            return
+
+        ids = np.asarray(ids, dtype = np.int64)[keep]
+        order = np.argsort(ids)
+        ids = ids[order]
+        values = {name: np.array([-1 if v is None else v for v in column], dtype = np.int64)[keep][order]
+                  for name, column in zip(GROUP_COLUMNS, columns[:-1])}
+
+        positions = np.searchsorted(self.employee_ids, ids)
+        existing = positions < len(self.employee_ids)
+        existing[existing] = self.employee_ids[positions[existing]] == ids[existing]
+        for name, column in values.items():
+            groups = self.groups[name].copy()
+            groups[positions[existing]] = column[existing]  # Сотрудник перешёл в другой отдел или на другую должность
+            self.groups[name] = np.insert(groups, positions[~existing], column[~existing])
+        self.employee_ids = np.insert(self.employee_ids, positions[~existing], ids[~existing])
+        self.employee_row_version = max(int(row_versions[keep].max()), self.employee_row_version or 0)
+
+    """
+    Метод возвращает скачки фонда оплаты по группам для расчёта по границам периодов
+        Скачок — разница между суммой записи и предыдущей суммой того же сотрудника
+        (для первой записи — вся сумма). Скачки отсортированы по (группа, день)
+        Параметры: group_by: str — "department" или "position"
+        Возвращаемое значение: tuple — ключи (группа, день), накопленные суммы скачков
+            и скачков, умноженных на день, id групп и начала их отрезков
+    """
+    def timeline(self, group_by):
+        with self.lock:
+            cached = self.timelines.get(group_by)
+            if cached is not None:
+                return cached
+            keys, amounts = self.keys, self.amounts
+            employee_ids, groups = self.employee_ids, self.groups[group_by]
+
+        employees = keys >> 32
+        days = (keys & 0xFFFFFFFF) - DAY_OFFSET
+        jumps = amounts.copy()
+        same = np.append(False, employees[1:] == employees[:-1])
+        jumps[same] -= amounts[:-1][same[1:]]
+
+        group = np.full(len(employees), -1, dtype = np.int64)
+        if len(employee_ids):
+            positions = np.minimum(np.searchsorted(employee_ids, employees), len(employee_ids) - 1)
+            found = employee_ids[positions] == employees
+            group[found] = groups[positions[found]]
+        keep = group >= 0  # Сотрудники без отдела или должности в группы не входят
+
+        group, days, jumps = group[keep], days[keep], jumps[keep]
+        order = np.lexsort((days, group))
+        group, days, jumps = group[order], days[order], jumps[order]
+        group_keys = composite_key(group, days)
+        jump_sums = np.concatenate(([0], np.cumsum(jumps)))
+        weighted_sums = np.concatenate(([0], np.cumsum(jumps * days)))
+        group_ids, starts = np.unique(group, return_index = True)
+
+        result = (group_keys, jump_sums, weighted_sums, group_ids, starts)
+        with self.lock:
+            if self.keys is keys:  # Массивы не обновились, пока строились скачки
+                self.timelines[group_by] = result
+        return result
+
+
+"""
+Функция возвращает начала месяцев от start на count месяцев вперёд
+    Параметры:
+        start: date — первое число месяца
+        count: int — количество месяцев
+    Возвращаемое значение: list[date] — count первых чисел месяцев
+"""
+def month_starts(start, count):
+    index = start.year * 12 + start.month - 1
+    return [date((index + i) // 12, (index + i) % 12 + 1, 1) for i in range(count)]
+
+
+"""
+Функция считает фонд оплаты труда по группам за каждый период окна
+    Зарплата каждого дня месяца — действующая на этот день; стоимость месяца — сумма
+    по дням, делённая на число дней месяца. Для месяцев после today к зарплатам применяется
+    плановая индексация: indexation процентов с 1 января каждого следующего года
+    Параметры:
+        arrays: SalaryArrays — загруженные массивы
+        date_from: date — начало окна (период, в который попадает дата, берётся целиком)
+        date_to: date — конец окна (включительно, аналогично)
+        granularity: str — "month", "quarter" или "year"
+        group_by: str — "department" или "position"
+        indexation: float — плановая индексация в процентах в год
+        today: date — дата, после которой расчёт считается прогнозом
+    Возвращаемое значение: list[dict] — период, группа и фонд оплаты, по периодам и группам
+"""
+def project(arrays, date_from, date_to, granularity, group_by, indexation = 0.0, today = None):
+    if date_from > date_to:
+        raise ValueError("Начало окна позже конца")
+    step = GRANULARITY_MONTHS[granularity]
+    first = (date_from.year * 12 + date_from.month - 1) // step * step  # Номер месяца начала первого периода
+    last = (date_to.year * 12 + date_to.month - 1) // step * step + step  # Номер месяца после последнего периода
+    if last - first > MAX_PROJECTION_MONTHS:
+        raise ValueError(f"Окно длиннее {MAX_PROJECTION_MONTHS} месяцев")
+
+    months = month_starts(date(first // 12, first % 12 + 1, 1), last - first + 1)  # Границы месяцев
+    bounds = day_numbers(months)
+    group_keys, jump_sums, weighted_sums, group_ids, starts = arrays.timeline(group_by)
+    if len(group_ids) == 0:
+        return []
+
+    # Позиции границ для всех групп сразу: скачки группы раньше каждой границы
+    positions = np.searchsorted(group_keys, composite_key(group_ids[:, None], bounds[None, :]))
+    jumps = jump_sums[positions] - jump_sums[starts][:, None]
+    weighted = weighted_sums[positions] - weighted_sums[starts][:, None]
+    cumulative = bounds[None, :] * jumps - weighted  # Сумма зарплат по дням до границы, копейки
+    costs = np.diff(cumulative, axis = 1) / np.diff(bounds)[None, :] / 100  # Фонд каждого месяца
+
+    today = today or date.today()
+    years = np.array([m.year - today.year if m > today else 0 for m in months[:-1]])
+    costs = costs * (1 + indexation / 100) ** years[None, :]  # Плановая индексация 1 января
+
+    periods = np.add.reduceat(costs, np.arange(0, len(months) - 1, step), axis = 1)
+    period_starts = months[:-1:step]
+    active = np.any(periods != 0, axis = 1)  # Группы без зарплат в окне не выводятся
+
+    return [
+        {"period": start, "group": int(group), "cost": round(float(cost), 2)}
+        for p, start in enumerate(period_starts)
+        for group, cost in zip(group_ids[active], periods[active, p])
+    ]
+
+
+salaries = SalaryArrays()  # Массивы истории зарплат этого процесса
@@ -1,6 +1,9 @@
 @echo off
 title HRM Project
 
+:: Создаём или обновляем схему базы данных
+python manage.py migrate
+
 :: Запускаем FastAPI
 start "" uvicorn HRM:app --reload
 
@@ -1,7 +1,8 @@
 
-from pydantic import BaseModel
-from datetime import date
-from typing import Optional, List
+from pydantic import BaseModel, create_model
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Optional, List, Literal, get_type_hints
 
 
 """
@@ -57,6 +58,24 @@ class SalaryHistory(SalaryHistoryBase):
         orm_mode = True # Включаем режим ORM для работы с объектами SQLAlchemy
 
 
+"""
+Класс SalaryHistoryQuery — параметры выборки истории зарплат нескольких сотрудников (тело POST /salary)
+"""
+class SalaryHistoryQuery(BaseModel):
+    employee_ids: List[int]  # id сотрудников
+    date_from: Optional[date] = None  # Дата изменения (начало)
+    date_to: Optional[date] = None  # Дата изменения (конец)
+    last: Optional[int] = None  # Сколько последних записей каждого сотрудника вернуть
+
+
+"""
+Класс EmployeeSalaryHistory — история зарплат одного сотрудника в пакетной выборке
+"""
+class EmployeeSalaryHistory(BaseModel):
+    employee_id: int  # id сотрудника
+    history: List[SalaryHistory]  # Записи по возрастанию даты изменения
+
+
 """
 Класс EmployeeBase для описания сотрудника
 """
@@ -105,3 +124,180 @@ class EmployeeFull(BaseModel):
 
     class Config:
         orm_mode = True # Включаем режим ORM для работы с объектами SQLAlchemy
+
+
+"""
+Класс BulkImportError — ошибка в строке массовой загрузки
+"""
+class BulkImportError(BaseModel):
+    row: int  # Номер строки в теле запроса
+    error: str  # Описание ошибки
+
+
+"""
+Класс BulkImportResult — итог массовой загрузки сотрудников
+"""
+class BulkImportResult(BaseModel):
+    inserted: int  # Сколько сотрудников добавлено
+    failed: int  # Сколько строк отклонено
+    errors: List[BulkImportError]  # Ошибки по строкам (не больше первой тысячи)
+
+
+"""
+Класс SalaryIndexation — параметры массовой индексации зарплат
+"""
+class SalaryIndexation(BaseModel):
+    department_id: Optional[int] = None  # Фильтр по отделу
+    position_id: Optional[int] = None  # Фильтр по должности
+    hire_date_from: Optional[date] = None  # Дата найма (начало)
+    hire_date_to: Optional[date] = None  # Дата найма (конец)
+    percent: Optional[float] = None  # Процент индексации
+    delta: Optional[float] = None  # Фиксированная прибавка (вместо процента)
+    effective_date: date  # Дата, с которой действует новая зарплата
+    dry_run: bool = False  # Только посчитать стоимость, ничего не записывая
+
+
+"""
+Класс SalaryIndexationResult — итог массовой индексации зарплат
+"""
+class SalaryIndexationResult(BaseModel):
+    employees: int  # Сколько сотрудников затронуто
+    current_total: float  # Сумма текущих зарплат затронутых сотрудников
+    new_total: float  # Сумма зарплат после индексации
+    difference: float  # Изменение фонда оплаты труда в месяц
+    dry_run: bool  # Был ли это пробный расчёт
+
+
+"""
+Класс PayrollEntry — зарплата сотрудника, действовавшая на указанную дату
+"""
+class PayrollEntry(BaseModel):
+    employee_id: int  # id сотрудника
+    last_name: str  # Фамилия
+    first_name: str  # Имя
+    middle_name: Optional[str] = None  # Отчество
+    department_id: Optional[int] = None  # id отдела
+    position_id: Optional[int] = None  # id должности
+    amount: float  # Действующая зарплата
+    change_date: date  # Дата записи истории, с которой действует зарплата
+
+
+"""
+Класс PayrollProjection — фонд оплаты труда группы за период (факт или прогноз)
+"""
+class PayrollProjection(BaseModel):
+    period: date  # Первый день периода
+    group: int  # id отдела или должности
+    name: Optional[str] = None  # Название отдела или должности
+    cost: float  # Фонд оплаты труда за период
+
+"""
+Класс SalaryStats — сводная статистика зарплат группы сотрудников
+"""
+class SalaryStats(BaseModel):
+    group: int  # Ключ группы: id отдела, id должности или год найма
+    name: Optional[str] = None  # Название отдела или должности
+    headcount: int  # Количество сотрудников
+    salaried: int  # Сколько из них с известной зарплатой
+    total: float  # Фонд оплаты труда
+    average: Optional[float] = None  # Средняя зарплата
+    min: Optional[float] = None  # Минимальная зарплата
+    max: Optional[float] = None  # Максимальная зарплата
+    p10: Optional[float] = None  # 10-й процентиль
+    p25: Optional[float] = None  # 25-й процентиль
+    p50: Optional[float] = None  # Медиана
+    p75: Optional[float] = None  # 75-й процентиль
+    p90: Optional[float] = None  # 90-й процентиль
+
+
+"""
+Класс RowChange — номер и время изменения строки в ленте /changes
+"""
+class RowChange(BaseModel):
+    row_version: int  # Номер изменения, в котором строка создана или изменена
+    updated_at: Optional[datetime] = None  # Время изменения (UTC), нет у строк, созданных до ленты изменений
+
+
+"""
+Класс DepartmentChange — изменённый отдел
+"""
+class DepartmentChange(Department, RowChange):
+    pass
+
+
+"""
+Класс PositionChange — изменённая должность
+"""
+class PositionChange(Position, RowChange):
+    pass
+
+
+"""
+Класс EmployeeChange — изменённый сотрудник (столбцы таблицы сотрудников)
+"""
+class EmployeeChange(EmployeeBase, RowChange):
+    id: int  # id сотрудника
+    department_id: Optional[int] = None  # id отдела
+    position_id: Optional[int] = None  # id должности
+    current_salary: Optional[float] = None  # Текущая зарплата
+    current_salary_date: Optional[date] = None  # Дата текущей зарплаты
+
+
+"""
+Класс SalaryHistoryChange — изменённая запись истории зарплат
+"""
+class SalaryHistoryChange(SalaryHistory, RowChange):
+    pass
+
+
+"""
+Класс Changes — страница ленты изменений
+"""
+class Changes(BaseModel):
+    cursor: str  # Курсор для следующего запроса (параметр since)
+    has_more: bool  # Есть ли ещё изменения после курсора (запросить сразу, не дожидаясь опроса)
+    departments: List[DepartmentChange]  # Созданные и изменённые отделы
+    positions: List[PositionChange]  # Созданные и изменённые должности
+    employees: List[EmployeeChange]  # Созданные и изменённые сотрудники
+    salary_history: List[SalaryHistoryChange]  # Созданные и изменённые записи истории зарплат
+
+
+"""
+Функция строит схему ответа, урезанную до выбранных полей (параметры fields и include)
+    Схемы кэшируются: для каждого набора полей создаются один раз
+    Параметры:
+        base: type[BaseModel] — полная схема, например Employee
+        names: tuple[str] — имена полей ответа
+    Возвращаемое значение: type[BaseModel] — схема с полями names и их типами из base
+"""
+@lru_cache(maxsize = None)
+def projection_model(base, names):
+    hints = get_type_hints(base)
+    return create_model(f"{base.__name__}Projection", **{name: (hints[name], ...) for name in names})
+
+
+"""
+Класс JobCreate — запрос на построение отчёта в фоновом задании
+"""
+class JobCreate(BaseModel):
+    report: Literal["employees", "payroll"]  # Отчёт: полный список сотрудников или ведомость зарплат
+    format: Literal["json", "csv", "xlsx"] = "json"  # Формат результата (ведомость — только json)
+    department_id: Optional[int] = None  # Фильтр по отделу
+    position_id: Optional[int] = None  # Фильтр по должности
+    hire_date_from: Optional[date] = None  # Дата найма (начало)
+    hire_date_to: Optional[date] = None  # Дата найма (конец)
+    as_of: Optional[date] = None  # Дата ведомости, по умолчанию — сегодня
+
+
+"""
+Класс JobStatus — состояние фонового задания
+"""
+class JobStatus(BaseModel):
+    id: str  # Номер задания
+    report: Optional[str] = None  # Отчёт (неизвестен для задания, найденного только по файлу результата)
+    format: str  # Формат результата
+    status: Literal["queued", "running", "done", "failed"]  # Состояние задания
+    error: Optional[str] = None  # Ошибка задания со статусом failed
+    created_at: datetime  # Время постановки в очередь (UTC)
+    finished_at: Optional[datetime] = None  # Время завершения (UTC)
+    result_url: Optional[str] = None  # Адрес файла результата, когда задание выполнено
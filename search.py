@@ -0,0 +1,186 @@
+# Поиск сотрудников по ФИО
+#
+# Каждый процесс держит в памяти индекс по фамилиям, именам и отчествам:
+# отсортированный список слов для поиска по префиксу и индекс триграмм для
+# нечёткого поиска (опечатки). Слова приводятся к нижнему регистру, «ё» заменяется
+# на «е». Имена повторяются у многих сотрудников, поэтому индексируются различные
+# слова, а для каждого слова хранится список сотрудников.
+#
+# Сотрудники только добавляются (изменения и удаления в API нет), поэтому при росте
+# версии данных "employees" в индекс дочитываются сотрудники с id больше уже
+# проиндексированных.
+
+import bisect
+import heapq
+import os
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import select
+from models import Employee
+import db_queries
+
+SEARCH_CHECK_INTERVAL = float(os.getenv("SEARCH_CHECK_INTERVAL", "1"))  # Как часто (сек) сверять версию сотрудников с БД
+SEARCH_SIMILARITY = float(os.getenv("SEARCH_SIMILARITY", "0.3"))  # Минимальное сходство по триграммам для нечёткого совпадения
+
+REFRESH_OVERLAP = 1000  # Сколько последних id перечитывать: транзакции с меньшим id могут зафиксироваться позже
+EXACT_SCORE = 3.0  # Оценка точного совпадения слова
+PREFIX_SCORE = 2.0  # Оценка совпадения по префиксу (плюс доля совпавшей длины)
+
+
+"""
+Функция приводит текст к виду для поиска: нижний регистр, «ё» → «е»
+    Параметры: text: str | None — исходный текст
+    Возвращаемое значение: str — нормализованный текст
+"""
+def normalize(text):
+    return (text or "").casefold().replace("ё", "е").strip()
+
+
+"""
+Функция разбивает текст на нормализованные слова
+    Параметры: text: str | None — исходный текст
+    Возвращаемое значение: list[str] — слова (дефис внутри фамилии разделяет слова)
+"""
+def words(text):
+    return normalize(text).replace("-", " ").split()
+
+
+"""
+Функция возвращает множество триграмм слова (с границами слова, как в pg_trgm)
+    Параметры: word: str — нормализованное слово
+    Возвращаемое значение: set[str] — триграммы
+"""
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+"""
+Класс NameIndex — индекс ФИО сотрудников в памяти процесса
+"""
+class NameIndex:
+    def __init__(self):
+        self.version = None  # Версия данных сотрудников, по которой построен индекс
+        self.checked_at = 0.0  # Время последней сверки версии с БД
+        self.max_id = 0  # Наибольший проиндексированный id сотрудника
+        self.postings = defaultdict(list)  # Слово -> id сотрудников
+        self.sorted_words = []  # Различные слова по алфавиту (поиск по префиксу)
+        self.word_trigrams = defaultdict(set)  # Триграмма -> слова, в которых она есть
+        self.filters = {}  # id сотрудника -> (id отдела, id должности)
+        self.lock = threading.Lock()
+
+    """
+    Метод добавляет сотрудников в индекс
+        Параметры: rows: list[Row] — строки с id, ФИО, отделом и должностью
+        Возвращаемое значение: отсутствует
+    """
+    def add(self, rows):
+        for row in rows:
+            if row.id in self.filters:
+                continue  # Уже в индексе (перечитан из-за перекрытия REFRESH_OVERLAP)
+            self.filters[row.id] = (row.department_id, row.position_id)
+            for word in {w for name in (row.last_name, row.first_name, row.middle_name) for w in words(name)}:
+                if word not in self.postings:
+                    bisect.insort(self.sorted_words, word)
+                    for trigram in trigrams(word):
+                        self.word_trigrams[trigram].add(word)
+                self.postings[word].append(row.id)
+            self.max_id = max(self.max_id, row.id)
+
+    """
+    Метод дочитывает в индекс новых сотрудников, если версия данных изменилась
+        Новые строки читаются без блокировки, под ней только добавляются в индекс: в HRM_async
+        чтение идёт через run_sync, и пока оно ждёт БД, цикл событий выполняет другие корутины
+        в том же потоке — ожидание threading.Lock остановило бы его
+        Параметры: db: Session — объект сессии SQLAlchemy
+        Возвращаемое значение: NameIndex — сам индекс
+    """
+    def refresh(self, db):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < SEARCH_CHECK_INTERVAL:
+            return self
+
+        version = db_queries.get_version(db, "employees")
+        rows = None
+        if version != self.version:
+            rows = db.execute(
+                select(Employee.id, Employee.last_name, Employee.first_name, Employee.middle_name,
+                       Employee.department_id, Employee.position_id)
+                .where(Employee.id > self.max_id - REFRESH_OVERLAP)
+                .order_by(Employee.id)
+            ).all()
+
+        with self.lock:
+            if rows is not None:
+                self.add(rows)  # Уже проиндексированные сотрудники пропускаются
+                if self.version is None or version > self.version:
+                    self.version = version
+            self.checked_at = now
+        return self
+
+    """
+    Метод находит слова индекса, похожие на слово запроса, и оценивает совпадение
+        Параметры: word: str — нормализованное слово запроса
+        Возвращаемое значение: dict[str, float] — слово индекса -> оценка
+    """
+    def match_word(self, word):
+        matches = {}
+
+        # Префикс: слова индекса от word до word + максимальный символ
+        start = bisect.bisect_left(self.sorted_words, word)
+        for candidate in self.sorted_words[start:bisect.bisect_left(self.sorted_words, word + "\uffff")]:
+            matches[candidate] = EXACT_SCORE if candidate == word else PREFIX_SCORE + len(word) / len(candidate)
+
+        # Нечёткое совпадение: доля общих триграмм (коэффициент Жаккара)
+        query = trigrams(word)
+        shared = defaultdict(int)
+        for trigram in query:
+            for candidate in self.word_trigrams.get(trigram, ()):
+                shared[candidate] += 1
+        for candidate, count in shared.items():
+            similarity = count / (len(query) + len(trigrams(candidate)) - count)
+            if similarity >= SEARCH_SIMILARITY and candidate not in matches:
+                matches[candidate] = similarity
+
+        return matches
+
+    """
+    Метод ищет сотрудников по ФИО
+        Каждое слово запроса должно совпасть с фамилией, именем или отчеством сотрудника
+        (точно, по префиксу или нечётко). Оценка сотрудника — сумма лучших оценок слов запроса
+        Параметры:
+            q: str — строка поиска
+            limit: int — максимальное количество результатов
+            dept: int | None — id отдела для фильтрации
+            pos: int | None — id должности для фильтрации
+        Возвращаемое значение: list[int] — id сотрудников по убыванию оценки
+    """
+    def search(self, q, limit, dept = None, pos = None):
+        query_words = words(q)
+        if not query_words:
+            return []
+
+        with self.lock:
+            scores = None
+            for word in query_words:
+                word_scores = {}
+                for candidate, score in self.match_word(word).items():
+                    for emp_id in self.postings[candidate]:
+                        if word_scores.get(emp_id, 0) < score:
+                            word_scores[emp_id] = score
+                if scores is None:
+                    scores = word_scores
+                else:  # Сотрудник должен совпасть по всем словам запроса
+                    scores = {emp_id: s + word_scores[emp_id] for emp_id, s in scores.items() if emp_id in word_scores}
+
+            if dept or pos:
+                scores = {
+                    emp_id: s for emp_id, s in scores.items()
+                    if (not dept or self.filters[emp_id][0] == dept) and (not pos or self.filters[emp_id][1] == pos)
+                }
+
+        return heapq.nsmallest(limit, scores, key = lambda emp_id: (-scores[emp_id], emp_id))
+
+
+names = NameIndex()  # Индекс ФИО сотрудников этого процесса
@@ -0,0 +1,186 @@
+# Запуск и прогрев процесса API
+#
+# При перезапуске процессов uvicorn первые запросы к каждому процессу платили за то,
+# что откладывается до первого обращения: настройку связей моделей SQLAlchemy, схему
+# OpenAPI, открытие подключений пула и загрузку кэшей из БД. Поэтому после каждого
+# перезапуска задержка ответов подскакивала.
+#
+# Приложения HRM и HRM_async создаются функцией create_app. Её обработчик lifespan
+# запускает прогрев в фоне, после старта сервера. Этапы прогрева:
+#   - настройка связей моделей и схемы OpenAPI;
+#   - открытие WARMUP_CONNECTIONS подключений каждого пула;
+#   - загрузка кэшей из WARMUP_CACHES.
+# Пока прогрев не завершён, GET /ready отвечает 503, и балансировщик не направляет
+# запросы в процесс. Если этап прогрева не удался (например, БД ещё недоступна), он
+# повторяется через WARMUP_RETRY_INTERVAL секунд. Время этапов пишется в журнал
+# hrm.startup. Если прогрев дольше STARTUP_BUDGET секунд, строка журнала пишется с
+# уровнем WARNING. При остановке процесса подключения пулов закрываются.
+
+import asyncio
+import inspect
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import configure_mappers
+from database import POOL_OPTIONS
+import cache
+import search
+import projection
+
+WARMUP = os.getenv("WARMUP", "1") == "1"  # Прогревать ли процесс при запуске
+WARMUP_CONNECTIONS = int(os.getenv("WARMUP_CONNECTIONS", str(POOL_OPTIONS["pool_size"])))  # Сколько подключений каждого пула открыть заранее
+WARMUP_CACHES = [name.strip() for name in os.getenv("WARMUP_CACHES", "departments,positions").split(",") if name.strip()]  # Какие кэши загрузить
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))  # Через сколько секунд повторить неудавшийся этап
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET", "5"))  # Сколько секунд может длиться прогрев, дольше — WARNING в журнале
+
+logger = logging.getLogger("hrm.startup")
+if not logger.handlers:  # Строки журнала без префиксов, если журнал не настроен снаружи
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Кэши, которые можно загрузить при прогреве: функции загрузки через сессию SQLAlchemy
+CACHES = {
+    "departments": cache.departments.get,  # Справочник отделов
+    "positions": cache.positions.get,  # Справочник должностей
+    "search": search.names.refresh,  # Индекс ФИО для /employees/search
+    "projection": projection.salaries.refresh  # Массивы истории зарплат для /payroll/projection
+}
+
+unknown = set(WARMUP_CACHES) - set(CACHES)
+if unknown:
+    raise ValueError(f"Неизвестные кэши в WARMUP_CACHES: {', '.join(sorted(unknown))}")
+
+
+"""
+Функция выполняет то, что иначе откладывается до первого запроса: настройку связей
+моделей SQLAlchemy и построение схемы OpenAPI (её запрашивают /docs и клиенты)
+    Параметры: app: FastAPI — приложение
+    Возвращаемое значение: отсутствует
+"""
+def configure(app):
+    configure_mappers()
+    app.openapi()
+
+
+"""
+Функция открывает подключения пула заранее и возвращает их в пул открытыми
+    Параметры:
+        engine: Engine — подключение к БД
+        count: int — сколько подключений открыть (не больше размера пула)
+    Возвращаемое значение: отсутствует
+"""
+def open_connections(engine, count = WARMUP_CONNECTIONS):
+    connections = []
+    try:
+        for _ in range(min(count, engine.pool.size())):  # Подключения сверх размера пула закрылись бы при возврате
+            connections.append(engine.connect())
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+"""
+Функция открывает подключения асинхронного пула заранее и возвращает их в пул открытыми
+    Параметры:
+        engine: AsyncEngine — асинхронное подключение к БД
+        count: int — сколько подключений открыть (не больше размера пула)
+    Возвращаемое значение: отсутствует
+"""
+async def open_connections_async(engine, count = WARMUP_CONNECTIONS):
+    connections = []
+    try:
+        for _ in range(min(count, engine.pool.size())):
+            connections.append(await engine.connect())
+    finally:
+        for connection in connections:
+            await connection.close()
+
+
+"""
+Функция загружает кэши из WARMUP_CACHES
+    Параметры: db: Session — объект сессии SQLAlchemy
+    Возвращаемое значение: отсутствует
+"""
+def prime_caches(db):
+    for name in WARMUP_CACHES:
+        CACHES[name](db)
+
+
+"""
+Класс Warmup выполняет этапы прогрева и хранит их состояние для GET /ready
+"""
+class Warmup:
+    def __init__(self, stages):
+        self.stages = stages  # Этапы: список пар (название, функция или корутинная функция без параметров)
+        self.seconds = {}  # Время выполненных этапов по названию
+        self.error = None  # Ошибка последнего неудавшегося этапа
+        self.ready = False
+
+    """
+    Метод выполняет этапы по порядку; неудавшийся этап повторяется через WARMUP_RETRY_INTERVAL секунд
+        Обычные функции выполняются в пуле потоков, чтобы не останавливать цикл событий
+        Параметры: отсутствуют
+        Возвращаемое значение: отсутствует
+    """
+    async def run(self):
+        started = time.perf_counter()
+        for name, stage in self.stages if WARMUP else []:
+            while True:
+                stage_started = time.perf_counter()
+                try:
+                    if inspect.iscoroutinefunction(stage):
+                        await stage()
+                    else:
+                        await asyncio.to_thread(stage)
+                    break
+                except Exception as error:
+                    self.error = f"{name}: {error}"
+                    logger.warning(f"Этап прогрева {self.error}, повтор через {WARMUP_RETRY_INTERVAL} с")
+                    await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+            self.seconds[name] = round(time.perf_counter() - stage_started, 3)
+
+        self.error = None
+        self.ready = True
+        total = round(time.perf_counter() - started, 3)
+        line = json.dumps({"warmup_seconds": total, "stages": self.seconds}, ensure_ascii = False)
+        if total > STARTUP_BUDGET:
+            logger.warning(line)  # Прогрев не уложился в STARTUP_BUDGET
+        else:
+            logger.info(line)
+
+    """
+    Метод возвращает ответ GET /ready
+        Параметры: отсутствуют
+        Возвращаемое значение: JSONResponse — 200, если прогрев завершён, иначе 503
+    """
+    def response(self):
+        content = {"ready": self.ready, "stages": self.seconds, "error": self.error}
+        return JSONResponse(content, status_code = 200 if self.ready else 503)
+
+
+"""
+Функция строит обработчик lifespan приложения: прогрев в фоне после запуска и закрытие пулов при остановке
+    Прогрев берётся из app.state.warmup
+    Параметры: dispose: callable — функция (или корутинная функция), закрывающая пулы подключений
+    Возвращаемое значение: callable — обработчик lifespan для FastAPI
+"""
+def lifespan(dispose):
+    @asynccontextmanager
+    async def handler(app):
+        task = asyncio.create_task(app.state.warmup.run())  # Сервер принимает запросы, /ready — 503 до конца прогрева
+        try:
+            yield
+        finally:
+            task.cancel()
+            if inspect.iscoroutinefunction(dispose):
+                await dispose()
+            else:
+                dispose()
+
+    return handler
@@ -0,0 +1,167 @@
+# Потоковая и постраничная выдача больших списков
+
+import json
+import os
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from database import SessionLocal
+
+try:
+    import orjson  # Быстрый кодировщик JSON; без него используется стандартный json
+except ImportError:
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"  # Тип содержимого: один JSON-объект на строку
+CHUNK_ROWS = 500  # Сколько строк отправляем клиенту одним куском
+MAX_PAGE_SIZE = 1000  # Максимальный размер страницы при постраничной выдаче
+
+# Быстрая выдача списков: словари из строк запроса сразу кодируются в JSON, без повторной
+# проверки через response_model (схема в OpenAPI остаётся прежней)
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "1") == "1"
+
+
+"""
+Функция кодирует значение в JSON
+    Параметры: value — словарь, список или другое значение
+    Возвращаемое значение: bytes — JSON в UTF-8 (даты в формате ISO)
+"""
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii = False, separators = (",", ":"), default = str).encode("utf-8")
+
+
+"""
+Класс FastJSONResponse — ответ JSON, закодированный dumps
+"""
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
+
+
+"""
+Функция отдаёт список словарей быстрым путём (FAST_SERIALIZATION) или обычным
+    Обработчик, вернувший объект Response, не проходит проверку response_model: словари
+    уже собраны по схеме ответа, и вторая проверка каждого элемента не нужна
+    Параметры:
+        content: list[dict] — содержимое ответа
+        response: Response — ответ обработчика с уже выставленными заголовками (X-Next-Cursor и др.)
+        model: type[BaseModel] | None — урезанная схема элемента, если выбрана часть полей (fields/include):
+            без быстрого пути элементы проверяются по ней, а не по response_model маршрута
+    Возвращаемое значение: FastJSONResponse | JSONResponse | list[dict] — готовый ответ или содержимое для FastAPI
+"""
+def list_response(content, response, model = None):
+    if not FAST_SERIALIZATION:
+        if model is None:
+            return content
+        return JSONResponse(jsonable_encoder([model(**item) for item in content]), headers = response.headers)
+    return FastJSONResponse(content, headers = response.headers)
+
+
+"""
+Функция выставляет заголовок X-Next-Cursor и обрезает лишнюю строку страницы
+    Параметры:
+        rows: list[Row] — строки, выбранные с запасом в одну строку (limit + 1)
+        limit: int | None — размер страницы
+        response: Response — ответ, в который пишется заголовок
+    Возвращаемое значение: list[Row] — строки текущей страницы
+"""
+def paginate(rows, limit, response):
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)  # Значение для параметра after следующего запроса
+    return rows
+
+
+"""
+Функция проверяет, запросил ли клиент потоковый формат NDJSON
+    Параметры: request: Request — входящий HTTP-запрос
+    Возвращаемое значение: bool — True, если в заголовке Accept указан application/x-ndjson
+"""
+def wants_ndjson(request):
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+"""
+Функция преобразует пачку строк в кусок ответа NDJSON
+    Параметры:
+        rows: list — строки результата запроса
+        to_dict: callable — функция преобразования строки в словарь
+    Возвращаемое значение: bytes — строки JSON, разделённые переводом строки
+"""
+def encode_chunk(rows, to_dict):
+    return b"".join(dumps(to_dict(row)) + b"\n" for row in rows)
+
+
+"""
+Функция-генератор читает строки запроса и отдаёт их в формате NDJSON
+    Работает в собственной сессии, потому что сессия обработчика закрывается
+    раньше, чем ответ будет полностью отправлен
+    Параметры:
+        fetch: callable — функция fetch(db), возвращающая итератор строк
+        to_dict: callable — функция преобразования строки в словарь
+        session_factory: callable — функция, открывающая сессию
+    Возвращаемое значение: Iterator[bytes] — куски ответа
+"""
+def ndjson_chunks(fetch, to_dict, session_factory = SessionLocal):
+    db = session_factory()
+    try:
+        rows = []
+        for row in fetch(db):
+            rows.append(row)
+            if len(rows) >= CHUNK_ROWS:
+                yield encode_chunk(rows, to_dict)  # Отправляем готовый кусок и освобождаем память
+                rows = []
+        if rows:
+            yield encode_chunk(rows, to_dict)
+    finally:
+        db.close()
+
+
+"""
+Функция создаёт потоковый ответ NDJSON
+    Параметры:
+        fetch: callable — функция fetch(db), возвращающая итератор строк
+        to_dict: callable — функция преобразования строки в словарь
+        session_factory: callable — функция, открывающая сессию (например, на реплике)
+    Возвращаемое значение: StreamingResponse — ответ, который пишется по мере чтения строк из БД
+"""
+def ndjson_response(fetch, to_dict, session_factory = SessionLocal):
+    return StreamingResponse(ndjson_chunks(fetch, to_dict, session_factory), media_type = NDJSON_MEDIA_TYPE,
+                             headers = {"Vary": "Accept"})  # По тому же URL без Accept отдаётся JSON
+
+
+"""
+Асинхронная версия ndjson_chunks для приложения HRM_async
+    Параметры:
+        session_factory: async_sessionmaker — фабрика асинхронных сессий
+        fetch: callable — функция fetch(db), возвращающая асинхронный итератор строк
+        to_dict: callable — функция преобразования строки в словарь
+    Возвращаемое значение: AsyncIterator[bytes] — куски ответа
+"""
+async def ndjson_chunks_async(session_factory, fetch, to_dict):
+    async with session_factory() as db:
+        rows = []
+        async for row in fetch(db):
+            rows.append(row)
+            if len(rows) >= CHUNK_ROWS:
+                yield encode_chunk(rows, to_dict)
+                rows = []
+        if rows:
+            yield encode_chunk(rows, to_dict)
+
+
+"""
+Функция создаёт потоковый ответ NDJSON для асинхронного приложения
+    Параметры:
+        session_factory: async_sessionmaker — фабрика асинхронных сессий
+        fetch: callable — функция fetch(db), возвращающая асинхронный итератор строк
+        to_dict: callable — функция преобразования строки в словарь
+    Возвращаемое значение: StreamingResponse — ответ, который пишется по мере чтения строк из БД
+"""
+def ndjson_response_async(session_factory, fetch, to_dict):
+    return StreamingResponse(ndjson_chunks_async(session_factory, fetch, to_dict), media_type = NDJSON_MEDIA_TYPE,
+                             headers = {"Vary": "Accept"})
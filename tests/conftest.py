@@ -0,0 +1,33 @@
+# Общие настройки тестов: временная база SQLite с небольшим набором синтетических данных
+#
+# DATABASE_URL задаётся до импорта модулей приложения: подключения создаются при импорте.
+
+import os
+import sys
+import tempfile
+
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix = "hrm_tests_"), "hrm.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+os.environ.setdefault("REQUEST_LOG", "0")
+os.environ.setdefault("JOBS_DIR", os.path.join(os.path.dirname(DATABASE_PATH), "jobs"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from database import SessionLocal, engine
+import migrations
+import dataHRM
+
+
+"""
+Фикстура создаёт схему базы и заполняет её синтетическими данными один раз на прогон
+    Возвращаемое значение: str — путь к файлу базы
+"""
+@pytest.fixture(scope = "session", autouse = True)
+def database():
+    migrations.upgrade(engine)
+    db = SessionLocal()
+    try:
+        dataHRM.generate_data(db, employees = 300, salary_rows = 2000, departments = 5, positions = 6, seed = 1)
+    finally:
+        db.close()
+    return DATABASE_PATH
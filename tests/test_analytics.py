@@ -0,0 +1,40 @@
+# Сводная аналитика по зарплатам: процентили групп за один векторный проход
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from database import SessionLocal
+from models import Employee
+import analytics
+import HRM
+
+
+def test_group_percentiles_known_values():
+    keys = np.array([1, 3, 1, 2, 3, 1, 3, 1, 3, 1], dtype = np.int64)
+    salaries = np.array([50, 4, 10, 100, 1, 40, 3, 20, 2, 30], dtype = np.float64)
+
+    # PERCENTILES = (10, 25, 50, 75, 90), позиции в отсортированной группе — q * (n - 1)
+    assert analytics.group_percentiles(keys, salaries) == {
+        1: [14.0, 20.0, 30.0, 40.0, 46.0],  # 10, 20, 30, 40, 50: позиции 0.4, 1, 2, 3, 3.6
+        2: [100.0] * 5,  # Один сотрудник
+        3: [1.3, 1.75, 2.5, 3.25, 3.7]  # 1, 2, 3, 4: позиции 0.3, 0.75, 1.5, 2.25, 2.7
+    }
+    assert analytics.group_percentiles(keys[:0], salaries[:0]) == {}
+
+
+def test_salary_stats_match_numpy_percentile():
+    stats = TestClient(HRM.app).get("/analytics/salaries", params = {"group_by": "department"}).json()
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(Employee.department_id, Employee.current_salary)
+                          .where(Employee.department_id.isnot(None), Employee.current_salary.isnot(None))).all()
+    finally:
+        db.close()
+
+    assert stats
+    for item in stats:
+        salaries = [salary for department_id, salary in rows if department_id == item["group"]]
+        expected = np.percentile(salaries, analytics.PERCENTILES)
+        assert [item[f"p{p}"] for p in analytics.PERCENTILES] == [round(float(v), 2) for v in expected]
+        assert item["salaried"] == len(salaries)
+        assert item["total"] == round(sum(salaries), 2)
@@ -0,0 +1,98 @@
+# Одновременные запросы к асинхронному приложению HRM_async
+#
+# Кэши процесса (справочники, индекс поиска, массивы прогноза) загружаются из БД
+# через AsyncSession.run_sync: пока идёт запрос к БД, цикл событий выполняет другие
+# корутины в том же потоке. Если загрузка идёт под threading.Lock, следующая корутина
+# блокирует поток на этой блокировке, и цикл событий останавливается навсегда.
+# Поэтому запросы выполняются в цикле событий отдельного потока: зависание — это
+# поток, не завершившийся за TIMEOUT секунд, а не зависший прогон тестов.
+
+import asyncio
+import threading
+import httpx
+import cache
+import search
+import projection
+import HRM_async
+from database_async import async_engine
+
+TIMEOUT = 30  # Сколько секунд ждать ответов на все запросы
+CONCURRENCY = 5  # Сколько одинаковых запросов отправлять одновременно
+
+
+"""
+Функция отправляет запросы в HRM_async одновременно и ждёт все ответы
+    Параметры: requests: list[tuple] — запросы: (метод, путь) или (метод, путь, параметры httpx)
+    Возвращаемое значение: list[httpx.Response] — ответы в порядке запросов
+"""
+def send_concurrently(requests):
+    result = {}
+
+    async def send_all():
+        transport = httpx.ASGITransport(app = HRM_async.app)
+        try:
+            async with httpx.AsyncClient(transport = transport, base_url = "http://test", timeout = TIMEOUT) as client:
+                return await asyncio.gather(*(client.request(method, url, **(rest[0] if rest else {}))
+                                              for method, url, *rest in requests))
+        finally:
+            await async_engine.dispose()  # Подключения привязаны к циклу событий этого потока
+
+    def run():
+        result["responses"] = asyncio.run(send_all())
+
+    thread = threading.Thread(target = run, daemon = True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "Цикл событий завис: одновременные запросы не завершились"
+    return result["responses"]
+
+
+def test_reference_cache_cold_start():
+    cache.departments.invalidate()
+    cache.positions.invalidate()
+    responses = send_concurrently([("GET", "/employees?limit=5")] * CONCURRENCY + [("GET", "/departments")] * CONCURRENCY)
+    assert [r.status_code for r in responses] == [200] * (2 * CONCURRENCY)
+    assert all(r.json() == responses[0].json() for r in responses[:CONCURRENCY])
+
+
+def test_employees_full_cold_cache():
+    cache.departments.invalidate()
+    cache.positions.invalidate()
+    responses = send_concurrently([("GET", "/employees/full?limit=20")] * CONCURRENCY)
+    assert [r.status_code for r in responses] == [200] * CONCURRENCY
+    assert all(r.json() == responses[0].json() for r in responses)
+    assert all(item["department"] for item in responses[0].json())
+
+
+def test_search_index_refresh():
+    search.names.version = None  # Следующий поиск дочитывает индекс из БД
+    responses = send_concurrently([("GET", "/employees/search?q=ив")] * CONCURRENCY)
+    assert [r.status_code for r in responses] == [200] * CONCURRENCY
+
+
+def test_projection_cold_load(monkeypatch):
+    monkeypatch.setattr(projection, "salaries", projection.SalaryArrays())  # Полная загрузка истории зарплат
+    responses = send_concurrently([("GET", "/payroll/projection?from=2024-01-01&to=2024-12-31")] * CONCURRENCY)
+    assert [r.status_code for r in responses] == [200] * CONCURRENCY
+    assert responses[0].json()
+    assert all(r.json() == responses[0].json() for r in responses)
+
+
+def test_export_cold_cache():
+    cache.departments.invalidate()
+    cache.positions.invalidate()
+    responses = send_concurrently([("GET", "/employees/export?format=csv")] * CONCURRENCY)
+    assert [r.status_code for r in responses] == [200] * CONCURRENCY
+    assert all(r.content == responses[0].content for r in responses)
+    assert responses[0].content.count(b"\n") > 1
+
+
+def test_bulk_import_cold_cache():
+    cache.departments.invalidate()
+    cache.positions.invalidate()
+    body = "last_name,first_name,middle_name,hire_date,department_id,position_id,amount\n" \
+           "Петров,Пётр,Петрович,2024-03-01,1,1,50000\n"
+    responses = send_concurrently([("POST", "/employees/bulk", {"content": body.encode(), "headers": {"Content-Type": "text/csv"}})]
+                                  * CONCURRENCY)
+    assert [r.status_code for r in responses] == [200] * CONCURRENCY
+    assert all(r.json()["inserted"] == 1 for r in responses)
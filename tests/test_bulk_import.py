@@ -0,0 +1,82 @@
+# Массовая загрузка сотрудников POST /employees/bulk
+
+import asyncio
+from fastapi.testclient import TestClient
+from database import SessionLocal
+import db_queries
+import cache
+import bulk_import
+import HRM
+
+HEADER = "last_name,first_name,middle_name,hire_date,department_id,position_id,amount\n"
+
+
+"""
+Функция отправляет CSV в POST /employees/bulk синхронного приложения
+    Параметры: body: str — тело CSV
+    Возвращаемое значение: dict — итог загрузки
+"""
+def post_csv(body):
+    response = TestClient(HRM.app).post("/employees/bulk", content = body.encode("utf-8"),
+                                        headers = {"Content-Type": "text/csv"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_quoted_field_with_newline():
+    result = post_csv(HEADER + 'Иванова,"Анна\nМария",Сергеевна,2024-02-01,1,1,60000\n'
+                               'Сидоров,"Олег ""Младший""",Ильич,2024-02-02,1,1,55000\n'
+                               'Без даты,Пётр,Петрович,,1,1,50000\n')
+    assert result["inserted"] == 2
+    assert [error["row"] for error in result["errors"]] == [5]  # Номер первой строки записи с учётом переноса
+
+
+def test_unclosed_quote_is_rejected():
+    result = post_csv(HEADER + 'Иванова,"Анна,Сергеевна,2024-02-01,1,1,60000\n')
+    assert result["inserted"] == 0
+    assert result["errors"][0]["row"] == 2
+
+
+def test_department_created_in_another_process():
+    db = SessionLocal()
+    try:
+        cache.departments.get(db)  # Кэш только что сверен с БД
+        department = db_queries.create_department(db, "Отдел из другого процесса")  # Без invalidate() этого процесса
+        db.commit()
+        department_id = department.id
+    finally:
+        db.close()
+
+    result = post_csv(HEADER + f"Новиков,Иван,Петрович,2024-04-01,{department_id},1,70000\n")
+    assert result == {"inserted": 1, "failed": 0, "errors": []}
+
+
+"""
+Класс ChunkedRequest отдаёт тело запроса заданными кусками, как Request.stream()
+"""
+class ChunkedRequest:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+"""
+Функция собирает строки, на которые iter_lines разбивает тело из заданных кусков
+    Параметры: chunks: list[bytes] — куски тела
+    Возвращаемое значение: list[str] — строки
+"""
+def split_lines(chunks):
+    async def collect():
+        return [line async for line in bulk_import.iter_lines(ChunkedRequest(chunks))]
+    return asyncio.run(collect())
+
+
+def test_iter_lines_chunk_boundaries():
+    body = "первая\r\nвторая\n\nдлинная строка без конца".encode("utf-8")
+    expected = ["первая", "вторая", "", "длинная строка без конца"]
+    assert split_lines([body]) == expected
+    assert split_lines([body[i:i + 1] for i in range(len(body))]) == expected  # Перевод строки и буква UTF-8 на границе кусков
+    assert split_lines([b"a\n", b"", b"b\nc", b"\n"]) == ["a", "b", "c"]
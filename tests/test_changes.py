@@ -0,0 +1,124 @@
+# Лента изменений GET /changes: номера изменений строк и постраничное чтение по курсору
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from database import SessionLocal
+from models import DataVersion, Department
+import changes
+import HRM
+
+
+"""
+Функция читает номера изменений всех строк ленты прямо из таблиц
+    Параметры: отсутствуют
+    Возвращаемое значение: list[tuple] — (номер изменения, номер таблицы, id) по возрастанию
+"""
+def all_rows():
+    db = SessionLocal()
+    try:
+        return sorted((row_version, index, id)
+                      for index, (_, model) in enumerate(changes.TABLES)
+                      for id, row_version in db.execute(select(model.id, model.row_version)).all())
+    finally:
+        db.close()
+
+
+"""
+Функция читает ленту от курсора до конца
+    Параметры:
+        since: str — начальный курсор
+        limit: int — размер страницы
+    Возвращаемое значение: tuple[list, list[str]] — прочитанные строки (номер изменения, номер таблицы, id)
+        в порядке выдачи и курсоры всех страниц
+"""
+def read_feed(since, limit):
+    rows, cursors = [], []
+    db = SessionLocal()
+    try:
+        while True:
+            page = changes.get_changes(db, since, limit)
+            rows += sorted((row["row_version"], index, row["id"])  # Внутри страницы строки сгруппированы по таблицам
+                           for index, (name, _) in enumerate(changes.TABLES) for row in page[name])
+            cursors.append(page["cursor"])
+            since = page["cursor"]
+            if not page["has_more"]:
+                return rows, cursors
+    finally:
+        db.close()
+
+
+"""
+Функция читает счётчик номеров изменений
+    Параметры: отсутствуют
+    Возвращаемое значение: int — последний выданный номер
+"""
+def counter():
+    db = SessionLocal()
+    try:
+        return db.execute(select(DataVersion.version).where(DataVersion.name == changes.ROW_VERSION)).scalar()
+    finally:
+        db.close()
+
+
+def test_counter_taken_at_commit():
+    before = counter()
+    db = SessionLocal()
+    try:
+        department = Department(name = "Отдел ленты изменений")
+        db.add(department)
+        db.flush()
+        assert department.row_version < 0  # Временный номер: счётчик ещё не тронут
+        assert counter() == before
+        db.commit()
+        assert department.row_version == counter() == before + 1
+    finally:
+        db.close()
+
+
+def test_commit_assigns_one_version():
+    response = TestClient(HRM.app).post("/employees", json = {
+        "last_name": "Лентин", "first_name": "Иван", "hire_date": "2024-07-01",
+        "department_id": 1, "position_id": 1, "amount": 80000})
+    assert response.status_code == 200
+
+    version = counter()
+    rows = all_rows()
+    assert rows[0][0] > 0  # Временных номеров после commit не остаётся
+    newest = [row for row in rows if row[0] == version]
+    assert sorted(index for _, index, _ in newest) == [2, 3]  # Сотрудник и его зарплата — одно изменение
+    assert (version, 2, response.json()["id"]) in newest
+
+
+@pytest.mark.parametrize("limit", [7, 250, 5000])
+def test_pages_return_every_row_once(limit):
+    rows, cursors = read_feed("0", limit)
+    assert rows == all_rows()  # Ни одной пропущенной или повторённой строки, порядок — как у курсора
+    assert "." not in cursors[-1]  # Последняя страница закрывает изменение
+    if limit < 300:  # Пачка генератора — больше страницы: курсоры внутри изменения
+        assert any(cursor.count(".") == 2 for cursor in cursors)
+
+
+def test_resume_inside_version():
+    client = TestClient(HRM.app)
+    created = client.post("/employees", json = {
+        "last_name": "Курсоров", "first_name": "Пётр", "hire_date": "2024-08-01",
+        "department_id": 1, "position_id": 1, "amount": 90000}).json()
+    version = all_rows()[-1][0]
+
+    first = client.get("/changes", params = {"since": str(version - 1), "limit": 1}).json()
+    assert first["has_more"] and [row["id"] for row in first["employees"]] == [created["id"]]
+    assert first["cursor"] == f"{version}.2.{created['id']}"
+
+    second = client.get("/changes", params = {"since": first["cursor"], "limit": 1}).json()
+    assert second["employees"] == [] and [row["employee_id"] for row in second["salary_history"]] == [created["id"]]
+    assert second["cursor"] == str(version) and not second["has_more"]
+
+    same = client.get("/changes", params = {"since": first["cursor"], "limit": 10}).json()  # Оба вида курсора
+    assert same["salary_history"] == second["salary_history"] and same["cursor"] == str(version)
+    assert client.get("/changes", params = {"since": str(version)}).json()["cursor"] == str(version)  # Новых нет
+
+
+@pytest.mark.parametrize("cursor", ["abc", "1.2", "1.9.5", "1.-1.5"])
+def test_invalid_cursor(cursor):
+    assert TestClient(HRM.app).get("/changes", params = {"since": cursor}).status_code == 400
@@ -0,0 +1,56 @@
+# Представления одного URL: JSON и NDJSON (Vary: Accept), сжатые и несжатые (Vary: Accept-Encoding)
+
+import pytest
+from fastapi.testclient import TestClient
+import HRM
+
+NDJSON = {"Accept": "application/x-ndjson"}
+
+
+"""
+Функция возвращает значения заголовка Vary ответа
+    Параметры: response: httpx.Response — ответ
+    Возвращаемое значение: set[str] — заголовки запроса, от которых зависит ответ
+"""
+def vary(response):
+    return {name.strip().lower() for name in response.headers.get("vary", "").split(",") if name.strip()}
+
+
+@pytest.mark.parametrize("path", ["/employees?limit=5", "/employees/full?limit=5"])
+def test_vary_accept(path):
+    client = TestClient(HRM.app)
+
+    json_response = client.get(path)
+    assert json_response.status_code == 200
+    assert "accept" in vary(json_response)
+
+    not_modified = client.get(path, headers = {"If-None-Match": json_response.headers["etag"]})
+    assert not_modified.status_code == 304
+    assert "accept" in vary(not_modified)
+
+    ndjson_response = client.get(path, headers = NDJSON)
+    assert ndjson_response.status_code == 200
+    assert ndjson_response.headers["content-type"].startswith("application/x-ndjson")
+    assert "accept" in vary(ndjson_response)
+
+
+@pytest.mark.parametrize("encoding, suffix", [("identity", '"'), ("gzip", '-gzip"')])
+def test_etag_with_compression(encoding, suffix):
+    client = TestClient(HRM.app)
+    path = "/employees?limit=50"  # Ответ больше COMPRESSION_MIN_SIZE
+    headers = {"Accept-Encoding": encoding}
+
+    response = client.get(path, headers = headers)
+    assert response.status_code == 200
+    assert response.headers.get("content-encoding", "identity") == encoding
+    etag = response.headers["etag"]
+    assert etag.endswith(suffix) and not etag.endswith('-gzip-gzip"')
+    assert {"accept", "accept-encoding"} <= vary(response)
+
+    not_modified = client.get(path, headers = {**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag  # Тот ETag, что сохранил клиент
+    assert vary(not_modified) == vary(response)
+
+    stale = client.get(path, headers = {**headers, "If-None-Match": etag.replace('"employees-', '"employees-0')})
+    assert stale.status_code == 200
@@ -0,0 +1,85 @@
+# Повтор POST /employees и POST /salary/{employee_id} с заголовком Idempotency-Key
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, func
+from database import SessionLocal
+from models import Employee, SalaryHistory
+from schemas import EmployeeCreate
+import db_queries
+import cache
+import HRM
+
+EMPLOYEE = {"last_name": "Повторов", "first_name": "Иван", "middle_name": "Иванович", "hire_date": "2024-05-01",
+            "department_id": 1, "position_id": 1, "amount": 70000}
+
+
+"""
+Функция считает сотрудников с фамилией и их записи истории зарплат
+    Параметры: last_name: str — фамилия
+    Возвращаемое значение: tuple[int, int] — количество сотрудников и записей истории
+"""
+def count_rows(last_name):
+    db = SessionLocal()
+    try:
+        ids = select(Employee.id).where(Employee.last_name == last_name)
+        return (db.execute(select(func.count()).select_from(ids.subquery())).scalar(),
+                db.execute(select(func.count()).where(SalaryHistory.employee_id.in_(ids))).scalar())
+    finally:
+        db.close()
+
+
+def test_same_key_same_body():
+    client = TestClient(HRM.app)
+    headers = {"Idempotency-Key": "same-body"}
+
+    first = client.post("/employees", json = EMPLOYEE, headers = headers)
+    second = client.post("/employees", json = EMPLOYEE, headers = headers)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert count_rows("Повторов") == (1, 1)
+
+    salary = {"change_date": "2024-06-01", "amount": 75000}
+    url = f"/salary/{first.json()['id']}"
+    first_salary = client.post(url, json = salary, headers = headers)  # Ключи разных маршрутов независимы
+    second_salary = client.post(url, json = salary, headers = headers)
+    assert first_salary.status_code == second_salary.status_code == 200
+    assert second_salary.json() == first_salary.json()
+    assert count_rows("Повторов") == (1, 2)
+
+
+def test_same_key_different_body():
+    client = TestClient(HRM.app)
+    headers = {"Idempotency-Key": "different-body"}
+
+    assert client.post("/employees", json = {**EMPLOYEE, "last_name": "Первый"}, headers = headers).status_code == 200
+    conflict = client.post("/employees", json = {**EMPLOYEE, "last_name": "Второй"}, headers = headers)
+    assert conflict.status_code == 409
+    assert count_rows("Первый") == (1, 1)
+    assert count_rows("Второй") == (0, 0)
+
+
+def test_parallel_repeat_rolls_back():
+    body = {**EMPLOYEE, "last_name": "Параллельный"}
+    key = "parallel"
+    db = SessionLocal()
+    try:
+        # Первый запрос проверил ключ, но ещё не записал сотрудника
+        assert db_queries.get_idempotent_response(db, "POST /employees", key, EmployeeCreate(**body).dict()) is None
+
+        # Повтор того же запроса успел выполниться целиком
+        winner = TestClient(HRM.app).post("/employees", json = body, headers = {"Idempotency-Key": key})
+        assert winner.status_code == 200
+
+        emp = EmployeeCreate(**body)
+        departments = cache.departments.get_with(db, emp.department_id).names
+        positions = cache.positions.get_with(db, emp.position_id).names
+        result = db_queries.create_employee(db, emp, departments, positions)
+        assert result["id"] != winner.json()["id"]  # Сотрудник вставлен в транзакции первого запроса
+
+        # Вставка ключа нарушает первичный ключ: откатываются и сотрудник, и его зарплата
+        saved = db_queries.commit_idempotent(db, "POST /employees", key, emp.dict(), result)
+    finally:
+        db.close()
+
+    assert saved == winner.json()
+    assert count_rows("Параллельный") == (1, 1)
@@ -0,0 +1,76 @@
+# Массовая индексация зарплат POST /salary/indexation
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, func
+from database import SessionLocal
+from models import Employee, SalaryHistory
+import db_queries
+import HRM
+
+DEPARTMENT_ID = 2  # Индексируется один отдел: остальные тесты работают с той же БД
+
+
+"""
+Функция читает текущие зарплаты отдела, историю его сотрудников и версию истории зарплат
+    Параметры: отсутствуют
+    Возвращаемое значение: tuple[dict, list, int] — текущая зарплата по id, записи истории и версия
+"""
+def snapshot():
+    db = SessionLocal()
+    try:
+        current = dict(db.execute(select(Employee.id, Employee.current_salary)
+                                  .where(Employee.department_id == DEPARTMENT_ID)).all())
+        history = db.execute(select(SalaryHistory.employee_id, SalaryHistory.change_date, SalaryHistory.amount)
+                             .where(SalaryHistory.employee_id.in_(current))).all()
+        return current, history, db_queries.get_version(db, "salary_history")
+    finally:
+        db.close()
+
+
+"""
+Функция отправляет запрос индексации отдела DEPARTMENT_ID
+    Параметры: params: dict — размер индексации, дата и dry_run
+    Возвращаемое значение: dict — итог индексации
+"""
+def index(**params):
+    response = TestClient(HRM.app).post("/salary/indexation", json = {"department_id": DEPARTMENT_ID, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_dry_run_writes_nothing():
+    before = snapshot()
+    result = index(percent = 10, effective_date = "2031-01-01", dry_run = True)
+
+    salaried = [amount for amount in before[0].values() if amount is not None]
+    assert result["dry_run"] and result["employees"] == len(salaried) > 0
+    assert result["current_total"] == round(sum(salaried), 2)
+    assert snapshot() == before
+
+
+def test_one_history_row_per_employee():
+    current, history, version = snapshot()
+    result = index(percent = 10, effective_date = "2031-02-01")
+
+    salaried = {emp_id: amount for emp_id, amount in current.items() if amount is not None}
+    new_current, new_history, new_version = snapshot()
+    added = sorted(set(new_history) - set(history))
+    assert result["employees"] == len(salaried)
+    assert len(new_history) - len(history) == len(salaried)
+    assert [(emp_id, amount) for emp_id, _, amount in added] == \
+           [(emp_id, round(salaried[emp_id] * 1.1, 2)) for emp_id in sorted(salaried)]
+    assert new_version > version
+
+
+def test_current_salary_is_newest_history_row():
+    index(delta = 1000, effective_date = "2031-03-01")
+    index(delta = 500, effective_date = "2031-03-01")  # Вторая запись того же дня — больше первой
+    index(percent = -50, effective_date = "2031-03-01")  # Третья — меньше: действующей остаётся максимальная
+
+    current, history, _ = snapshot()
+    newest = {}
+    for emp_id, change_date, amount in history:  # Последняя дата, среди записей одного дня — большая сумма
+        newest[emp_id] = max(newest.get(emp_id, (change_date, amount)), (change_date, amount))
+    assert {emp_id: amount for emp_id, (_, amount) in newest.items()} == \
+           {emp_id: amount for emp_id, amount in current.items() if amount is not None}
+    assert sum(1 for _, change_date, _ in history if str(change_date) == "2031-03-01") == 3 * len(newest)
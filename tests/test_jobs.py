@@ -0,0 +1,112 @@
+# Фоновые задания POST /jobs: одно задание на одинаковые запросы, очередь и файлы результатов
+
+import os
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from database import SessionLocal
+import db_queries
+import jobs
+import HRM
+
+TIMEOUT = 10  # Сколько секунд ждать завершения задания
+REPORT = {"report": "employees", "format": "csv"}
+
+
+"""
+Функция ждёт завершения задания
+    Параметры: job: Job — задание
+    Возвращаемое значение: Job — то же задание со статусом done или failed
+"""
+def wait(job):
+    deadline = time.monotonic() + TIMEOUT
+    while job.status in ("queued", "running"):
+        assert time.monotonic() < deadline, "Задание не завершилось"
+        time.sleep(0.01)
+    return job
+
+
+"""
+Фикстура подменяет очередь заданий приложения очередью во временном каталоге
+    Возвращаемое значение: JobManager — очередь заданий
+"""
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    manager = jobs.JobManager(str(tmp_path), 1, 4)
+    monkeypatch.setattr(jobs, "manager", manager)
+    return manager
+
+
+"""
+Функция читает текущие версии данных отчёта о сотрудниках
+    Параметры: отсутствуют
+    Возвращаемое значение: tuple[int] — версии
+"""
+def employee_versions():
+    db = SessionLocal()
+    try:
+        return db_queries.get_versions(db, jobs.REPORT_DATA["employees"])
+    finally:
+        db.close()
+
+
+def test_identical_requests_share_job(manager, monkeypatch):
+    runs = []
+    run = manager.run
+    monkeypatch.setattr(manager, "run", lambda job, session_factory: runs.append(job.id) or run(job, session_factory))
+    client = TestClient(HRM.app)
+
+    first = client.post("/jobs", json = REPORT)
+    second = client.post("/jobs", json = REPORT)
+    assert first.status_code == second.status_code == 202
+    assert first.json()["id"] == second.json()["id"]
+    assert first.headers["location"] == f"/jobs/{first.json()['id']}"
+
+    assert wait(manager.jobs[first.json()["id"]]).status == "done"
+    assert runs == [first.json()["id"]]
+    result = client.get(f"/jobs/{first.json()['id']}/result")
+    assert result.status_code == 200
+    assert result.content == client.get("/employees/export", params = {"format": "csv"}).content
+
+
+def test_full_queue_answers_503(tmp_path, monkeypatch):
+    manager = jobs.JobManager(str(tmp_path), 1, 1)
+    monkeypatch.setattr(jobs, "manager", manager)
+    release = threading.Event()
+    write = jobs.REPORTS["employees"]
+    monkeypatch.setitem(jobs.REPORTS, "employees", lambda *args: release.wait(TIMEOUT) and write(*args))
+    client = TestClient(HRM.app)
+    try:
+        queued = client.post("/jobs", json = REPORT)
+        assert queued.status_code == 202
+        full = client.post("/jobs", json = {**REPORT, "department_id": 1})  # Другой отчёт — новое задание
+        assert full.status_code == 503
+        assert full.headers["retry-after"] == "30"
+        assert client.post("/jobs", json = REPORT).json()["id"] == queued.json()["id"]  # Повтор не занимает очередь
+    finally:
+        release.set()
+    assert wait(manager.jobs[queued.json()["id"]]).status == "done"
+
+
+def test_result_reused_from_disk(manager, tmp_path):
+    versions = employee_versions()
+    params = jobs.report_params("employees", "csv", {})
+    done = wait(manager.submit("employees", "csv", params, versions))
+    assert done.status == "done"
+
+    other = jobs.JobManager(str(tmp_path), 1, 4)  # Другой процесс или перезапуск: заданий в памяти нет
+    other.run = lambda job, session_factory: pytest.fail("Готовый отчёт построен повторно")
+    reused = other.submit("employees", "csv", params, versions)
+    assert reused.id == done.id and reused.status == "done"
+    assert other.get(done.id).status == "done"
+
+
+def test_changed_data_fails_job(manager):
+    versions = employee_versions()
+    stale = tuple(version - 1 for version in versions)  # Номер задания по версиям, которые уже устарели
+    job = wait(manager.submit("employees", "csv", jobs.report_params("employees", "csv", {}), stale))
+    assert job.status == "failed"
+    assert "изменились" in job.error
+    assert manager.get(job.id).status == "failed"
+    assert not os.path.exists(job.path(manager.directory))  # Файл с другими данными под этим номером не сохранён
@@ -0,0 +1,78 @@
+# Фонд оплаты труда по месяцам: векторный расчёт на массивах NumPy
+
+from datetime import date, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from database import SessionLocal
+from models import Employee, SalaryHistory
+import projection
+import HRM
+
+
+"""
+Функция строит массивы из заданных сотрудников и записей истории зарплат, без БД
+    Параметры:
+        employees: list[tuple] — (id, отдел, должность)
+        salaries: list[tuple] — (id сотрудника, дата, сумма)
+    Возвращаемое значение: SalaryArrays — массивы
+"""
+def build_arrays(employees, salaries):
+    arrays = projection.SalaryArrays()
+    ids, departments, positions = zip(*employees)
+    arrays.add_employees(None, ids, departments, positions, [1] * len(ids))
+    employee_ids, dates, amounts = zip(*salaries)
+    arrays.add_salaries(None, employee_ids, dates, amounts, [1] * len(amounts))
+    return arrays
+
+
+ARRAYS = build_arrays(
+    [(1, 10, 1), (2, 10, 2), (3, 20, 1), (4, None, 1)],
+    [(1, date(2024, 1, 1), 30000), (1, date(2024, 4, 16), 50000), (1, date(2024, 4, 16), 60000),  # За день — максимальная
+     (2, date(2024, 2, 1), 20000),
+     (3, date(2023, 12, 1), 10000),
+     (4, date(2024, 1, 1), 99999)]  # Без отдела: в фонд отделов не входит
+)
+
+
+def test_monthly_cost_by_hand():
+    rows = projection.project(ARRAYS, date(2024, 1, 1), date(2024, 4, 30), "month", "department", today = date(2030, 1, 1))
+    costs = {(row["period"].month, row["group"]): row["cost"] for row in rows}
+    assert costs == {
+        (1, 10): 30000.0, (2, 10): 50000.0, (3, 10): 50000.0,
+        (4, 10): 65000.0,  # Сотрудник 1: 15 дней по 30000 и 15 дней по 60000 из 30; сотрудник 2: 20000
+        (1, 20): 10000.0, (2, 20): 10000.0, (3, 20): 10000.0, (4, 20): 10000.0
+    }
+
+
+def test_quarters_and_indexation_by_hand():
+    rows = projection.project(ARRAYS, date(2024, 2, 1), date(2025, 1, 31), "quarter", "department",
+                              indexation = 10, today = date(2024, 3, 15))
+    costs = {(row["period"], row["group"]): row["cost"] for row in rows}
+    assert costs[(date(2024, 1, 1), 10)] == 130000.0  # 30000 + 50000 + 50000: период берётся целиком
+    assert costs[(date(2024, 4, 1), 10)] == 225000.0  # 65000 + 80000 + 80000
+    assert costs[(date(2024, 4, 1), 20)] == 30000.0  # Индексация только с 1 января следующего года
+    assert costs[(date(2025, 1, 1), 20)] == 33000.0  # 3 месяца по 10000 * 1.1
+
+
+def test_api_matches_daily_sum():
+    first, last = date(2024, 6, 1), date(2024, 6, 30)
+    response = TestClient(HRM.app).get("/payroll/projection", params = {"from": first, "to": last})
+    assert response.status_code == 200
+    api_total = sum(row["cost"] for row in response.json())
+
+    db = SessionLocal()
+    try:
+        departments = dict(db.execute(select(Employee.id, Employee.department_id)).all())
+        history = db.execute(select(SalaryHistory.employee_id, SalaryHistory.change_date, SalaryHistory.amount)).all()
+    finally:
+        db.close()
+
+    total = 0
+    days = (last - first).days + 1
+    for day in (first + timedelta(days = i) for i in range(days)):
+        current = {}  # Действующая на день зарплата: последняя дата, за день — максимальная сумма
+        for employee_id, change_date, amount in history:
+            if change_date <= day and departments.get(employee_id) is not None:
+                current[employee_id] = max(current.get(employee_id, (change_date, amount)), (change_date, amount))
+        total += sum(amount for _, amount in current.values())
+    assert abs(api_total - total / days) < 0.01 * len(response.json())  # Округление до копеек по каждой группе
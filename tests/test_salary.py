@@ -0,0 +1,22 @@
+# История зарплат: GET /salary/{employee_id} и пакетная выборка /salary
+
+from fastapi.testclient import TestClient
+import HRM
+
+
+def test_single_and_batch_history_match():
+    client = TestClient(HRM.app)
+    employee_id = 1
+    for amount in (70000, 65000, 70000):  # Несколько записей одного дня, две с одинаковой суммой
+        response = client.post(f"/salary/{employee_id}", json = {"change_date": "2030-01-15", "amount": amount})
+        assert response.status_code == 200
+
+    single = client.get(f"/salary/{employee_id}").json()
+    batch = client.get("/salary", params = {"employee_ids": f"{employee_id},2"}).json()
+    batch_post = client.post("/salary", json = {"employee_ids": [employee_id, 2]}).json()
+
+    assert batch[0] == {"employee_id": employee_id, "history": single}
+    assert batch_post == batch
+    keys = [(row["change_date"], row["amount"], row["id"]) for row in single]
+    assert keys == sorted(keys)
+    assert [row["amount"] for row in single[-3:]] == [65000, 70000, 70000]